@@ -1,14 +1,88 @@
-from typing import Optional
+import asyncio
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
 
 import bcrypt
 from fastapi import Depends, HTTPException, Request, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from . import models
-from .database import get_db
+from .database import AsyncSessionLocal, get_read_db
+from .metrics import Gauge, registry
+from .user_cache import user_cache
 
 SECRET_KEY = "your-secret-key-here-change-in-production"  # 在生产环境中应该从环境变量读取
 
+API_TOKEN_PREFIX = "ops_"
+
+# bcrypt 代价因子，修改后已有用户在下次登录成功时自动重新哈希
+BCRYPT_ROUNDS = int(os.environ.get("OPS_BCRYPT_ROUNDS", "12"))
+# 密码校验专用线程数与最多排队的请求数，超出时直接返回 429
+PASSWORD_WORKERS = int(
+    os.environ.get("OPS_PASSWORD_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+PASSWORD_QUEUE_LIMIT = int(
+    os.environ.get("OPS_PASSWORD_QUEUE_LIMIT", str(PASSWORD_WORKERS * 4))
+)
+
+
+class PasswordPoolFull(Exception):
+    pass
+
+
+class PasswordPool:
+    """bcrypt 专用的有界线程池
+
+    bcrypt 每次数百毫秒，放在通用线程池里时一波登录（或撞库）就能占满所有
+    工作线程，拖慢整个应用。这里用独立的线程池隔离，并限制排队长度，
+    超出时立即拒绝而不是无限排队。
+    """
+
+    def __init__(
+        self,
+        workers: int = PASSWORD_WORKERS,
+        queue_limit: int = PASSWORD_QUEUE_LIMIT,
+    ):
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password"
+        )
+        self._capacity = workers + queue_limit
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """正在校验与排队等待的密码校验数"""
+        return self._pending
+
+    async def run(self, func: Callable, *args):
+        with self._lock:
+            if self._pending >= self._capacity:
+                raise PasswordPoolFull()
+            self._pending += 1
+        try:
+            return await asyncio.wrap_future(self._executor.submit(func, *args))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+
+password_pool = PasswordPool()
+
+registry.register(
+    Gauge(
+        "opstool_password_pool_pending",
+        "正在执行与排队等待的密码校验数",
+        collect=lambda: password_pool.pending,
+    )
+)
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """验证密码"""
@@ -35,43 +109,115 @@ def get_password_hash(password: str) -> str:
         password = password[:72]
     
     # 生成盐并哈希密码
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password, salt)
     
     # 返回字符串格式的哈希值
     return hashed.decode('utf-8')
 
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[models.User]:
-    """验证用户凭证"""
-    user = db.query(models.User).filter(models.User.username == username).first()
+def password_needs_rehash(hashed_password: str) -> bool:
+    """哈希的代价因子与当前配置不一致时需要重新哈希"""
+    try:
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
+
+
+async def rehash_password(user_id: int, password: str, old_hash: str) -> None:
+    """按当前代价因子重新哈希并保存（登录成功后在后台执行）"""
+    try:
+        new_hash = await password_pool.run(get_password_hash, password)
+    except PasswordPoolFull:
+        # 忙时跳过，下次登录再换
+        return
+    async with AsyncSessionLocal() as db:
+        # 只在密码未被并发修改时替换
+        await db.execute(
+            update(models.User)
+            .where(
+                models.User.id == user_id,
+                models.User.hashed_password == old_hash,
+            )
+            .values(hashed_password=new_hash)
+        )
+        await db.commit()
+
+
+def generate_api_token() -> Tuple[str, str]:
+    """生成 API 令牌，返回 (明文令牌, 摘要)"""
+    token = API_TOKEN_PREFIX + secrets.token_urlsafe(32)
+    return token, hash_api_token(token)
+
+
+def hash_api_token(token: str) -> str:
+    """令牌的 HMAC-SHA256 摘要（更换 SECRET_KEY 会使所有令牌失效）
+
+    令牌本身是高熵随机串，不需要 bcrypt 这类慢哈希，校验只是一次摘要加索引查找。
+    """
+    return hmac.new(
+        SECRET_KEY.encode("utf-8"), token.encode("utf-8"), hashlib.sha256
+    ).hexdigest()
+
+
+def _bearer_token(request: Request) -> Optional[str]:
+    authorization = request.headers.get("authorization")
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        return None
+    return token.strip()
+
+
+async def authenticate_user(
+    db: AsyncSession, username: str, password: str
+) -> Optional[models.User]:
+    """验证用户凭证，密码校验线程池已满时抛出 PasswordPoolFull"""
+    user = await db.scalar(
+        select(models.User).where(models.User.username == username)
+    )
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    # 结束只读事务并归还连接，等待 bcrypt 期间不占用连接池
+    await db.commit()
+    # bcrypt 是 CPU 密集操作，放到专用线程池避免阻塞事件循环
+    if not await password_pool.run(
+        verify_password, password, user.hashed_password
+    ):
         return None
     if not user.is_active:
         return None
     return user
 
 
-def get_current_user(
+async def get_current_user(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ) -> models.User:
-    """从 Session 获取当前用户"""
-    user_id = request.session.get("user_id")
-    if not user_id:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="未登录",
-        )
-    
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="用户不存在",
-        )
+    """获取当前用户：优先使用 Authorization: Bearer 令牌，否则从 Session 获取"""
+    token = _bearer_token(request)
+    if token is not None:
+        user = await user_cache.get_by_token(db, hash_api_token(token))
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="无效的 API 令牌",
+            )
+    else:
+        user_id = request.session.get("user_id")
+        if not user_id:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="未登录",
+            )
+
+        user = await user_cache.get(db, user_id)
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="用户不存在",
+            )
     if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -80,16 +226,16 @@ def get_current_user(
     return user
 
 
-def get_current_user_optional(
+async def get_current_user_optional(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ) -> Optional[models.User]:
     """从 Session 获取当前用户（可选，用于页面路由）"""
     user_id = request.session.get("user_id")
     if not user_id:
         return None
     
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = await user_cache.get(db, user_id)
     if not user or not user.is_active:
         return None
     return user
@@ -1,20 +1,243 @@
-from sqlalchemy import create_engine
+import os
+import time
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./ops_toolbox.db"
+from .metrics import Histogram, registry
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+SQLALCHEMY_DATABASE_URL = os.environ.get(
+    "OPS_DATABASE_URL", "sqlite:///./ops_toolbox.db"
 )
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+# SQLite 连接参数方案：
+#   production: WAL 日志，读写互不阻塞，适合执行记录频繁更新的场景
+#   compat: SQLite 默认的回滚日志模式，仅用于对比或特殊文件系统（如网络盘）
+DB_PROFILE = os.environ.get("OPS_DB_PROFILE", "production")
+
+SQLITE_PROFILES = {
+    "production": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "busy_timeout": 5000,
+            "mmap_size": 256 * 1024 * 1024,
+            "cache_size": -64 * 1024,  # 负数单位为 KiB，即 64 MiB
+            "temp_store": "MEMORY",
+        },
+        # WAL 下读连接可以并发，连接池放大一些
+        "pool": {"pool_size": 10, "max_overflow": 20, "pool_timeout": 30},
+    },
+    "compat": {
+        "pragmas": {
+            "journal_mode": "DELETE",
+            "synchronous": "FULL",
+            "busy_timeout": 5000,
+        },
+        # 回滚日志模式下写入会阻塞所有读取，多开连接只会加剧锁竞争
+        "pool": {"pool_size": 5, "max_overflow": 5, "pool_timeout": 30},
+    },
+}
+
+
+db_pool_checkout = registry.register(
+    Histogram(
+        "opstool_db_pool_checkout_seconds",
+        "从连接池获取连接的等待时间",
+        ("pool",),
+    )
+)
+
+
+class _TimedCheckoutMixin:
+    """统计从连接池取连接的耗时，连接池名取自 pool_logging_name"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_checkout.observe(
+                time.perf_counter() - started, pool=self.logging_name or "default"
+            )
+
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _apply_pragmas(engine: Engine, pragmas: dict) -> None:
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def _begin_immediate(engine: Engine) -> None:
+    """写连接以 BEGIN IMMEDIATE 开启事务
+
+    默认的延迟事务先读后写时，若期间另一连接已提交，升级写锁会直接报
+    database is locked（busy_timeout 不生效）；一开始就拿写锁则只会排队等待。
+    """
+
+    @event.listens_for(engine, "connect")
+    def disable_driver_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def is_memory_database(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database in (
+        None,
+        "",
+        ":memory:",
+    )
+
+
+def _sqlite_options(url: str, profile: str, read_only: bool):
+    """返回 SQLite 引擎参数与连接时执行的 PRAGMA"""
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"未知的数据库方案: {profile}")
+    settings = SQLITE_PROFILES[profile]
+    pragmas = dict(settings["pragmas"])
+    if read_only:
+        # 日志模式是库级设置，由写连接负责，只读连接不去切换
+        pragmas.pop("journal_mode", None)
+        pragmas["query_only"] = "ON"
+    if is_memory_database(url):
+        # 内存库只能共享同一个连接
+        return {"poolclass": StaticPool}, pragmas
+    return dict(settings["pool"]), pragmas
+
+
+def create_db_engine(
+    url: str = SQLALCHEMY_DATABASE_URL,
+    profile: str = DB_PROFILE,
+    read_only: bool = False,
+    pool_name: str = "sync",
+) -> Engine:
+    """按连接参数方案创建同步引擎，非 SQLite 数据库使用默认设置
+
+    read_only 为 True 时连接设置 query_only，任何写入都会直接报错。
+    """
+    if make_url(url).get_backend_name() != "sqlite":
+        return create_engine(
+            url,
+            pool_pre_ping=True,
+            poolclass=TimedQueuePool,
+            pool_logging_name=pool_name,
+        )
+    options, pragmas = _sqlite_options(url, profile, read_only)
+    options.setdefault("poolclass", TimedQueuePool)
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        pool_logging_name=pool_name,
+        **options,
+    )
+    _apply_pragmas(engine, pragmas)
+    if not read_only:
+        _begin_immediate(engine)
+    return engine
+
+
+def async_database_url(url: str) -> str:
+    """SQLite 地址换成 aiosqlite 驱动，其他数据库需自行在地址中指定异步驱动"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        parsed = parsed.set(drivername="sqlite+aiosqlite")
+    return parsed.render_as_string(hide_password=False)
+
+
+def create_async_db_engine(
+    url: str = SQLALCHEMY_DATABASE_URL,
+    profile: str = DB_PROFILE,
+    read_only: bool = False,
+    pool_name: str = "async",
+) -> AsyncEngine:
+    """与 create_db_engine 相同的方案，供请求路径上的 AsyncSession 使用"""
+    if make_url(url).get_backend_name() != "sqlite":
+        return create_async_engine(
+            async_database_url(url),
+            pool_pre_ping=True,
+            poolclass=TimedAsyncQueuePool,
+            pool_logging_name=pool_name,
+        )
+    options, pragmas = _sqlite_options(url, profile, read_only)
+    # aiosqlite 对文件库默认不做连接池（NullPool），这里显式启用队列池
+    options.setdefault("poolclass", TimedAsyncQueuePool)
+    engine = create_async_engine(
+        async_database_url(url), pool_logging_name=pool_name, **options
+    )
+    _apply_pragmas(engine.sync_engine, pragmas)
+    if not read_only:
+        _begin_immediate(engine.sync_engine)
+    return engine
+
+
+# 同步引擎：单写线程、后台索引、迁移与命令行脚本
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 异步引擎：HTTP 请求路径。GET 路由使用独立的只读连接池，WAL 模式下
+# 读取不会等待写连接，也不会占用写连接池。
+# 内存库无法跨连接共享，读写只能复用同一个引擎（仅适合调试）。
+async_engine = create_async_db_engine(pool_name="write")
+async_read_engine = (
+    async_engine
+    if is_memory_database(SQLALCHEMY_DATABASE_URL)
+    else create_async_db_engine(read_only=True, pool_name="read")
+)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+AsyncReadSessionLocal = async_sessionmaker(
+    async_read_engine, autoflush=False, expire_on_commit=False
+)
+
 Base = declarative_base()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_write_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
+
+async def get_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
+# 兼容旧的依赖名
+get_db = get_write_db
+
+
+def upgrade_database(url: str = SQLALCHEMY_DATABASE_URL) -> None:
+    """把数据库结构迁移到最新版本（等价于 alembic upgrade head）"""
+    config = Config(str(ALEMBIC_INI))
+    config.set_main_option("sqlalchemy.url", url)
+    config.attributes["configure_logger"] = False
+    command.upgrade(config, "head")
@@ -0,0 +1,220 @@
+import bisect
+import json
+import os
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Dict, List, Sequence, Tuple, Union
+
+# 两边合计超过这么多行时不再用 difflib（最坏为平方复杂度），改用基于唯一行锚点的
+# 近线性算法；结果仍是正确的差异，只是在大段改动里可能不如 difflib 精细
+DIFF_LINEAR_LINES = int(os.environ.get("OPS_DIFF_LINEAR_LINES", "5000"))
+
+# 行级增量的操作：正整数 n 表示照抄基准的 n 行，负整数 -n 表示跳过基准的 n 行，
+# 字符串列表表示插入这些行。行保留行尾换行符，还原结果与原文逐字节一致。
+DeltaOp = Union[int, List[str]]
+# 与 SequenceMatcher.get_opcodes 相同的 (tag, i1, i2, j1, j2)
+Opcode = Tuple[str, int, int, int, int]
+
+
+def split_lines(text: str) -> List[str]:
+    return text.splitlines(keepends=True)
+
+
+def _longest_increasing(pairs: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """pairs 已按第一项升序，取第二项严格递增的最长子序列（耐心排序，n log n）"""
+    tails: List[int] = []
+    tail_index: List[int] = []
+    previous = [-1] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        pos = bisect.bisect_left(tails, j)
+        if pos == len(tails):
+            tails.append(j)
+            tail_index.append(k)
+        else:
+            tails[pos] = j
+            tail_index[pos] = k
+        previous[k] = tail_index[pos - 1] if pos else -1
+    result = []
+    k = tail_index[-1] if tail_index else -1
+    while k >= 0:
+        result.append(pairs[k])
+        k = previous[k]
+    return result[::-1]
+
+
+def _anchored_blocks(a: Sequence[str], b: Sequence[str]) -> List[Tuple[int, int, int]]:
+    """近线性的匹配块 (i, j, n)：去掉公共首尾，以两边都只出现一次的行为锚点，
+    取保序的最长锚点序列，再把每个锚点向前后扩展到相邻的相同行"""
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end_a, end_b = len(a), len(b)
+    while end_a > start and end_b > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+
+    count_a = Counter(a[start:end_a])
+    count_b = Counter(b[start:end_b])
+    position_b: Dict[str, int] = {
+        line: j
+        for j, line in enumerate(b[start:end_b], start)
+        if count_b[line] == 1
+    }
+    pairs = [
+        (i, position_b[line])
+        for i, line in enumerate(a[start:end_a], start)
+        if count_a[line] == 1 and line in position_b
+    ]
+
+    blocks = [(0, 0, start)]
+    done_a, done_b = start, start
+    for i, j in _longest_increasing(pairs):
+        if i < done_a:  # 已被上一个锚点的扩展覆盖
+            continue
+        while i > done_a and j > done_b and a[i - 1] == b[j - 1]:
+            i -= 1
+            j -= 1
+        n = 0
+        while i + n < end_a and j + n < end_b and a[i + n] == b[j + n]:
+            n += 1
+        blocks.append((i, j, n))
+        done_a, done_b = i + n, j + n
+    blocks.append((end_a, end_b, len(a) - end_a))
+    return blocks
+
+
+def line_opcodes(a: Sequence[str], b: Sequence[str]) -> List[Opcode]:
+    """把行列表 a 变为 b 的操作序列，格式同 SequenceMatcher.get_opcodes"""
+    if len(a) + len(b) <= DIFF_LINEAR_LINES:
+        return SequenceMatcher(None, a, b, autojunk=False).get_opcodes()
+    opcodes: List[Opcode] = []
+    i = j = 0
+    for block_i, block_j, n in _anchored_blocks(a, b):
+        if i < block_i and j < block_j:
+            opcodes.append(("replace", i, block_i, j, block_j))
+        elif i < block_i:
+            opcodes.append(("delete", i, block_i, j, j))
+        elif j < block_j:
+            opcodes.append(("insert", i, i, j, block_j))
+        i, j = block_i + n, block_j + n
+        if not n:
+            continue
+        if opcodes and opcodes[-1][0] == "equal":
+            opcodes[-1] = ("equal", opcodes[-1][1], i, opcodes[-1][3], j)
+        else:
+            opcodes.append(("equal", block_i, i, block_j, j))
+    return opcodes
+
+
+def make_delta(base: str, target: str) -> List[DeltaOp]:
+    """计算把 base 变为 target 的行级增量"""
+    base_lines = split_lines(base)
+    target_lines = split_lines(target)
+    ops: List[DeltaOp] = []
+    for tag, i1, i2, j1, j2 in line_opcodes(base_lines, target_lines):
+        if tag == "equal":
+            ops.append(i2 - i1)
+            continue
+        if i2 > i1:
+            ops.append(-(i2 - i1))
+        if j2 > j1:
+            ops.append(target_lines[j1:j2])
+    return ops
+
+
+def apply_delta(base: str, ops: List[DeltaOp]) -> str:
+    """把 make_delta 得到的增量应用到 base 上"""
+    base_lines = split_lines(base)
+    result: List[str] = []
+    pos = 0
+    for op in ops:
+        if isinstance(op, list):
+            result.extend(op)
+        elif op >= 0:
+            result.extend(base_lines[pos : pos + op])
+            pos += op
+        else:
+            pos -= op
+    return "".join(result)
+
+
+def encode_delta(ops: List[DeltaOp]) -> str:
+    return json.dumps(ops, ensure_ascii=False, separators=(",", ":"))
+
+
+def decode_delta(text: str) -> List[DeltaOp]:
+    return json.loads(text)
+
+
+def group_opcodes(opcodes: List[Opcode], context: int = 3) -> List[List[Opcode]]:
+    """按上下文行数把操作分成若干差异块，同 SequenceMatcher.get_grouped_opcodes"""
+    codes = list(opcodes) or [("equal", 0, 1, 0, 1)]
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+    groups: List[List[Opcode]] = []
+    group: List[Opcode] = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > context * 2:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        groups.append(group)
+    return groups
+
+
+def diff_hunks(a: str, b: str, context: int = 3) -> List[dict]:
+    """结构化差异：每个差异块含新旧起始行号（从 1 开始）、行数与逐行的
+    操作（" " 上下文、"-" 删除、"+" 新增），行保留行尾换行符"""
+    a_lines, b_lines = split_lines(a), split_lines(b)
+    hunks = []
+    for group in group_opcodes(line_opcodes(a_lines, b_lines), context):
+        lines = []
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                lines.extend({"op": " ", "text": line} for line in a_lines[i1:i2])
+                continue
+            lines.extend({"op": "-", "text": line} for line in a_lines[i1:i2])
+            lines.extend({"op": "+", "text": line} for line in b_lines[j1:j2])
+        first, last = group[0], group[-1]
+        hunks.append(
+            {
+                "from_start": first[1] + 1,
+                "from_count": last[2] - first[1],
+                "to_start": first[3] + 1,
+                "to_count": last[4] - first[3],
+                "lines": lines,
+            }
+        )
+    return hunks
+
+
+def _unified_range(start: int, count: int) -> str:
+    # 与 diff -u 相同：空范围的起始行号为其前一行
+    if count == 1:
+        return str(start)
+    return f"{start if count else start - 1},{count}"
+
+
+def format_unified(hunks: List[dict], from_label: str, to_label: str) -> str:
+    """把 diff_hunks 的结果格式化为 unified diff 文本"""
+    if not hunks:
+        return ""
+    out = [f"--- {from_label}\n", f"+++ {to_label}\n"]
+    for hunk in hunks:
+        out.append(
+            f"@@ -{_unified_range(hunk['from_start'], hunk['from_count'])} "
+            f"+{_unified_range(hunk['to_start'], hunk['to_count'])} @@\n"
+        )
+        for line in hunk["lines"]:
+            text = line["text"]
+            out.append(line["op"] + text)
+            if not text.endswith(("\n", "\r")):
+                out.append("\n\\ No newline at end of file\n")
+    return "".join(out)
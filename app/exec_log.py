@@ -0,0 +1,117 @@
+import os
+import struct
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+# 是否为每行日志记录采集时间（写入与日志同名的 .ts 旁路文件）
+LOG_LINE_TIMESTAMPS = os.environ.get("OPS_LOG_LINE_TIMESTAMPS", "1") != "0"
+
+TIMESTAMP_SUFFIX = ".ts"
+
+# 文件头：魔数、起始时间（毫秒时间戳）、正文起始字节偏移
+_HEADER = struct.Struct("<8sqq")
+# 每行：与上一行的时间差（毫秒）、该行字节长度，固定小端，文件可跨平台读取
+_LINE = struct.Struct("<II")
+_MAGIC = b"OPSTS\x00\x00\x01"
+_EPOCH = datetime(1970, 1, 1)
+_MAX_DELTA = 0xFFFFFFFF
+
+
+def _to_ms(value: datetime) -> int:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return int((value - _EPOCH).total_seconds() * 1000)
+
+
+def _from_ms(value: int) -> datetime:
+    return _EPOCH + timedelta(milliseconds=value)
+
+
+def timestamp_path(log_path: Path) -> Path:
+    return Path(str(log_path) + TIMESTAMP_SUFFIX)
+
+
+class LineTimestampWriter:
+    """逐行时间戳写入器
+
+    每行记录两个 uint32：与上一行的时间差（毫秒）和该行的字节长度，
+    按行追加，不改动日志正文。
+    """
+
+    def __init__(self, log_path: Path, start_time: datetime, body_offset: int):
+        self._file = open(timestamp_path(log_path), "wb")
+        self._last_ms = _to_ms(start_time)
+        self._last_offset = body_offset
+        self._file.write(_HEADER.pack(_MAGIC, self._last_ms, body_offset))
+
+    def record(self, end_offset: int, when: Optional[datetime] = None) -> None:
+        now_ms = _to_ms(when or datetime.utcnow())
+        delta = min(max(now_ms - self._last_ms, 0), _MAX_DELTA)
+        self._file.write(_LINE.pack(delta, end_offset - self._last_offset))
+        self._last_ms += delta
+        self._last_offset = end_offset
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _load_index(log_path: Path) -> Optional[Tuple[List[int], List[int]]]:
+    """解码旁路文件，返回 (每行时间, 每行起始偏移 + 末尾偏移)"""
+    ts_path = timestamp_path(log_path)
+    if not ts_path.exists():
+        return None
+    raw = ts_path.read_bytes()
+    if len(raw) < _HEADER.size:
+        return None
+    magic, base_ms, body_offset = _HEADER.unpack_from(raw)
+    if magic != _MAGIC:
+        return None
+    body = raw[_HEADER.size:]
+    body = body[: len(body) - len(body) % _LINE.size]
+    deltas, lengths = zip(*_LINE.iter_unpack(body)) if body else ((), ())
+    times = list(accumulate(deltas, initial=base_ms))[1:]
+    offsets = list(accumulate(lengths, initial=body_offset))
+    return times, offsets
+
+
+def read_log_range(
+    log_path: Path,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    with_timestamps: bool = False,
+) -> Optional[str]:
+    """按时间窗口读取日志行，未记录时间戳时返回 None
+
+    在解码后的时间数组上二分定位首尾行，只读取窗口内的字节。
+    """
+    index = _load_index(log_path)
+    if index is None:
+        return None
+    times, offsets = index
+    lo = bisect_left(times, _to_ms(start)) if start else 0
+    hi = bisect_right(times, _to_ms(end)) if end else len(times)
+    if lo >= hi:
+        return ""
+
+    with open(log_path, "rb") as f:
+        f.seek(offsets[lo])
+        data = f.read(offsets[hi] - offsets[lo])
+    if not with_timestamps:
+        return data.decode("utf-8", errors="replace")
+
+    lines = []
+    base = offsets[lo]
+    for i in range(lo, hi):
+        chunk = data[offsets[i] - base: offsets[i + 1] - base]
+        stamp = _from_ms(times[i]).isoformat(timespec="milliseconds")
+        lines.append(f"[{stamp}Z] {chunk.decode('utf-8', errors='replace')}")
+    return "".join(lines)
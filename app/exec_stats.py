@@ -0,0 +1,219 @@
+import json
+import math
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import case, delete, or_, select, update
+from sqlalchemy.orm import Session
+
+from .models import ScriptExecDaily, ScriptExecRecord, ScriptItem
+
+# 耗时分位数的相对误差：估计值与真实分位数的偏差不超过 1%
+SKETCH_RELATIVE_ACCURACY = 0.01
+# 小于该值（秒）的耗时都记入最小的桶
+SKETCH_MIN_SECONDS = 0.001
+# 计入汇总的结束状态（排队中被取消的执行不计入）
+FINISHED_STATUSES = ("success", "fail")
+
+
+class DurationSketch:
+    """可合并的对数分桶直方图，用于估算耗时分位数
+
+    第 i 个桶覆盖 (gamma^(i-1), gamma^i]，gamma = (1+a)/(1-a)，取桶的
+    中点作为估计值时相对误差不超过 a。两个草图按桶相加即可合并，因此每天
+    一行的汇总可以在任意日期范围上再合并求分位数；桶的数量只与耗时跨度的
+    对数有关，不随执行次数增长。
+    """
+
+    def __init__(
+        self,
+        buckets: Optional[Dict[int, int]] = None,
+        relative_accuracy: float = SKETCH_RELATIVE_ACCURACY,
+    ):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = dict(buckets or {})
+
+    @property
+    def count(self) -> int:
+        return sum(self.buckets.values())
+
+    def add(self, seconds: float) -> None:
+        index = math.ceil(
+            math.log(max(seconds, SKETCH_MIN_SECONDS)) / self._log_gamma
+        )
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def merge(self, other: "DurationSketch") -> None:
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """估算 q 分位数（0~1），没有数据时返回 None"""
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                return 2 * self.gamma**index / (self.gamma + 1)
+        return None  # pragma: no cover
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {str(index): count for index, count in sorted(self.buckets.items())},
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def from_json(cls, text: Optional[str]) -> "DurationSketch":
+        if not text:
+            return cls()
+        return cls({int(index): count for index, count in json.loads(text).items()})
+
+
+def _add_run(row: ScriptExecDaily, status: str, seconds: float) -> None:
+    row.runs += 1
+    if status == "success":
+        row.successes += 1
+    else:
+        row.failures += 1
+    row.total_seconds += seconds
+    row.max_seconds = max(row.max_seconds, seconds)
+    sketch = DurationSketch.from_json(row.duration_sketch)
+    sketch.add(seconds)
+    row.duration_sketch = sketch.to_json()
+
+
+def _new_row(script_id: int, day: date) -> ScriptExecDaily:
+    return ScriptExecDaily(
+        script_id=script_id,
+        day=day,
+        runs=0,
+        successes=0,
+        failures=0,
+        total_seconds=0.0,
+        max_seconds=0.0,
+        duration_sketch="{}",
+    )
+
+
+def record_exec_stats(
+    db: Session, script_id: int, start_time: datetime, status: str, seconds: float
+) -> None:
+    """把一次结束的执行计入当天（按开始时间的 UTC 日期）的汇总（不提交）
+
+    由执行状态写线程调用，同一进程内没有并发写；写事务以 BEGIN IMMEDIATE
+    开始，与其他进程之间的读改写也不会交错。
+    """
+    day = start_time.date()
+    row = db.get(ScriptExecDaily, (script_id, day))
+    if row is None:
+        row = _new_row(script_id, day)
+        db.add(row)
+    _add_run(row, status, seconds)
+
+
+def record_last_run(
+    db: Session, script_id: int, exec_id: int, start_time: datetime, status: str
+) -> None:
+    """更新脚本上的最近执行摘要与累计次数（不提交）
+
+    一条 UPDATE 完成，计数在 SQL 里自增；多个执行乱序结束时，只有开始
+    时间不早于当前 last_run_at 的执行才覆盖 last_* 字段。update_time
+    表示脚本本身的修改时间，这里显式保持原值，避免触发 onupdate。
+    """
+    newer = or_(ScriptItem.last_run_at.is_(None), ScriptItem.last_run_at <= start_time)
+    db.execute(
+        update(ScriptItem)
+        .where(ScriptItem.id == script_id)
+        .values(
+            last_exec_id=case((newer, exec_id), else_=ScriptItem.last_exec_id),
+            last_status=case((newer, status), else_=ScriptItem.last_status),
+            last_run_at=case((newer, start_time), else_=ScriptItem.last_run_at),
+            run_count=ScriptItem.run_count + 1,
+            fail_count=ScriptItem.fail_count + (0 if status == "success" else 1),
+            update_time=ScriptItem.update_time,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def rebuild_exec_stats(db: Session, batch_size: int = 1000) -> int:
+    """按全部已结束的执行记录重建汇总表（不提交），返回计入的执行数"""
+    db.execute(delete(ScriptExecDaily))
+    rows: Dict[tuple, ScriptExecDaily] = {}
+    total = 0
+    last_id = 0
+    while True:
+        records = db.execute(
+            select(
+                ScriptExecRecord.id,
+                ScriptExecRecord.script_id,
+                ScriptExecRecord.start_time,
+                ScriptExecRecord.end_time,
+                ScriptExecRecord.status,
+            )
+            .where(
+                ScriptExecRecord.id > last_id,
+                ScriptExecRecord.status.in_(FINISHED_STATUSES),
+                ScriptExecRecord.start_time.isnot(None),
+                ScriptExecRecord.end_time.isnot(None),
+            )
+            .order_by(ScriptExecRecord.id)
+            .limit(batch_size)
+        ).all()
+        if not records:
+            break
+        for record in records:
+            key = (record.script_id, record.start_time.date())
+            row = rows.get(key)
+            if row is None:
+                row = rows[key] = _new_row(*key)
+            seconds = max((record.end_time - record.start_time).total_seconds(), 0.0)
+            _add_run(row, record.status, seconds)
+        total += len(records)
+        last_id = records[-1].id
+    db.add_all(rows.values())
+    return total
+
+
+def summarize(rows: Iterable[ScriptExecDaily]) -> dict:
+    """合并若干天的汇总，得到执行次数、成功率与耗时分位数"""
+    runs = successes = failures = 0
+    total_seconds = 0.0
+    max_seconds = None
+    sketch = DurationSketch()
+    for row in rows:
+        runs += row.runs
+        successes += row.successes
+        failures += row.failures
+        total_seconds += row.total_seconds
+        max_seconds = (
+            row.max_seconds if max_seconds is None else max(max_seconds, row.max_seconds)
+        )
+        sketch.merge(DurationSketch.from_json(row.duration_sketch))
+    return {
+        "runs": runs,
+        "successes": successes,
+        "failures": failures,
+        "success_rate": successes / runs if runs else None,
+        "avg_seconds": total_seconds / runs if runs else None,
+        "max_seconds": max_seconds,
+        "p50_seconds": sketch.quantile(0.5),
+        "p95_seconds": sketch.quantile(0.95),
+    }
+
+
+def predict_duration(db: Session, script_id: int, days: int) -> Optional[float]:
+    """按最近 days 天的汇总预测脚本耗时（中位数），没有历史时返回 None"""
+    start_day = datetime.utcnow().date() - timedelta(days=days - 1)
+    rows = db.scalars(
+        select(ScriptExecDaily).where(
+            ScriptExecDaily.script_id == script_id,
+            ScriptExecDaily.day >= start_day,
+        )
+    ).all()
+    return summarize(rows)["p50_seconds"]
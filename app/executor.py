@@ -1,16 +1,50 @@
 import json
 import os
 import subprocess
+import time
+from contextlib import ExitStack
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
-from sqlalchemy.orm import Session
-
+from sqlalchemy import update
+from sqlalchemy.orm import sessionmaker
+
+from .database import SessionLocal
+from .exec_log import LOG_LINE_TIMESTAMPS, LineTimestampWriter
+from .exec_stats import record_exec_stats, record_last_run
+from .metrics import (
+    DURATION_BUCKETS,
+    Counter,
+    Gauge,
+    Histogram,
+    registry,
+    script_label,
+)
 from .models import ScriptExecRecord, ScriptItem
+from .resource_usage import ProcessSampler, merge_usage, wait_with_rusage
+from .run_snapshots import RunSnapshotCache, run_snapshot_cache
+from .script_versions import get_blob_content, get_latest_version
+from .search import index_exec_log
+from .writer import ExecStateWriter, exec_writer
 
 LOG_BASE_DIR = Path("logs")
 
+exec_running_processes = registry.register(
+    Gauge("opstool_exec_running_processes", "正在运行的脚本子进程数")
+)
+exec_duration = registry.register(
+    Histogram(
+        "opstool_exec_duration_seconds",
+        "脚本执行耗时（脚本标签数量受 OPS_METRICS_MAX_SCRIPT_LABELS 限制）",
+        ("script", "status"),
+        buckets=DURATION_BUCKETS,
+    )
+)
+exec_log_bytes = registry.register(
+    Counter("opstool_exec_log_bytes_total", "写入执行日志的字节数")
+)
+
 
 def _ensure_log_dir(script_id: int) -> Path:
     date_str = datetime.utcnow().strftime("%Y%m%d")
@@ -19,36 +53,95 @@ def _ensure_log_dir(script_id: int) -> Path:
     return path
 
 
+def _current_version(session_factory: sessionmaker, script_id: int):
+    db = session_factory()
+    try:
+        return get_latest_version(db, script_id)
+    finally:
+        db.close()
+
+
+def _load_content(session_factory: sessionmaker, digest: str) -> str:
+    db = session_factory()
+    try:
+        content = get_blob_content(db, digest)
+    finally:
+        db.close()
+    if content is None:
+        raise RuntimeError(f"脚本内容 {digest} 不存在")
+    return content
+
+
 def run_script(
-    db: Session,
     script: ScriptItem,
     params_json: Optional[str],
     operator: Optional[str],
-) -> ScriptExecRecord:
-    exec_record = ScriptExecRecord(
-        script_id=script.id,
-        status="running",
-        operator=operator,
-        params_json=params_json,
-    )
-    db.add(exec_record)
-    db.commit()
-    db.refresh(exec_record)
+    writer: ExecStateWriter = exec_writer,
+    exec_id: Optional[int] = None,
+    snapshots: RunSnapshotCache = run_snapshot_cache,
+    session_factory: sessionmaker = SessionLocal,
+) -> int:
+    """执行脚本（阻塞直到结束），返回执行记录 id
+
+    exec_id 为已有的（排队中的）执行记录，开始时改为 running 并以当前
+    时间为开始时间；不传时新建记录。执行记录的所有写入都交给单写线程，
+    结束状态提交后才返回。
+
+    运行的是开始时最新版本的只读快照（按内容哈希缓存），执行记录保存该
+    版本的 id 与内容哈希，运行期间编辑脚本不影响本次执行；脚本没有任何
+    版本时才直接运行 script_path。
+    """
+    start_time = datetime.utcnow()
+    version = _current_version(session_factory, script.id)
+    pinned = {}
+    if version is not None:
+        pinned = {"version_id": version.id, "content_hash": version.content_hash}
+    if exec_id is None:
+        exec_id = writer.create(
+            script_id=script.id,
+            status="running",
+            operator=operator,
+            params_json=params_json,
+            start_time=start_time,
+            **pinned,
+        ).result()
+    else:
+        writer.update(exec_id, status="running", start_time=start_time, **pinned)
 
     log_dir = _ensure_log_dir(script.id)
-    log_path = log_dir / f"{exec_record.id}.log"
+    log_path = log_dir / f"{exec_id}.log"
 
-    command = _build_command(script, params_json)
+    snapshot_path = None
+    if version is not None:
+        snapshot_path = snapshots.path_for(
+            version.content_hash, Path(script.script_path).suffix
+        )
+    command = _build_command(script, params_json, snapshot_path)
 
-    exec_record.log_path = str(log_path)
-    db.commit()
+    writer.update(exec_id, log_path=str(log_path))
 
-    with open(log_path, "w", encoding="utf-8") as log_file:
-        log_file.write(f"Command: {command}\n")
-        log_file.write(f"Start: {exec_record.start_time.isoformat()}Z\n\n")
+    # 以二进制写入并显式编码，tell() 才是逐行时间戳需要的字节偏移
+    with open(log_path, "wb") as log_file, ExitStack() as held:
+        log_file.write(f"Command: {command}\n".encode("utf-8"))
+        log_file.write(f"Start: {start_time.isoformat()}Z\n\n".encode("utf-8"))
         log_file.flush()
 
+        line_times = (
+            LineTimestampWriter(log_path, start_time, log_file.tell())
+            if LOG_LINE_TIMESTAMPS
+            else None
+        )
+        started = time.monotonic()
+        usage = {}
         try:
+            if snapshot_path is not None:
+                # 物化失败按执行失败记录；快照在运行结束前不会被淘汰
+                held.enter_context(
+                    snapshots.acquire(
+                        snapshot_path,
+                        lambda: _load_content(session_factory, version.content_hash),
+                    )
+                )
             process = subprocess.Popen(
                 command,
                 shell=True,
@@ -57,27 +150,70 @@ def run_script(
                 text=True,
                 encoding="utf-8",
             )
-            assert process.stdout is not None
-            for line in process.stdout:
-                log_file.write(line)
-                log_file.flush()
-            process.wait()
-            exec_record.exit_code = process.returncode
-            exec_record.status = (
-                "success" if process.returncode == 0 else "fail"
-            )
+            exec_running_processes.inc()
+            sampler = ProcessSampler(process.pid).start()
+            rusage = None
+            try:
+                assert process.stdout is not None
+                for line in process.stdout:
+                    data = line.encode("utf-8")
+                    log_file.write(data)
+                    log_file.flush()
+                    exec_log_bytes.inc(len(data))
+                    if line_times:
+                        line_times.record(log_file.tell())
+                # 用 wait4 回收子进程，顺带取得 CPU 时间、峰值内存等资源占用
+                exit_code, rusage = wait_with_rusage(process)
+            finally:
+                usage = merge_usage(rusage, sampler.stop())
+                exec_running_processes.dec()
+            status = "success" if exit_code == 0 else "fail"
         except Exception as exc:  # pragma: no cover
-            log_file.write(f"\n[ERROR] {exc}\n")
-            exec_record.exit_code = -1
-            exec_record.status = "fail"
+            log_file.write(f"\n[ERROR] {exc}\n".encode("utf-8"))
+            log_file.flush()
+            if line_times:
+                line_times.record(log_file.tell())
+            exit_code = -1
+            status = "fail"
+        finally:
+            if line_times:
+                line_times.close()
+
+    exec_duration.observe(
+        time.monotonic() - started, script=script_label(script.id), status=status
+    )
+
+    end_time = datetime.utcnow()
+    seconds = (end_time - start_time).total_seconds()
+
+    # 结束状态、脚本上的最近执行摘要与每日汇总在同一个写操作（同一保存点、
+    # 同一次提交）里完成，要么都生效要么都不生效
+    def record_finished(session):
+        session.execute(
+            update(ScriptExecRecord)
+            .where(ScriptExecRecord.id == exec_id)
+            .values(exit_code=exit_code, status=status, end_time=end_time, **usage)
+        )
+        record_last_run(session, script.id, exec_id, start_time, status)
+        record_exec_stats(session, script.id, start_time, status, seconds)
+
+    # 等结束状态与统计提交后再返回，保证调用方读到的是最终结果
+    writer.call(record_finished).result()
+    writer.call(
+        lambda session: index_exec_log(session, exec_id, str(log_path))
+    ).add_done_callback(_warn_index_failure)
+    return exec_id
+
 
-    exec_record.end_time = datetime.utcnow()
-    db.commit()
-    db.refresh(exec_record)
-    return exec_record
+def _warn_index_failure(future) -> None:
+    exc = future.exception()
+    if exc is not None:  # 索引失败不影响执行结果
+        print(f"警告：日志全文索引失败: {exc}")
 
 
-def _build_command(script: ScriptItem, params_json: Optional[str]) -> str:
+def _build_command(
+    script: ScriptItem, params_json: Optional[str], script_file: Optional[Path] = None
+) -> str:
     params = {}
     if params_json:
         try:
@@ -85,9 +221,12 @@ def _build_command(script: ScriptItem, params_json: Optional[str]) -> str:
         except json.JSONDecodeError:
             params = {}
 
-    script_path = script.script_path
-    if not os.path.isabs(script_path):
-        script_path = str(Path("scripts") / script_path)
+    if script_file is not None:
+        script_path = str(script_file)
+    else:
+        script_path = script.script_path
+        if not os.path.isabs(script_path):
+            script_path = str(Path("scripts") / script_path)
 
     if script.exec_command_template:
         return script.exec_command_template.format(
@@ -1,19 +1,78 @@
+import threading
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import List, Optional
 
-from fastapi import Depends, FastAPI, Form, HTTPException, Request, status
+from fastapi import (
+    BackgroundTasks,
+    Depends,
+    FastAPI,
+    Form,
+    HTTPException,
+    Query,
+    Request,
+    status,
+)
 from fastapi.responses import HTMLResponse, PlainTextResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.sessions import SessionMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 
 from . import models, schemas
-from .auth import authenticate_user, get_current_user, get_current_user_optional, get_password_hash
-from .database import Base, engine, get_db
-from .executor import run_script
+from .auth import (
+    PasswordPoolFull,
+    authenticate_user,
+    generate_api_token,
+    get_current_user,
+    get_current_user_optional,
+    get_password_hash,
+    password_needs_rehash,
+    rehash_password,
+)
+from .database import (
+    SessionLocal,
+    async_engine,
+    async_read_engine,
+    engine,
+    get_read_db,
+    get_write_db,
+    upgrade_database,
+)
+from .diffing import format_unified
+from .exec_log import read_log_range
+from .exec_stats import summarize
+from .metrics import MetricsMiddleware, registry
+from .sql_stats import SQLStatsMiddleware, install_sql_stats
+from .user_cache import bump_auth_stamp, user_cache
+from .writer import exec_writer
+from .resource_usage import format_usage
+from .scheduler import exec_scheduler
+from .script_versions import (
+    add_version,
+    content_hash,
+    delete_orphan_blobs,
+    diff_versions,
+    find_versions_by_hash,
+    get_blob_content,
+    get_latest_content,
+)
+from .pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, keyset_page
+from .search import (
+    index_pending_logs,
+    index_script,
+    rebuild_script_index,
+    remove_exec_logs,
+    remove_script_index,
+    script_rank_subquery,
+    search_exec_logs,
+)
 
-Base.metadata.create_all(bind=engine)
+upgrade_database()
 
 app = FastAPI(title="运维工具箱")
 
@@ -26,14 +85,90 @@ app.add_middleware(
     https_only=False,  # 开发环境设为 False，生产环境应设为 True
 )
 
+# 统计每个请求的 SQL 语句数与数据库耗时，并记录慢查询
+for _engine in (engine, async_engine.sync_engine, async_read_engine.sync_engine):
+    install_sql_stats(_engine)
+
+
+# 在 Session 中间件外层，访问日志可以读到 scope 中的 session
+app.add_middleware(SQLStatsMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+
 templates = Jinja2Templates(directory="templates")
+templates.env.filters["usage"] = format_usage
 static_dir = Path("static")
 static_dir.mkdir(exist_ok=True)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
+def _backfill_search_index():
+    db = SessionLocal()
+    try:
+        rebuild_script_index(db)
+        index_pending_logs(db)
+    except Exception as e:
+        print(f"警告：补建全文索引失败: {e}")
+    finally:
+        db.close()
+
+
+async def _latest_version(
+    db: AsyncSession, script_id: int
+) -> Optional[models.ScriptVersion]:
+    return await db.scalar(
+        select(models.ScriptVersion)
+        .where(models.ScriptVersion.script_id == script_id)
+        .order_by(models.ScriptVersion.version.desc())
+        .limit(1)
+    )
+
+
+def _read_exec_log(
+    path: Path,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    timestamps: bool,
+) -> Optional[str]:
+    """在线程池中读取日志文件，按时间窗口过滤时无逐行时间戳返回 None"""
+    if not path.exists():
+        return ""
+    if start is None and end is None and not timestamps:
+        return path.read_text(encoding="utf-8")
+    return read_log_range(path, start, end, with_timestamps=timestamps)
+
+
+@app.on_event("startup")
+def recover_interrupted_execs():
+    """上次进程遗留的排队/运行中执行记录标记为已取消/失败"""
+    recovered = exec_scheduler.recover_interrupted()
+    if recovered:
+        print(f"已收尾 {recovered} 条中断的执行记录")
+
+
+@app.on_event("startup")
+def start_search_index_backfill():
+    """后台补建脚本目录与历史执行日志的全文索引"""
+    threading.Thread(target=_backfill_search_index, daemon=True).start()
+
+
+@app.on_event("shutdown")
+def stop_exec_writer():
+    """取消仍在排队的执行，并提交单写线程中尚未落库的执行状态"""
+    exec_scheduler.stop()
+    exec_writer.stop(timeout=10)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus 文本格式的运行指标（不需要登录，部署时应只对监控网络开放）"""
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 @app.get("/login", response_class=HTMLResponse)
-def login_page(request: Request):
+async def login_page(request: Request):
     """登录页面"""
     error = request.query_params.get("error", "")
     return templates.TemplateResponse(
@@ -46,15 +181,23 @@ def login_page(request: Request):
 
 
 @app.post("/api/login")
-def login(
+async def login(
     username: str = Form(...),
     password: str = Form(...),
     next: str = Form("/"),
     request: Request = ...,
-    db: Session = Depends(get_db),
+    background_tasks: BackgroundTasks = ...,
+    db: AsyncSession = Depends(get_read_db),
 ):
     """登录接口"""
-    user = authenticate_user(db, username, password)
+    try:
+        user = await authenticate_user(db, username, password)
+    except PasswordPoolFull:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="登录请求过多，请稍后重试",
+            headers={"Retry-After": "1"},
+        )
     if not user:
         return RedirectResponse(
             url="/login?error=用户名或密码错误", status_code=status.HTTP_303_SEE_OTHER
@@ -63,28 +206,92 @@ def login(
     # 设置 Session
     request.session["user_id"] = user.id
     request.session["username"] = user.username
+
+    if password_needs_rehash(user.hashed_password):
+        background_tasks.add_task(
+            rehash_password, user.id, password, user.hashed_password
+        )
     
     # 重定向到原始页面或首页
     return RedirectResponse(url=next, status_code=status.HTTP_303_SEE_OTHER)
 
 
 @app.post("/api/logout")
-def logout(request: Request):
+async def logout(request: Request):
     """登出接口"""
     request.session.clear()
     return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
 
 
 @app.get("/api/me", response_model=schemas.UserOut)
-def get_current_user_info(current_user: models.User = Depends(get_current_user)):
+async def get_current_user_info(current_user: models.User = Depends(get_current_user)):
     """获取当前登录用户信息"""
     return current_user
 
 
+@app.get("/api/tokens", response_model=List[schemas.ApiTokenOut])
+async def list_api_tokens(
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """当前用户的 API 令牌（不含明文）"""
+    tokens = await db.scalars(
+        select(models.ApiToken)
+        .where(models.ApiToken.user_id == current_user.id)
+        .order_by(models.ApiToken.id)
+    )
+    return tokens.all()
+
+
+@app.post("/api/tokens", response_model=schemas.ApiTokenCreated)
+async def create_api_token(
+    payload: schemas.ApiTokenCreate,
+    db: AsyncSession = Depends(get_write_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """创建 API 令牌，明文只在本次响应中返回"""
+    token, token_hash = generate_api_token()
+    obj = models.ApiToken(
+        user_id=current_user.id,
+        name=payload.name,
+        token_hash=token_hash,
+        token_prefix=token[:12],
+    )
+    db.add(obj)
+    await db.commit()
+    await db.refresh(obj)
+    return schemas.ApiTokenCreated(
+        id=obj.id,
+        name=obj.name,
+        token_prefix=obj.token_prefix,
+        create_time=obj.create_time,
+        token=token,
+    )
+
+
+@app.delete("/api/tokens/{token_id}")
+async def revoke_api_token(
+    token_id: int,
+    db: AsyncSession = Depends(get_write_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """吊销 API 令牌"""
+    obj = await db.get(models.ApiToken, token_id)
+    if not obj or obj.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="令牌不存在")
+    token_hash = obj.token_hash
+    await db.delete(obj)
+    # 其他进程的令牌缓存靠版本戳失效
+    await db.run_sync(bump_auth_stamp)
+    await db.commit()
+    user_cache.invalidate_token(token_hash)
+    return {"ok": True}
+
+
 @app.get("/", response_class=HTMLResponse)
-def index(
+async def index(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: Optional[models.User] = Depends(get_current_user_optional),
 ):
     # 如果未登录，重定向到登录页面
@@ -92,16 +299,19 @@ def index(
         next_url = str(request.url)
         return RedirectResponse(url=f"/login?next={next_url}", status_code=status.HTTP_303_SEE_OTHER)
     
-    categories = db.query(models.ScriptCategory).order_by(
-        models.ScriptCategory.order
-    )
+    categories = (
+        await db.scalars(
+            select(models.ScriptCategory).order_by(models.ScriptCategory.order)
+        )
+    ).all()
     scripts = (
-        db.query(models.ScriptItem)
-        .filter(models.ScriptItem.enabled.is_(True))
-        .order_by(models.ScriptItem.update_time.desc())
-        .limit(20)
-        .all()
-    )
+        await db.scalars(
+            select(models.ScriptItem)
+            .where(models.ScriptItem.enabled.is_(True))
+            .order_by(models.ScriptItem.update_time.desc())
+            .limit(20)
+        )
+    ).all()
     return templates.TemplateResponse(
         "index.html",
         {
@@ -114,9 +324,9 @@ def index(
 
 
 @app.get("/manage/scripts", response_class=HTMLResponse)
-def manage_scripts(
+async def manage_scripts(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: Optional[models.User] = Depends(get_current_user_optional),
 ):
     # 如果未登录，重定向到登录页面
@@ -125,10 +335,10 @@ def manage_scripts(
         return RedirectResponse(url=f"/login?next={next_url}", status_code=status.HTTP_303_SEE_OTHER)
     
     categories = (
-        db.query(models.ScriptCategory)
-        .order_by(models.ScriptCategory.order)
-        .all()
-    )
+        await db.scalars(
+            select(models.ScriptCategory).order_by(models.ScriptCategory.order)
+        )
+    ).all()
     return templates.TemplateResponse(
         "manage_scripts.html",
         {
@@ -142,32 +352,33 @@ def manage_scripts(
 @app.get(
     "/scripts/{script_id}", response_class=HTMLResponse, name="script_detail"
 )
-def script_detail(
+async def script_detail(
     script_id: int,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: Optional[models.User] = Depends(get_current_user_optional),
 ):
     # 如果未登录，重定向到登录页面
     if not current_user:
         next_url = str(request.url)
         return RedirectResponse(url=f"/login?next={next_url}", status_code=status.HTTP_303_SEE_OTHER)
-    script = db.query(models.ScriptItem).get(script_id)
+    # 模板里用到分类名，关系禁止懒加载，随主查询一起 JOIN 取出
+    script = await db.get(
+        models.ScriptItem,
+        script_id,
+        options=[joinedload(models.ScriptItem.category)],
+    )
     if not script:
         raise HTTPException(status_code=404, detail="脚本不存在")
-    latest_version = (
-        db.query(models.ScriptVersion)
-        .filter(models.ScriptVersion.script_id == script_id)
-        .order_by(models.ScriptVersion.version.desc())
-        .first()
-    )
+    latest_version = await _latest_version(db, script_id)
     recent_exec = (
-        db.query(models.ScriptExecRecord)
-        .filter(models.ScriptExecRecord.script_id == script_id)
-        .order_by(models.ScriptExecRecord.start_time.desc())
-        .limit(10)
-        .all()
-    )
+        await db.scalars(
+            select(models.ScriptExecRecord)
+            .where(models.ScriptExecRecord.script_id == script_id)
+            .order_by(models.ScriptExecRecord.start_time.desc())
+            .limit(10)
+        )
+    ).all()
     return templates.TemplateResponse(
         "script_detail.html",
         {
@@ -181,91 +392,128 @@ def script_detail(
 
 
 @app.get("/api/categories", response_model=List[schemas.ScriptCategoryOut])
-def list_categories(
-    db: Session = Depends(get_db),
+async def list_categories(
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    items = db.query(models.ScriptCategory).order_by(
-        models.ScriptCategory.order
+    items = await db.scalars(
+        select(models.ScriptCategory).order_by(models.ScriptCategory.order)
     )
     return items.all()
 
 
 @app.post("/api/categories", response_model=schemas.ScriptCategoryOut)
-def create_category(
+async def create_category(
     payload: schemas.ScriptCategoryCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_write_db),
     current_user: models.User = Depends(get_current_user),
 ):
     obj = models.ScriptCategory(**payload.model_dump())
     db.add(obj)
-    db.commit()
-    db.refresh(obj)
+    await db.commit()
+    await db.refresh(obj)
     return obj
 
 
 @app.put("/api/categories/{category_id}")
-def update_category(
+async def update_category(
     category_id: int,
     payload: schemas.ScriptCategoryUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_write_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    obj = db.query(models.ScriptCategory).get(category_id)
+    obj = await db.get(models.ScriptCategory, category_id)
     if not obj:
         raise HTTPException(status_code=404, detail="分类不存在")
     for k, v in payload.model_dump(exclude_unset=True).items():
         setattr(obj, k, v)
-    db.commit()
+    await db.commit()
     return {"ok": True}
 
 
 @app.delete("/api/categories/{category_id}")
-def delete_category(
+async def delete_category(
     category_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_write_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    obj = db.query(models.ScriptCategory).get(category_id)
+    obj = await db.get(models.ScriptCategory, category_id)
     if not obj:
         raise HTTPException(status_code=404, detail="分类不存在")
-    db.delete(obj)
-    db.commit()
+    await db.delete(obj)
+    await db.commit()
     return {"ok": True}
 
 
-@app.get("/api/scripts", response_model=List[schemas.ScriptItemOut])
-def list_scripts(
+@app.get("/api/scripts", response_model=schemas.ScriptItemPage)
+async def list_scripts(
     category_id: Optional[int] = None,
     keyword: Optional[str] = None,
-    db: Session = Depends(get_db),
+    enabled: Optional[bool] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    query = db.query(models.ScriptItem)
+    """脚本列表，按更新时间倒序游标分页；带关键字时按相关度排序"""
+    filters = []
     if category_id is not None:
-        query = query.filter(models.ScriptItem.category_id == category_id)
-    if keyword:
-        like = f"%{keyword}%"
-        query = query.filter(models.ScriptItem.title.like(like))
-    return query.order_by(models.ScriptItem.update_time.desc()).all()
+        filters.append(models.ScriptItem.category_id == category_id)
+    if enabled is not None:
+        filters.append(models.ScriptItem.enabled.is_(enabled))
+
+    try:
+        if keyword:
+            # 全文检索标题、描述和最新版本内容
+            ranked = script_rank_subquery(keyword)
+            if ranked is None:
+                return schemas.ScriptItemPage(items=[])
+            stmt = (
+                select(models.ScriptItem, ranked.c.rank)
+                .join(ranked, ranked.c.script_id == models.ScriptItem.id)
+                .where(*filters)
+            )
+            rows, next_cursor = await keyset_page(
+                db,
+                stmt,
+                [ranked.c.rank, models.ScriptItem.id],
+                lambda row: [row.rank, row.ScriptItem.id],
+                cursor=cursor,
+                limit=limit,
+                descending=False,
+            )
+            items = [row.ScriptItem for row in rows]
+        else:
+            rows, next_cursor = await keyset_page(
+                db,
+                select(models.ScriptItem).where(*filters),
+                [models.ScriptItem.update_time, models.ScriptItem.id],
+                lambda row: [row.ScriptItem.update_time, row.ScriptItem.id],
+                cursor=cursor,
+                limit=limit,
+            )
+            items = [row.ScriptItem for row in rows]
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+    return schemas.ScriptItemPage(items=items, next_cursor=next_cursor)
 
 
 @app.get("/api/scripts/{script_id}", response_model=schemas.ScriptItemOut)
-def get_script(
+async def get_script(
     script_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    script = db.query(models.ScriptItem).get(script_id)
+    script = await db.get(models.ScriptItem, script_id)
     if not script:
         raise HTTPException(status_code=404, detail="脚本不存在")
     return script
 
 
 @app.post("/api/scripts", response_model=schemas.ScriptItemOut)
-def create_script(
+async def create_script(
     payload: schemas.ScriptItemCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_write_db),
     current_user: models.User = Depends(get_current_user),
 ):
     script = models.ScriptItem(
@@ -279,8 +527,8 @@ def create_script(
         is_dangerous=payload.is_dangerous,
     )
     db.add(script)
-    db.commit()
-    db.refresh(script)
+    await db.commit()
+    await db.refresh(script)
 
     if payload.initial_content is not None:
         scripts_dir = Path("scripts")
@@ -291,43 +539,45 @@ def create_script(
             else scripts_dir / script.script_path
         )
         script_path.parent.mkdir(parents=True, exist_ok=True)
-        script_path.write_text(payload.initial_content, encoding="utf-8")
+        await run_in_threadpool(
+            script_path.write_text, payload.initial_content, encoding="utf-8"
+        )
 
-        version = models.ScriptVersion(
-            script_id=script.id,
-            version=1,
-            content=payload.initial_content,
-            editor="system",
+        await db.run_sync(
+            add_version, script.id, 1, payload.initial_content, editor="system"
         )
-        db.add(version)
-        db.commit()
 
+    await db.run_sync(index_script, script, payload.initial_content)
+    await db.commit()
     return script
 
 
 @app.put("/api/scripts/{script_id}")
-def update_script(
+async def update_script(
     script_id: int,
     payload: schemas.ScriptItemUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_write_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    script = db.query(models.ScriptItem).get(script_id)
+    script = await db.get(models.ScriptItem, script_id)
     if not script:
         raise HTTPException(status_code=404, detail="脚本不存在")
-    for k, v in payload.model_dump(exclude_unset=True).items():
+    changes = payload.model_dump(exclude_unset=True)
+    for k, v in changes.items():
         setattr(script, k, v)
-    db.commit()
+    if "title" in changes or "description" in changes:
+        await db.run_sync(index_script, script)
+    await db.commit()
     return {"ok": True}
 
 
 @app.delete("/api/scripts/{script_id}")
-def delete_script(
+async def delete_script(
     script_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_write_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    script = db.query(models.ScriptItem).get(script_id)
+    script = await db.get(models.ScriptItem, script_id)
     if not script:
         raise HTTPException(status_code=404, detail="脚本不存在")
     
@@ -340,45 +590,56 @@ def delete_script(
     )
     if script_path.exists():
         try:
-            script_path.unlink()
+            await run_in_threadpool(script_path.unlink)
         except Exception as e:
             # 如果文件删除失败，记录日志但不阻止删除操作
             print(f"警告：删除脚本文件失败 {script_path}: {e}")
     
-    # 删除关联的版本记录
-    db.query(models.ScriptVersion).filter(
-        models.ScriptVersion.script_id == script_id
-    ).delete()
-    
+    # 删除脚本及关联执行日志的全文索引
+    await db.run_sync(remove_script_index, script_id)
+    await db.run_sync(remove_exec_logs, script_id)
+
+    await db.execute(
+        delete(models.ScriptExecDaily).where(
+            models.ScriptExecDaily.script_id == script_id
+        )
+    )
+
     # 删除关联的执行记录（可选：也可以保留历史记录，这里选择删除）
-    db.query(models.ScriptExecRecord).filter(
-        models.ScriptExecRecord.script_id == script_id
-    ).delete()
+    await db.execute(
+        delete(models.ScriptExecRecord).where(
+            models.ScriptExecRecord.script_id == script_id
+        )
+    )
+
+    # 删除关联的版本记录（执行记录引用版本，放在其后）
+    await db.execute(
+        delete(models.ScriptVersion).where(
+            models.ScriptVersion.script_id == script_id
+        )
+    )
+    await db.run_sync(delete_orphan_blobs)
     
     # 删除脚本条目本身
-    db.delete(script)
-    db.commit()
+    await db.delete(script)
+    await db.commit()
     return {"ok": True}
 
 
 @app.get("/api/scripts/{script_id}/content", response_model=schemas.ScriptContentOut)
-def get_script_content(
+async def get_script_content(
     script_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    script = db.query(models.ScriptItem).get(script_id)
+    script = await db.get(models.ScriptItem, script_id)
     if not script:
         raise HTTPException(status_code=404, detail="脚本不存在")
-    latest_version = (
-        db.query(models.ScriptVersion)
-        .filter(models.ScriptVersion.script_id == script_id)
-        .order_by(models.ScriptVersion.version.desc())
-        .first()
-    )
-    if latest_version:
+    latest = await db.run_sync(get_latest_content, script_id)
+    if latest is not None:
+        version, digest, content = latest
         return schemas.ScriptContentOut(
-            content=latest_version.content, version=latest_version.version
+            content=content, version=version, content_hash=digest
         )
 
     scripts_dir = Path("scripts")
@@ -388,31 +649,46 @@ def get_script_content(
         else scripts_dir / script.script_path
     )
     if script_path.exists():
-        content = script_path.read_text(encoding="utf-8")
+        content = await run_in_threadpool(script_path.read_text, encoding="utf-8")
     else:
         content = ""
     return schemas.ScriptContentOut(content=content, version=0)
 
 
 @app.put("/api/scripts/{script_id}/content")
-def update_script_content(
+async def update_script_content(
     script_id: int,
     payload: schemas.ScriptContentUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_write_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    script = db.query(models.ScriptItem).get(script_id)
+    script = await db.get(models.ScriptItem, script_id)
     if not script:
         raise HTTPException(status_code=404, detail="脚本不存在")
 
-    latest_version = (
-        db.query(models.ScriptVersion)
-        .filter(models.ScriptVersion.script_id == script_id)
-        .order_by(models.ScriptVersion.version.desc())
-        .first()
-    )
+    latest_version = await _latest_version(db, script_id)
+    if latest_version and latest_version.content_hash == content_hash(payload.content):
+        # 内容与最新版本相同：不新增版本，也不改写脚本文件
+        return {"ok": True, "version": latest_version.version, "unchanged": True}
     next_ver = 1 if not latest_version else latest_version.version + 1
 
+    await db.run_sync(
+        add_version,
+        script.id,
+        next_ver,
+        payload.content,
+        editor=payload.editor or "unknown",
+        remark=payload.remark,
+    )
+    await db.run_sync(index_script, script, payload.content)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # (script_id, version) 唯一，并发保存时后提交的一方失败
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="版本冲突，请刷新后重试")
+
+    # 版本提交成功后才改写脚本文件，冲突被拒绝的内容不会落到磁盘上
     scripts_dir = Path("scripts")
     script_path = (
         Path(script.script_path)
@@ -420,64 +696,299 @@ def update_script_content(
         else scripts_dir / script.script_path
     )
     script_path.parent.mkdir(parents=True, exist_ok=True)
-    script_path.write_text(payload.content, encoding="utf-8")
+    await run_in_threadpool(script_path.write_text, payload.content, encoding="utf-8")
+    return {"ok": True, "version": next_ver}
 
-    version = models.ScriptVersion(
-        script_id=script.id,
-        version=next_ver,
-        content=payload.content,
-        editor=payload.editor or "unknown",
-        remark=payload.remark,
+
+@app.get("/api/scripts/{script_id}/versions", response_model=schemas.ScriptVersionPage)
+async def list_script_versions(
+    script_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """脚本版本历史，按版本号倒序游标分页，只返回元数据不含正文"""
+    Version = models.ScriptVersion
+    stmt = (
+        select(
+            Version.id,
+            Version.version,
+            Version.editor,
+            Version.remark,
+            Version.create_time,
+            Version.content_hash,
+            models.ScriptBlob.size,
+        )
+        .join(models.ScriptBlob, models.ScriptBlob.hash == Version.content_hash)
+        .where(Version.script_id == script_id)
     )
-    db.add(version)
-    db.commit()
-    return {"ok": True, "version": next_ver}
+    try:
+        rows, next_cursor = await keyset_page(
+            db,
+            stmt,
+            [Version.version],
+            lambda row: [row.version],
+            cursor=cursor,
+            limit=limit,
+        )
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+    return schemas.ScriptVersionPage(items=rows, next_cursor=next_cursor)
+
+
+@app.get(
+    "/api/scripts/{script_id}/versions/{version}",
+    response_model=schemas.ScriptContentOut,
+)
+async def get_script_version(
+    script_id: int,
+    version: int,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """单个版本的完整内容"""
+    digest = await db.scalar(
+        select(models.ScriptVersion.content_hash).where(
+            models.ScriptVersion.script_id == script_id,
+            models.ScriptVersion.version == version,
+        )
+    )
+    if digest is None:
+        raise HTTPException(status_code=404, detail="版本不存在")
+    content = await db.run_sync(get_blob_content, digest)
+    return schemas.ScriptContentOut(
+        content=content, version=version, content_hash=digest
+    )
+
+
+@app.get("/api/scripts/{script_id}/diff", response_model=schemas.ScriptDiffOut)
+async def diff_script_versions(
+    script_id: int,
+    from_version: int = Query(..., alias="from", ge=1),
+    to_version: int = Query(..., alias="to", ge=1),
+    format: str = Query("unified", pattern="^(unified|structured)$"),
+    context: int = Query(3, ge=0, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """两个版本之间的行级差异，在服务端计算并按内容哈希缓存"""
+    result = await db.run_sync(
+        diff_versions, script_id, from_version, to_version, context
+    )
+    if result is None:
+        raise HTTPException(status_code=404, detail="版本不存在")
+    from_hash, to_hash, hunks = result
+    if format == "structured":
+        body = {"hunks": hunks}
+    else:
+        body = {
+            "unified": format_unified(hunks, f"v{from_version}", f"v{to_version}")
+        }
+    return schemas.ScriptDiffOut(
+        script_id=script_id,
+        from_version=from_version,
+        to_version=to_version,
+        from_hash=from_hash,
+        to_hash=to_hash,
+        added=sum(line["op"] == "+" for hunk in hunks for line in hunk["lines"]),
+        removed=sum(line["op"] == "-" for hunk in hunks for line in hunk["lines"]),
+        **body,
+    )
+
+
+@app.get(
+    "/api/content/{sha256}/versions",
+    response_model=List[schemas.ContentVersionOut],
+)
+async def list_versions_by_content(
+    sha256: str,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """内容与给定 SHA-256 完全相同的全部脚本版本"""
+    return await db.run_sync(find_versions_by_hash, sha256.lower())
 
 
 @app.post("/api/scripts/{script_id}/run", response_model=schemas.ScriptExecOut)
-def run_script_api(
+async def run_script_api(
     script_id: int,
     payload: schemas.ScriptExecStart,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    script = db.query(models.ScriptItem).get(script_id)
+    # 执行记录由单写线程写入，请求本身只需读连接
+    script = await db.get(models.ScriptItem, script_id)
     if not script:
         raise HTTPException(status_code=404, detail="脚本不存在")
-    exec_record = run_script(
-        db=db,
-        script=script,
-        params_json=payload.params_json,
-        operator=payload.operator,
+    # 结束只读事务并归还连接，等待执行记录写入期间不占用连接池
+    await db.commit()
+    # 执行交给调度器排队，立即返回 queued 状态的记录，客户端轮询 /api/exec/{id}
+    exec_id = await run_in_threadpool(
+        exec_scheduler.submit, script.id, payload.params_json, payload.operator
+    )
+    return _exec_out(await db.get(models.ScriptExecRecord, exec_id))
+
+
+def _exec_out(rec: models.ScriptExecRecord) -> schemas.ScriptExecOut:
+    """执行记录附带调度器的排队位置与预计开始/结束时间"""
+    out = schemas.ScriptExecOut.model_validate(rec)
+    estimate = exec_scheduler.estimate(rec.id)
+    if estimate is not None:
+        out = out.model_copy(update=estimate)
+    return out
+
+
+@app.get("/api/scripts/{script_id}/execs", response_model=schemas.ScriptExecPage)
+async def list_script_execs(
+    script_id: int,
+    status: Optional[str] = None,
+    operator: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """脚本执行历史，按开始时间倒序游标分页"""
+    Record = models.ScriptExecRecord
+    stmt = select(Record).where(Record.script_id == script_id)
+    if status:
+        stmt = stmt.where(Record.status == status)
+    if operator:
+        stmt = stmt.where(Record.operator == operator)
+    if start is not None:
+        stmt = stmt.where(Record.start_time >= start)
+    if end is not None:
+        stmt = stmt.where(Record.start_time < end)
+    try:
+        rows, next_cursor = await keyset_page(
+            db,
+            stmt,
+            [Record.start_time, Record.id],
+            lambda row: [row.ScriptExecRecord.start_time, row.ScriptExecRecord.id],
+            cursor=cursor,
+            limit=limit,
+        )
+        items = [row.ScriptExecRecord for row in rows]
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+    return schemas.ScriptExecPage(items=items, next_cursor=next_cursor)
+
+
+def _stats_window(days: int):
+    end_day = datetime.utcnow().date()
+    return end_day - timedelta(days=days - 1), end_day
+
+
+@app.get("/api/scripts/{script_id}/stats", response_model=schemas.ScriptExecStats)
+async def get_script_stats(
+    script_id: int,
+    days: int = Query(30, ge=1, le=366),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """脚本最近 days 天（UTC）的执行次数、成功率与耗时分位数，按天给出明细
+
+    只读每天一行的汇总表，耗时与执行历史的长短无关。
+    """
+    if not await db.get(models.ScriptItem, script_id):
+        raise HTTPException(status_code=404, detail="脚本不存在")
+    start_day, end_day = _stats_window(days)
+    Daily = models.ScriptExecDaily
+    rows = (
+        await db.scalars(
+            select(Daily)
+            .where(Daily.script_id == script_id, Daily.day >= start_day)
+            .order_by(Daily.day)
+        )
+    ).all()
+    return schemas.ScriptExecStats(
+        script_id=script_id,
+        start_day=start_day,
+        end_day=end_day,
+        daily=[schemas.ExecStatsDay(day=row.day, **summarize([row])) for row in rows],
+        **summarize(rows),
     )
-    return exec_record
+
+
+@app.get("/api/stats/scripts", response_model=List[schemas.ScriptExecStats])
+async def list_script_stats(
+    days: int = Query(7, ge=1, le=366),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """各脚本最近 days 天（UTC）的执行汇总（不含按天明细），只包含有执行的脚本"""
+    start_day, end_day = _stats_window(days)
+    Daily = models.ScriptExecDaily
+    rows = (
+        await db.scalars(
+            select(Daily).where(Daily.day >= start_day).order_by(Daily.script_id)
+        )
+    ).all()
+    by_script = {}
+    for row in rows:
+        by_script.setdefault(row.script_id, []).append(row)
+    return [
+        schemas.ScriptExecStats(
+            script_id=script_id,
+            start_day=start_day,
+            end_day=end_day,
+            **summarize(script_rows),
+        )
+        for script_id, script_rows in by_script.items()
+    ]
 
 
 @app.get("/api/exec/{exec_id}", response_model=schemas.ScriptExecOut)
-def get_exec(
+async def get_exec(
     exec_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    rec = db.query(models.ScriptExecRecord).get(exec_id)
+    rec = await db.get(models.ScriptExecRecord, exec_id)
     if not rec:
         raise HTTPException(status_code=404, detail="执行记录不存在")
-    return rec
+    return _exec_out(rec)
 
 
 @app.get("/api/exec/{exec_id}/log", response_class=PlainTextResponse)
-def get_exec_log(
+async def get_exec_log(
     exec_id: int,
-    db: Session = Depends(get_db),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    timestamps: bool = False,
+    db: AsyncSession = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
 ):
-    rec = db.query(models.ScriptExecRecord).get(exec_id)
+    """获取执行日志，可按时间窗口（UTC）过滤并附带每行时间"""
+    rec = await db.get(models.ScriptExecRecord, exec_id)
     if not rec:
         raise HTTPException(status_code=404, detail="执行记录不存在")
     if not rec.log_path:
         return ""
-    path = Path(rec.log_path)
-    if not path.exists():
-        return ""
-    return path.read_text(encoding="utf-8")
-
+    content = await run_in_threadpool(
+        _read_exec_log, Path(rec.log_path), start, end, timestamps
+    )
+    if content is None:
+        raise HTTPException(status_code=400, detail="该日志未记录逐行时间戳")
+    return content
+
+
+@app.get("/api/logs/search", response_model=List[schemas.LogSearchHit])
+async def search_logs(
+    q: str,
+    script_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """全文检索执行日志，可按脚本和执行开始时间（UTC）过滤"""
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="搜索关键字不能为空")
+    return await db.run_sync(
+        search_exec_logs, q, script_id=script_id, start=start, end=end, limit=limit
+    )
@@ -1,15 +1,19 @@
 from datetime import datetime
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     Column,
+    Date,
     DateTime,
+    Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 
 from .database import Base
 
@@ -22,7 +26,9 @@ class ScriptCategory(Base):
     description = Column(String(255), nullable=True)
     order = Column(Integer, default=0)
 
-    scripts = relationship("ScriptItem", back_populates="category")
+    scripts = relationship(
+        "ScriptItem", back_populates="category", lazy="raise_on_sql"
+    )
 
 
 class ScriptItem(Base):
@@ -41,16 +47,58 @@ class ScriptItem(Base):
     update_time = Column(
         DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
     )
-
-    category = relationship("ScriptCategory", back_populates="scripts")
+    # 最近一次执行的摘要与累计次数，执行结束时由写线程更新（不改变 update_time），
+    # 列表页直接读取，无需逐行查询执行记录
+    last_exec_id = Column(Integer, nullable=True)
+    last_status = Column(String(50), nullable=True)
+    last_run_at = Column(DateTime, nullable=True)
+    run_count = Column(Integer, nullable=False, default=0, server_default="0")
+    fail_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # 关系一律禁止隐式懒加载：需要时在查询里显式 selectinload/joinedload，
+    # 避免模板或序列化时逐行触发查询（N+1），异步会话下懒加载也会直接报错
+    category = relationship(
+        "ScriptCategory", back_populates="scripts", lazy="raise_on_sql"
+    )
     versions = relationship(
-        "ScriptVersion", back_populates="script", order_by="ScriptVersion.version"
+        "ScriptVersion",
+        back_populates="script",
+        order_by="ScriptVersion.version",
+        lazy="raise_on_sql",
     )
     exec_records = relationship(
         "ScriptExecRecord",
         back_populates="script",
         order_by="desc(ScriptExecRecord.start_time)",
+        lazy="raise_on_sql",
+    )
+
+    __table_args__ = (
+        # 脚本列表的游标分页
+        Index("ix_script_item_update_time_id", "update_time", "id"),
+        # 首页按启用状态取最近更新
+        Index("ix_script_item_enabled_update_time", "enabled", "update_time"),
+    )
+
+
+class ScriptBlob(Base):
+    """按 SHA-256 寻址的脚本内容，相同内容无论属于哪个脚本、哪个版本都只存一份"""
+
+    __tablename__ = "script_blob"
+
+    hash = Column(String(64), primary_key=True)
+    # 完整快照时保存全文；否则 delta 保存相对 base_hash 内容的行级增量
+    # （JSON，见 app.diffing），depth 为距快照的增量个数。正文延迟加载，
+    # 加载 ScriptBlob 对象不会带出脚本内容
+    content = deferred(Column(Text, nullable=True))
+    delta = deferred(Column(Text, nullable=True))
+    base_hash = Column(
+        String(64), ForeignKey("script_blob.hash"), nullable=True, index=True
     )
+    depth = Column(Integer, nullable=False, default=0)
+    # 完整内容的字节数（UTF-8）
+    size = Column(Integer, nullable=False)
+    create_time = Column(DateTime, default=datetime.utcnow)
 
 
 class ScriptVersion(Base):
@@ -59,12 +107,27 @@ class ScriptVersion(Base):
     id = Column(Integer, primary_key=True, index=True)
     script_id = Column(Integer, ForeignKey("script_item.id"), nullable=False)
     version = Column(Integer, nullable=False)
-    content = Column(Text, nullable=False)
+    # 内容的 SHA-256，正文按哈希只在 script_blob 中保存一份，
+    # 读取请用 app.script_versions.get_version_content
+    content_hash = Column(
+        String(64), ForeignKey("script_blob.hash"), nullable=False, index=True
+    )
     editor = Column(String(100), nullable=True)
     remark = Column(String(255), nullable=True)
     create_time = Column(DateTime, default=datetime.utcnow)
 
-    script = relationship("ScriptItem", back_populates="versions")
+    script = relationship(
+        "ScriptItem", back_populates="versions", lazy="raise_on_sql"
+    )
+
+    __table_args__ = (
+        Index(
+            "uq_script_version_script_id_version",
+            "script_id",
+            "version",
+            unique=True,
+        ),
+    )
 
 
 class ScriptExecRecord(Base):
@@ -74,13 +137,63 @@ class ScriptExecRecord(Base):
     script_id = Column(Integer, ForeignKey("script_item.id"), nullable=False)
     start_time = Column(DateTime, default=datetime.utcnow)
     end_time = Column(DateTime, nullable=True)
-    status = Column(String(50), default="running")  # running/success/fail
+    # queued/running/success/fail/cancelled
+    status = Column(String(50), default="running")
     exit_code = Column(Integer, nullable=True)
     operator = Column(String(100), nullable=True)
     params_json = Column(Text, nullable=True)
     log_path = Column(String(500), nullable=True)
+    # 实际运行的版本及其内容哈希（运行快照的键），脚本没有版本时为空
+    version_id = Column(Integer, ForeignKey("script_version.id"), nullable=True)
+    content_hash = Column(String(64), nullable=True)
+    # 资源占用：结束时由 wait4 的 rusage 与运行期间的 /proc 采样合并得到，
+    # 峰值内存只来自采样（近似值），不支持的平台上为空
+    cpu_user_seconds = Column(Float, nullable=True)
+    cpu_system_seconds = Column(Float, nullable=True)
+    max_rss_kb = Column(Integer, nullable=True)
+    read_bytes = Column(BigInteger, nullable=True)
+    write_bytes = Column(BigInteger, nullable=True)
+    voluntary_ctx_switches = Column(BigInteger, nullable=True)
+    involuntary_ctx_switches = Column(BigInteger, nullable=True)
+
+    script = relationship(
+        "ScriptItem", back_populates="exec_records", lazy="raise_on_sql"
+    )
 
-    script = relationship("ScriptItem", back_populates="exec_records")
+    __table_args__ = (
+        # 单个脚本执行历史的游标分页
+        Index("ix_exec_record_script_start_id", "script_id", "start_time", "id"),
+    )
+
+
+# 每个脚本每天（执行开始时间的 UTC 日期）一行的执行汇总，执行结束时增量更新
+class ScriptExecDaily(Base):
+    __tablename__ = "script_exec_daily"
+
+    script_id = Column(Integer, ForeignKey("script_item.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    runs = Column(Integer, nullable=False, default=0)
+    successes = Column(Integer, nullable=False, default=0)
+    failures = Column(Integer, nullable=False, default=0)
+    total_seconds = Column(Float, nullable=False, default=0)
+    max_seconds = Column(Float, nullable=False, default=0)
+    # 耗时的对数分桶计数（JSON），见 app.exec_stats.DurationSketch
+    duration_sketch = Column(Text, nullable=False)
+
+    __table_args__ = (
+        # 全部脚本按日期范围汇总
+        Index("ix_script_exec_daily_day", "day"),
+    )
+
+
+class ExecLogIndex(Base):
+    __tablename__ = "exec_log_index"
+
+    exec_id = Column(
+        Integer, ForeignKey("script_exec_record.id"), primary_key=True
+    )
+    line_count = Column(Integer, nullable=False, default=0)
+    indexed_at = Column(DateTime, default=datetime.utcnow)
 
 
 class User(Base):
@@ -91,3 +204,23 @@ class User(Base):
     hashed_password = Column(String(255), nullable=False)
     is_active = Column(Boolean, default=True)
     create_time = Column(DateTime, default=datetime.utcnow)
+
+
+class ApiToken(Base):
+    __tablename__ = "api_token"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("user.id"), nullable=False, index=True)
+    name = Column(String(100), nullable=False)
+    # 只保存 HMAC-SHA256 摘要，明文令牌仅在创建时返回一次
+    token_hash = Column(String(64), nullable=False, unique=True)
+    token_prefix = Column(String(16), nullable=False)
+    create_time = Column(DateTime, default=datetime.utcnow)
+
+
+# 用户数据版本戳（单行）：用户被修改或禁用时递增，各进程据此清空用户缓存
+class AuthStamp(Base):
+    __tablename__ = "auth_stamp"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
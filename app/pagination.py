@@ -0,0 +1,76 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Row, Select, bindparam, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, list) or len(values) != size:
+            raise InvalidCursor(cursor)
+        return [_decode_value(v) for v in values]
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursor(cursor) from exc
+
+
+async def keyset_page(
+    db: AsyncSession,
+    stmt: Select,
+    keys: Sequence[Any],
+    key_of: Callable[[Row], Sequence[Any]],
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    descending: bool = True,
+) -> Tuple[List[Row], Optional[str]]:
+    """按 keys 做游标分页（keyset），返回 (本页行, 下一页游标)
+
+    keys 须能唯一确定顺序（末尾带主键），并有对应的复合索引，
+    这样无论翻到第几页都只是一次索引范围扫描，与偏移量无关。
+    """
+    if cursor:
+        values = decode_cursor(cursor, len(keys))
+        bound = tuple_(
+            *(
+                bindparam(None, value, type_=getattr(key, "type", None))
+                for key, value in zip(keys, values)
+            )
+        )
+        row = tuple_(*keys)
+        stmt = stmt.where(row < bound if descending else row > bound)
+    stmt = stmt.order_by(
+        *(key.desc() if descending else key.asc() for key in keys)
+    )
+    rows = (await db.execute(stmt.limit(limit + 1))).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(key_of(rows[-1]))
@@ -0,0 +1,225 @@
+import os
+import subprocess
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# 脚本运行期间采样 /proc 的间隔（秒），0 表示不采样、只取结束时的 rusage
+EXEC_SAMPLE_INTERVAL = float(os.environ.get("OPS_EXEC_SAMPLE_INTERVAL", "1"))
+
+_PROC = Path("/proc")
+
+# 采样值（进程树各进程之和）与 rusage 取较大者的字段
+_SAMPLED_FIELDS = (
+    "read_bytes",
+    "write_bytes",
+    "voluntary_ctx_switches",
+    "involuntary_ctx_switches",
+)
+
+
+def _read_keyed(path: Path) -> Dict[str, str]:
+    values = {}
+    with open(path, encoding="ascii", errors="replace") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            values[key] = value.strip()
+    return values
+
+
+def _int_field(values: Dict[str, str], key: str) -> int:
+    # /proc/<pid>/status 的内存字段带单位，如 "123 kB"
+    value = values.get(key, "0").split()
+    return int(value[0]) if value else 0
+
+
+def _children(pid: int) -> List[int]:
+    children: List[int] = []
+    try:
+        tasks = list((_PROC / str(pid) / "task").iterdir())
+    except OSError:
+        return children
+    for task in tasks:
+        try:
+            children.extend(int(c) for c in (task / "children").read_text().split())
+        except (OSError, ValueError):
+            continue
+    return children
+
+
+def _process_tree(pid: int) -> Iterable[int]:
+    """pid 及其仍在运行的子孙进程（shell=True 时真正的脚本是 shell 的子进程）"""
+    seen: Set[int] = set()
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        yield current
+        pending.extend(_children(current))
+
+
+def sample_process_tree(pid: int) -> Optional[Dict[str, int]]:
+    """读取进程树当前的内存、I/O 与上下文切换，无 /proc 时返回 None
+
+    计数类字段为各进程之和；max_rss_kb 取各进程 VmRSS 之和与单个进程
+    VmHWM（exec 后重新计算的峰值）中的较大者。
+    """
+    if not _PROC.is_dir():
+        return None
+    totals = dict.fromkeys(_SAMPLED_FIELDS, 0)
+    rss_total = 0
+    hwm = 0
+    found = False
+    for child in _process_tree(pid):
+        base = _PROC / str(child)
+        try:
+            status = _read_keyed(base / "status")
+        except OSError:
+            continue
+        found = True
+        rss_total += _int_field(status, "VmRSS")
+        hwm = max(hwm, _int_field(status, "VmHWM"))
+        totals["voluntary_ctx_switches"] += _int_field(
+            status, "voluntary_ctxt_switches"
+        )
+        totals["involuntary_ctx_switches"] += _int_field(
+            status, "nonvoluntary_ctxt_switches"
+        )
+        try:
+            io = _read_keyed(base / "io")
+        except OSError:  # 内核未开启 I/O 统计或无权限
+            continue
+        totals["read_bytes"] += _int_field(io, "read_bytes")
+        totals["write_bytes"] += _int_field(io, "write_bytes")
+    if not found:
+        return None
+    totals["max_rss_kb"] = max(rss_total, hwm)
+    return totals
+
+
+class ProcessSampler:
+    """脚本运行期间在后台线程周期采样进程树，记录各项的峰值
+
+    结束时 wait4 返回的 rusage 只包含已被回收的子孙进程；采样可以补上
+    仍在运行的子孙进程。峰值内存只来自采样：子进程由服务进程 fork 而来，
+    ru_maxrss 会带上服务进程自身的峰值，不能反映脚本的占用。采样得到的
+    峰值是近似值，运行时间短于采样间隔的进程可能没有被采到。
+    """
+
+    def __init__(self, pid: int, interval: float = EXEC_SAMPLE_INTERVAL):
+        self._pid = pid
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.peak: Dict[str, int] = {}
+
+    def start(self) -> "ProcessSampler":
+        if self._interval > 0 and _PROC.is_dir():
+            self._thread = threading.Thread(
+                target=self._run, name=f"exec-sampler-{self._pid}", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self) -> Dict[str, int]:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.peak
+
+    def _run(self) -> None:
+        while True:
+            self._sample()
+            if self._stop.wait(self._interval):
+                return
+
+    def _sample(self) -> None:
+        try:
+            totals = sample_process_tree(self._pid)
+        except Exception as e:  # 采样失败不影响执行
+            print(f"警告：采样进程 {self._pid} 资源占用失败: {e}")
+            return
+        if totals is None:
+            return
+        for key, value in totals.items():
+            if value > self.peak.get(key, 0):
+                self.peak[key] = value
+
+
+def wait_with_rusage(
+    process: subprocess.Popen,
+) -> Tuple[int, Optional[Dict[str, float]]]:
+    """等待子进程结束，返回 (退出码, rusage)；平台不支持 wait4 时 rusage 为 None
+
+    Linux 下 wait4 的 rusage 包含该进程已回收的子孙进程（如 shell 启动的脚本）。
+    不返回 ru_maxrss：fork 出的子进程会继承服务进程的峰值内存，见 ProcessSampler。
+    """
+    if not hasattr(os, "wait4"):
+        return process.wait(), None
+    try:
+        _, wait_status, usage = os.wait4(process.pid, 0)
+    except ChildProcessError:  # 已被其他地方回收
+        return process.wait(), None
+    # 已由 wait4 回收，告诉 Popen 不要再等待
+    process.returncode = os.waitstatus_to_exitcode(wait_status)
+    return process.returncode, {
+        "cpu_user_seconds": round(usage.ru_utime, 3),
+        "cpu_system_seconds": round(usage.ru_stime, 3),
+        # 块数按 512 字节计，与 /proc/<pid>/io 的 read_bytes/write_bytes 同源
+        "read_bytes": usage.ru_inblock * 512,
+        "write_bytes": usage.ru_oublock * 512,
+        "voluntary_ctx_switches": usage.ru_nvcsw,
+        "involuntary_ctx_switches": usage.ru_nivcsw,
+    }
+
+
+def merge_usage(
+    rusage: Optional[Dict[str, float]], peak: Dict[str, int]
+) -> Dict[str, float]:
+    """合并 rusage 与采样峰值，计数类字段取两者较大者；都没有时返回空字典
+
+    峰值内存只取采样值，没有采到时不记录。
+    """
+    usage = dict(rusage or {})
+    for key in _SAMPLED_FIELDS:
+        if key in peak:
+            usage[key] = max(usage.get(key, 0), peak[key])
+    if "max_rss_kb" in peak:
+        usage["max_rss_kb"] = peak["max_rss_kb"]
+    return usage
+
+
+def _format_bytes(value: float) -> str:
+    units = ("B", "KB", "MB", "GB")
+    index = 0
+    while value >= 1024 and index < len(units) - 1:
+        value /= 1024
+        index += 1
+    return f"{value:.0f} B" if index == 0 else f"{value:.1f} {units[index]}"
+
+
+def format_usage(record) -> str:
+    """执行记录资源占用的简短文本（详情页），没有数据时返回 "-" """
+    if record.cpu_user_seconds is None and record.max_rss_kb is None:
+        return "-"
+    parts = []
+    if record.cpu_user_seconds is not None:
+        parts.append(
+            f"CPU {record.cpu_user_seconds:.2f}s 用户 / "
+            f"{record.cpu_system_seconds or 0:.2f}s 系统"
+        )
+    if record.max_rss_kb is not None:
+        parts.append(f"内存峰值 {_format_bytes(record.max_rss_kb * 1024)}")
+    if record.read_bytes is not None:
+        parts.append(
+            f"读 {_format_bytes(record.read_bytes)} / "
+            f"写 {_format_bytes(record.write_bytes or 0)}"
+        )
+    if record.voluntary_ctx_switches is not None:
+        parts.append(
+            f"上下文切换 {record.voluntary_ctx_switches} / "
+            f"{record.involuntary_ctx_switches or 0}"
+        )
+    return "，".join(parts)
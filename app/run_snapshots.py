@@ -0,0 +1,120 @@
+import os
+import tempfile
+import threading
+from contextlib import contextmanager, suppress
+from pathlib import Path
+from typing import Callable, Dict, Iterator
+
+# 运行快照目录：每次执行运行的是按内容哈希物化的只读副本，而不是可被编辑覆盖的脚本文件
+RUN_SNAPSHOT_DIR = Path(os.environ.get("OPS_RUN_SNAPSHOT_DIR", "run_snapshots"))
+# 最多保留的快照文件数，超出时淘汰最久未运行的
+RUN_SNAPSHOT_CACHE_SIZE = int(os.environ.get("OPS_RUN_SNAPSHOT_CACHE_SIZE", "500"))
+
+_TEMP_PREFIX = ".tmp-"
+
+
+def _remove(path: Path) -> None:
+    # Windows 下只读文件不能直接删除
+    os.chmod(path, 0o644)
+    path.unlink()
+
+
+def _has_content(path: Path, data: bytes) -> bool:
+    try:
+        return path.read_bytes() == data
+    except FileNotFoundError:
+        return False
+
+
+class RunSnapshotCache:
+    """按内容哈希缓存的运行快照
+
+    同一内容只物化一次（先写临时文件再原子改名，文件只读），之后的执行
+    直接复用；每次使用刷新文件的修改时间，超出上限时按修改时间淘汰最久
+    未使用的快照，本进程中正在运行的快照不会被淘汰。
+    """
+
+    def __init__(
+        self,
+        base_dir: Path = RUN_SNAPSHOT_DIR,
+        max_files: int = RUN_SNAPSHOT_CACHE_SIZE,
+    ):
+        self._base_dir = Path(base_dir)
+        self._max_files = max_files
+        self._lock = threading.Lock()
+        self._in_use: Dict[Path, int] = {}
+
+    def path_for(self, digest: str, suffix: str = "") -> Path:
+        """内容对应的快照路径（不检查是否已物化），保留原脚本的扩展名"""
+        return self._base_dir / digest[:2] / f"{digest}{suffix}"
+
+    @contextmanager
+    def acquire(self, path: Path, load: Callable[[], str]) -> Iterator[Path]:
+        """确保快照存在并在 with 块内占用，load 只在需要物化时调用"""
+        with self._lock:
+            self._in_use[path] = self._in_use.get(path, 0) + 1
+        try:
+            if self._materialize(path, load):
+                self.collect()
+            yield path
+        finally:
+            with self._lock:
+                self._in_use[path] -= 1
+                if not self._in_use[path]:
+                    del self._in_use[path]
+
+    def _materialize(self, path: Path, load: Callable[[], str]) -> bool:
+        """物化快照，返回是否新写入；已存在时只刷新最近使用时间"""
+        try:
+            os.utime(path)
+            return False
+        except FileNotFoundError:
+            pass
+        data = load().encode("utf-8")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=_TEMP_PREFIX)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.chmod(temp_path, 0o555)
+            if _has_content(path, data):
+                # 其他进程或线程已物化同一内容；Windows 下不能覆盖正在运行的文件
+                _remove(Path(temp_path))
+                return False
+            os.replace(temp_path, path)
+        except BaseException:
+            with suppress(OSError):
+                _remove(Path(temp_path))
+            raise
+        return True
+
+    def collect(self) -> int:
+        """淘汰超出上限的快照（最久未使用的先删），返回删除的文件数"""
+        entries = []
+        for path in self._base_dir.glob("*/*"):
+            if path.name.startswith(_TEMP_PREFIX):
+                continue
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except OSError:  # 已被其他进程删除
+                continue
+        excess = len(entries) - self._max_files
+        if excess <= 0:
+            return 0
+        with self._lock:
+            in_use = set(self._in_use)
+        removed = 0
+        for _, path in sorted(entries):
+            if removed >= excess:
+                break
+            if path in in_use:
+                continue
+            try:
+                _remove(path)
+            except OSError:
+                continue
+            removed += 1
+        return removed
+
+
+run_snapshot_cache = RunSnapshotCache()
@@ -0,0 +1,314 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import sessionmaker
+
+from .database import SessionLocal
+from .exec_stats import predict_duration
+from .executor import run_script
+from .metrics import DURATION_BUCKETS, Gauge, Histogram, registry
+from .models import ScriptExecRecord, ScriptItem
+from .writer import ExecStateWriter, exec_writer
+
+# 同时运行的脚本数上限，超出的执行进入队列
+EXEC_WORKERS = int(os.environ.get("OPS_EXEC_WORKERS", "4"))
+# 老化速率：排队每等待 1 秒，调度时把预测耗时视为减少这么多秒，
+# 长任务最多等待约 预测耗时/老化速率 就会排到短任务前面
+EXEC_AGING_RATE = float(os.environ.get("OPS_EXEC_AGING_RATE", "1"))
+# 没有历史记录的脚本的预测耗时（秒）
+EXEC_DEFAULT_SECONDS = float(os.environ.get("OPS_EXEC_DEFAULT_SECONDS", "60"))
+# 用最近多少天的执行汇总预测耗时
+EXEC_PREDICTION_DAYS = int(os.environ.get("OPS_EXEC_PREDICTION_DAYS", "14"))
+# 预测值的缓存时间（秒），脚本执行结束后立即失效
+PREDICTION_TTL = 60
+
+exec_queue_wait = registry.register(
+    Histogram(
+        "opstool_exec_queue_wait_seconds",
+        "执行从提交到开始运行的排队时间",
+        buckets=DURATION_BUCKETS,
+    )
+)
+
+
+class _Job:
+    def __init__(
+        self,
+        exec_id: int,
+        script_id: int,
+        params_json: Optional[str],
+        operator: Optional[str],
+        predicted: float,
+        key: float,
+        seq: int,
+    ):
+        self.exec_id = exec_id
+        self.script_id = script_id
+        self.params_json = params_json
+        self.operator = operator
+        self.predicted = predicted
+        self.key = key
+        self.seq = seq
+        self.enqueued = time.monotonic()
+        self.started: Optional[float] = None
+
+    def __lt__(self, other: "_Job") -> bool:
+        return (self.key, self.seq) < (other.key, other.seq)
+
+
+class ExecScheduler:
+    """有界的脚本执行池：预测耗时短的先执行，并随排队时间老化
+
+    调度优先级为 预测耗时 - 老化速率 × 已等待时间，取最小者。所有任务的
+    "当前时间"项相同，可以改写为固定的 预测耗时 + 老化速率 × 入队时间，
+    因此用普通的最小堆即可，不需要随时间重排。预测耗时取该脚本最近
+    EXEC_PREDICTION_DAYS 天执行汇总的中位数。
+
+    队列只在本进程内存中；停止时仍在排队的执行标记为 cancelled，进程异常
+    退出后遗留的 queued/running 记录由启动时的 recover_interrupted 收尾。
+    任务只保存脚本 id，开始运行时才读取脚本，排队期间的编辑在本次执行
+    生效，已删除的脚本不再运行。
+    """
+
+    def __init__(
+        self,
+        workers: int = EXEC_WORKERS,
+        aging_rate: float = EXEC_AGING_RATE,
+        default_seconds: float = EXEC_DEFAULT_SECONDS,
+        session_factory: sessionmaker = SessionLocal,
+        writer: ExecStateWriter = exec_writer,
+        runner: Callable[..., int] = run_script,
+        predictor: Optional[Callable[[int], Optional[float]]] = None,
+    ):
+        self._workers = max(workers, 1)
+        self._aging_rate = aging_rate
+        self._default_seconds = default_seconds
+        self._session_factory = session_factory
+        self._writer = writer
+        self._runner = runner
+        self._predictor = predictor or self._predict_from_rollups
+        self._heap: List[_Job] = []
+        self._queued: Dict[int, _Job] = {}
+        self._running: Dict[int, _Job] = {}
+        self._predictions: Dict[int, tuple] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+
+    def _ensure_started(self) -> None:
+        if self._threads:
+            return
+        for i in range(self._workers):
+            thread = threading.Thread(
+                target=self._run, name=f"exec-worker-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _predict_from_rollups(self, script_id: int) -> Optional[float]:
+        db = self._session_factory()
+        try:
+            return predict_duration(db, script_id, EXEC_PREDICTION_DAYS)
+        finally:
+            db.close()
+
+    def predict(self, script_id: int) -> float:
+        """脚本的预测耗时（秒），带缓存"""
+        cached = self._predictions.get(script_id)
+        now = time.monotonic()
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        try:
+            predicted = self._predictor(script_id)
+        except Exception as e:  # 预测失败按默认值调度
+            print(f"警告：预测脚本 {script_id} 耗时失败: {e}")
+            predicted = None
+        if predicted is None:
+            predicted = self._default_seconds
+        self._predictions[script_id] = (predicted, now + PREDICTION_TTL)
+        return predicted
+
+    def recover_interrupted(self) -> int:
+        """收尾上次进程遗留的执行记录，返回处理的条数
+
+        队列不持久化，服务重启（崩溃、被杀或重新部署）后仍为 queued 的
+        记录不会再运行，标记为 cancelled；仍为 running 的记录其进程已随
+        服务退出，标记为 fail。应在启动时、接收执行请求之前调用，且只适用
+        于单进程部署。
+        """
+        now = datetime.utcnow()
+        db = self._session_factory()
+        try:
+            cancelled = db.execute(
+                update(ScriptExecRecord)
+                .where(ScriptExecRecord.status == "queued")
+                .values(status="cancelled", end_time=now)
+            ).rowcount
+            failed = db.execute(
+                update(ScriptExecRecord)
+                .where(ScriptExecRecord.status == "running")
+                .values(status="fail", exit_code=-1, end_time=now)
+            ).rowcount
+            db.commit()
+        finally:
+            db.close()
+        return cancelled + failed
+
+    def _load_script(self, script_id: int) -> Optional[ScriptItem]:
+        db = self._session_factory()
+        try:
+            return db.get(ScriptItem, script_id)
+        finally:
+            db.close()
+
+    def submit(
+        self, script_id: int, params_json: Optional[str], operator: Optional[str]
+    ) -> int:
+        """新建状态为 queued 的执行记录并入队，返回执行记录 id（阻塞到记录提交）"""
+        predicted = self.predict(script_id)
+        exec_id = self._writer.create(
+            script_id=script_id,
+            status="queued",
+            operator=operator,
+            params_json=params_json,
+            start_time=datetime.utcnow(),
+        ).result()
+        with self._cond:
+            if self._stopping:
+                self._writer.update(
+                    exec_id, status="cancelled", end_time=datetime.utcnow()
+                )
+                return exec_id
+            self._ensure_started()
+            seq = next(self._seq)
+            job = _Job(
+                exec_id,
+                script_id,
+                params_json,
+                operator,
+                predicted,
+                predicted + self._aging_rate * time.monotonic(),
+                seq,
+            )
+            heapq.heappush(self._heap, job)
+            self._queued[exec_id] = job
+            self._cond.notify()
+        return exec_id
+
+    def queue_depth(self) -> int:
+        return len(self._queued)
+
+    def estimate(self, exec_id: int) -> Optional[dict]:
+        """排队或运行中执行的预测信息，不在本进程队列中时返回 None
+
+        排队中的执行按当前优先级顺序模拟：运行中的任务按剩余预测耗时占住
+        工作线程，排在前面的任务依次分配到最早空闲的线程。之后新提交的
+        短任务仍可能插到前面，ETA 只是估计。
+        """
+        with self._cond:
+            now = time.monotonic()
+            job = self._running.get(exec_id)
+            if job is not None:
+                remaining = max(job.predicted - (now - job.started), 0.0)
+                return {
+                    "predicted_seconds": job.predicted,
+                    "eta_end": datetime.utcnow() + timedelta(seconds=remaining),
+                }
+            job = self._queued.get(exec_id)
+            if job is None:
+                return None
+            free_at = [
+                max(r.predicted - (now - r.started), 0.0)
+                for r in self._running.values()
+            ]
+            free_at += [0.0] * (self._workers - len(free_at))
+            heapq.heapify(free_at)
+            ahead = sorted(j for j in self._queued.values() if j < job)
+            for other in ahead:
+                heapq.heappush(free_at, heapq.heappop(free_at) + other.predicted)
+            start_in = free_at[0]
+        eta_start = datetime.utcnow() + timedelta(seconds=start_in)
+        return {
+            "queue_position": len(ahead) + 1,
+            "predicted_seconds": job.predicted,
+            "eta_start": eta_start,
+            "eta_end": eta_start + timedelta(seconds=job.predicted),
+        }
+
+    def stop(self) -> None:
+        """停止接收新执行，仍在排队的执行标记为 cancelled（运行中的不受影响）"""
+        with self._cond:
+            self._stopping = True
+            cancelled = list(self._queued)
+            self._queued.clear()
+            self._heap.clear()
+            self._cond.notify_all()
+        now = datetime.utcnow()
+        for exec_id in cancelled:
+            self._writer.update(exec_id, status="cancelled", end_time=now)
+
+    def _next_job(self) -> Optional[_Job]:
+        with self._cond:
+            while not self._heap and not self._stopping:
+                self._cond.wait()
+            if self._stopping:
+                return None
+            job = heapq.heappop(self._heap)
+            del self._queued[job.exec_id]
+            job.started = time.monotonic()
+            self._running[job.exec_id] = job
+            return job
+
+    def _run(self) -> None:
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            exec_queue_wait.observe(job.started - job.enqueued)
+            try:
+                # 开始时重新读取脚本，排队期间的编辑与删除都要生效
+                script = self._load_script(job.script_id)
+                if script is None:
+                    self._writer.update(
+                        job.exec_id, status="cancelled", end_time=datetime.utcnow()
+                    )
+                    continue
+                self._runner(
+                    script,
+                    job.params_json,
+                    job.operator,
+                    writer=self._writer,
+                    exec_id=job.exec_id,
+                )
+            except Exception as e:
+                # 执行器在写入结束状态之前失败，记录不能一直停留在 queued/running
+                print(f"警告：执行 {job.exec_id} 失败: {e}")
+                self._writer.update(
+                    job.exec_id,
+                    status="fail",
+                    exit_code=-1,
+                    end_time=datetime.utcnow(),
+                )
+            finally:
+                with self._cond:
+                    del self._running[job.exec_id]
+                # 新的执行已计入汇总，下次提交时重新预测
+                self._predictions.pop(job.script_id, None)
+
+
+exec_scheduler = ExecScheduler()
+
+registry.register(
+    Gauge(
+        "opstool_exec_queue_depth",
+        "排队等待运行的脚本执行数",
+        collect=exec_scheduler.queue_depth,
+    )
+)
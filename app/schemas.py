@@ -1,5 +1,5 @@
-from datetime import datetime
-from typing import Optional
+from datetime import date, datetime
+from typing import List, Optional
 
 from pydantic import BaseModel
 
@@ -57,14 +57,80 @@ class ScriptItemOut(ScriptItemBase):
     id: int
     create_time: datetime
     update_time: datetime
+    last_exec_id: Optional[int] = None
+    last_status: Optional[str] = None
+    last_run_at: Optional[datetime] = None
+    run_count: int = 0
+    fail_count: int = 0
 
     class Config:
         from_attributes = True
 
 
+class ScriptItemPage(BaseModel):
+    items: List[ScriptItemOut]
+    next_cursor: Optional[str] = None
+
+
 class ScriptContentOut(BaseModel):
     content: str
     version: int
+    content_hash: Optional[str] = None
+
+
+class ScriptVersionOut(BaseModel):
+    id: int
+    version: int
+    editor: Optional[str] = None
+    remark: Optional[str] = None
+    create_time: Optional[datetime] = None
+    content_hash: str
+    size: int
+
+    class Config:
+        from_attributes = True
+
+
+class ScriptVersionPage(BaseModel):
+    items: List[ScriptVersionOut]
+    next_cursor: Optional[str] = None
+
+
+class DiffLine(BaseModel):
+    op: str  # " " 上下文、"-" 删除、"+" 新增
+    text: str
+
+
+class DiffHunk(BaseModel):
+    from_start: int
+    from_count: int
+    to_start: int
+    to_count: int
+    lines: List[DiffLine]
+
+
+class ScriptDiffOut(BaseModel):
+    script_id: int
+    from_version: int
+    to_version: int
+    from_hash: str
+    to_hash: str
+    added: int
+    removed: int
+    # format=structured 时返回 hunks，format=unified 时返回 unified
+    hunks: Optional[List[DiffHunk]] = None
+    unified: Optional[str] = None
+
+
+class ContentVersionOut(BaseModel):
+    script_id: int
+    title: str
+    version: int
+    editor: Optional[str] = None
+    create_time: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
 
 
 class ScriptContentUpdate(BaseModel):
@@ -86,11 +152,61 @@ class ScriptExecOut(BaseModel):
     status: str
     exit_code: Optional[int] = None
     operator: Optional[str] = None
+    version_id: Optional[int] = None
+    content_hash: Optional[str] = None
+    cpu_user_seconds: Optional[float] = None
+    cpu_system_seconds: Optional[float] = None
+    max_rss_kb: Optional[int] = None
+    read_bytes: Optional[int] = None
+    write_bytes: Optional[int] = None
+    voluntary_ctx_switches: Optional[int] = None
+    involuntary_ctx_switches: Optional[int] = None
+    # 排队或运行中时由调度器给出的预测（UTC），结束后为空
+    queue_position: Optional[int] = None
+    predicted_seconds: Optional[float] = None
+    eta_start: Optional[datetime] = None
+    eta_end: Optional[datetime] = None
 
     class Config:
         from_attributes = True
 
 
+class ScriptExecPage(BaseModel):
+    items: List[ScriptExecOut]
+    next_cursor: Optional[str] = None
+
+
+class ExecStats(BaseModel):
+    runs: int
+    successes: int
+    failures: int
+    success_rate: Optional[float] = None
+    avg_seconds: Optional[float] = None
+    max_seconds: Optional[float] = None
+    # 分位数由对数分桶草图估算，相对误差约 1%
+    p50_seconds: Optional[float] = None
+    p95_seconds: Optional[float] = None
+
+
+class ExecStatsDay(ExecStats):
+    day: date
+
+
+class ScriptExecStats(ExecStats):
+    script_id: int
+    start_day: date
+    end_day: date
+    daily: List[ExecStatsDay] = []
+
+
+class LogSearchHit(BaseModel):
+    exec_id: int
+    script_id: int
+    start_time: datetime
+    line: int
+    snippet: str
+
+
 class UserLogin(BaseModel):
     username: str
     password: str
@@ -110,3 +226,22 @@ class UserCreate(BaseModel):
     username: str
     password: str
     is_active: bool = True
+
+
+class ApiTokenCreate(BaseModel):
+    name: str
+
+
+class ApiTokenOut(BaseModel):
+    id: int
+    name: str
+    token_prefix: str
+    create_time: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class ApiTokenCreated(ApiTokenOut):
+    # 明文令牌只在创建时返回这一次
+    token: str
@@ -0,0 +1,260 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session, aliased
+
+from .diffing import (
+    apply_delta,
+    decode_delta,
+    diff_hunks,
+    encode_delta,
+    make_delta,
+)
+from .models import ScriptBlob, ScriptItem, ScriptVersion
+
+# 两个完整快照之间最多连续保存多少个增量，还原任一内容最多应用这么多次增量
+VERSION_SNAPSHOT_INTERVAL = int(os.environ.get("OPS_VERSION_SNAPSHOT_INTERVAL", "20"))
+# 缓存多少份已还原的版本内容
+VERSION_CACHE_SIZE = int(os.environ.get("OPS_VERSION_CACHE_SIZE", "256"))
+# 缓存多少份版本差异
+DIFF_CACHE_SIZE = int(os.environ.get("OPS_DIFF_CACHE_SIZE", "128"))
+
+
+class LRUCache:
+    """线程安全的定长 LRU 字典"""
+
+    def __init__(self, max_size: int):
+        self._max_size = max_size
+        self._entries: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Any:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def pop_where(self, predicate) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if predicate(k)]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# 内容哈希 -> 完整内容；哈希与内容一一对应，缓存永不过期，只按 LRU 淘汰
+blob_cache = LRUCache(VERSION_CACHE_SIZE)
+# (旧内容哈希, 新内容哈希, 上下文行数) -> 差异块，同样永不过期
+diff_cache = LRUCache(DIFF_CACHE_SIZE)
+
+
+def content_hash(content: str) -> str:
+    """版本内容的 SHA-256（UTF-8 编码后的十六进制摘要）"""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def _blob_chain(db: Session, digest: str):
+    """从 digest 沿增量基准回溯到快照的各行，按深度升序（快照在前），一次查询"""
+    columns = (
+        ScriptBlob.hash,
+        ScriptBlob.content,
+        ScriptBlob.delta,
+        ScriptBlob.base_hash,
+        ScriptBlob.depth,
+    )
+    chain = select(*columns).where(ScriptBlob.hash == digest).cte(
+        "blob_chain", recursive=True
+    )
+    chain = chain.union_all(
+        select(*columns).join(chain, ScriptBlob.hash == chain.c.base_hash)
+    )
+    return db.execute(select(chain).order_by(chain.c.depth)).all()
+
+
+def get_blob_content(db: Session, digest: str) -> Optional[str]:
+    """按哈希还原完整内容，不存在时返回 None"""
+    content = blob_cache.get(digest)
+    if content is not None:
+        return content
+    rows = _blob_chain(db, digest)
+    if not rows:
+        return None
+    content = rows[0].content
+    for row in rows[1:]:
+        content = apply_delta(content, decode_delta(row.delta))
+    blob_cache.put(digest, content)
+    return content
+
+
+def store_blob(
+    db: Session,
+    content: str,
+    base_hash: Optional[str] = None,
+    snapshot_interval: int = VERSION_SNAPSHOT_INTERVAL,
+) -> str:
+    """保存内容（不提交），返回其哈希；相同内容已存在时不写入
+
+    有 base_hash 且其距快照不足 snapshot_interval 个增量时，保存相对它的
+    行级增量；增量不比全文小时仍保存快照。
+    """
+    digest = content_hash(content)
+    if db.scalar(select(ScriptBlob.hash).where(ScriptBlob.hash == digest)):
+        return digest
+    blob = ScriptBlob(hash=digest, depth=0, size=len(content.encode("utf-8")))
+    base_depth = None
+    if base_hash is not None:
+        base_depth = db.scalar(
+            select(ScriptBlob.depth).where(ScriptBlob.hash == base_hash)
+        )
+    if base_depth is not None and base_depth < snapshot_interval:
+        delta = encode_delta(make_delta(get_blob_content(db, base_hash), content))
+        if len(delta) < len(content):
+            blob.delta = delta
+            blob.base_hash = base_hash
+            blob.depth = base_depth + 1
+    if blob.delta is None:
+        blob.content = content
+    db.add(blob)
+    # 哈希由内容决定，即使事务回滚缓存也不会与库中数据矛盾
+    blob_cache.put(digest, content)
+    return digest
+
+
+def get_version_content(db: Session, script_id: int, version: int) -> Optional[str]:
+    """还原指定版本的完整内容，版本不存在时返回 None"""
+    digest = db.scalar(
+        select(ScriptVersion.content_hash).where(
+            ScriptVersion.script_id == script_id, ScriptVersion.version == version
+        )
+    )
+    return None if digest is None else get_blob_content(db, digest)
+
+
+def get_latest_version(db: Session, script_id: int):
+    """最新版本的 (id, version, content_hash)，没有任何版本时返回 None"""
+    return db.execute(
+        select(ScriptVersion.id, ScriptVersion.version, ScriptVersion.content_hash)
+        .where(ScriptVersion.script_id == script_id)
+        .order_by(ScriptVersion.version.desc())
+        .limit(1)
+    ).first()
+
+
+def get_latest_content(db: Session, script_id: int) -> Optional[tuple]:
+    """(最新版本号, 内容哈希, 完整内容)，没有任何版本时返回 None"""
+    row = get_latest_version(db, script_id)
+    if row is None:
+        return None
+    return row.version, row.content_hash, get_blob_content(db, row.content_hash)
+
+
+def add_version(
+    db: Session,
+    script_id: int,
+    version: int,
+    content: str,
+    editor: Optional[str] = None,
+    remark: Optional[str] = None,
+    snapshot_interval: int = VERSION_SNAPSHOT_INTERVAL,
+) -> ScriptVersion:
+    """新增一个版本（不提交），内容相对上一版本按增量保存，已有相同内容时直接引用"""
+    base_hash = None
+    if version > 1:
+        base_hash = db.scalar(
+            select(ScriptVersion.content_hash).where(
+                ScriptVersion.script_id == script_id,
+                ScriptVersion.version == version - 1,
+            )
+        )
+    row = ScriptVersion(
+        script_id=script_id,
+        version=version,
+        content_hash=store_blob(db, content, base_hash, snapshot_interval),
+        editor=editor,
+        remark=remark,
+    )
+    db.add(row)
+    return row
+
+
+def diff_versions(
+    db: Session, script_id: int, from_version: int, to_version: int, context: int = 3
+) -> Optional[tuple]:
+    """两个版本的 (旧内容哈希, 新内容哈希, 差异块)，任一版本不存在时返回 None
+
+    差异块格式见 app.diffing.diff_hunks。版本内容不可变，差异按内容哈希缓存，
+    不同脚本之间相同内容的比较也共用缓存。
+    """
+    rows = db.execute(
+        select(ScriptVersion.version, ScriptVersion.content_hash).where(
+            ScriptVersion.script_id == script_id,
+            ScriptVersion.version.in_((from_version, to_version)),
+        )
+    ).all()
+    hashes = {row.version: row.content_hash for row in rows}
+    if from_version not in hashes or to_version not in hashes:
+        return None
+    from_hash, to_hash = hashes[from_version], hashes[to_version]
+    if from_hash == to_hash:
+        return from_hash, to_hash, []
+    key = (from_hash, to_hash, context)
+    hunks = diff_cache.get(key)
+    if hunks is None:
+        hunks = diff_hunks(
+            get_blob_content(db, from_hash), get_blob_content(db, to_hash), context
+        )
+        diff_cache.put(key, hunks)
+    return from_hash, to_hash, hunks
+
+
+def find_versions_by_hash(db: Session, digest: str) -> List:
+    """内容为 digest 的全部脚本版本（含脚本标题），按脚本、版本排序"""
+    return db.execute(
+        select(
+            ScriptVersion.script_id,
+            ScriptItem.title,
+            ScriptVersion.version,
+            ScriptVersion.editor,
+            ScriptVersion.create_time,
+        )
+        .join(ScriptItem, ScriptItem.id == ScriptVersion.script_id)
+        .where(ScriptVersion.content_hash == digest)
+        .order_by(ScriptVersion.script_id, ScriptVersion.version)
+    ).all()
+
+
+def delete_orphan_blobs(db: Session) -> int:
+    """删除不再被任何版本引用、也不是其他内容增量基准的内容（不提交），返回删除数
+
+    每轮只能删掉增量链末端的内容，重复直到没有可删的为止。
+    """
+    based = aliased(ScriptBlob)
+    deleted = 0
+    while True:
+        result = db.execute(
+            delete(ScriptBlob)
+            .where(
+                ScriptBlob.hash.notin_(select(ScriptVersion.content_hash)),
+                ScriptBlob.hash.notin_(
+                    select(based.base_hash).where(based.base_hash.isnot(None))
+                ),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if not result.rowcount:
+            return deleted
+        deleted += result.rowcount
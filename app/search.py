@@ -0,0 +1,315 @@
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from sqlalchemy import (
+    column,
+    delete,
+    func,
+    insert,
+    literal_column,
+    select,
+    table,
+)
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from .models import (
+    ExecLogIndex,
+    ScriptBlob,
+    ScriptExecRecord,
+    ScriptItem,
+    ScriptVersion,
+)
+from .script_versions import get_blob_content, get_latest_content
+
+# 每个全文索引块包含的日志行数，避免大日志变成单个巨大的文档
+LOG_CHUNK_LINES = 200
+
+_HIT_START = "\x01"
+_HIT_END = "\x02"
+
+# 脚本目录检索的列权重：标题 > 描述 > 脚本内容
+SCRIPT_RANK_WEIGHTS = (10.0, 5.0, 1.0)
+
+exec_log_fts = table(
+    "exec_log_fts", column("content"), column("exec_id"), column("line_start")
+)
+script_fts = table(
+    "script_fts",
+    column("rowid"),
+    column("title"),
+    column("description"),
+    column("content"),
+)
+
+def fts_phrase(keyword: str) -> str:
+    """把用户输入转为 FTS5 短语查询，避免语法字符被解释"""
+    return '"' + keyword.replace('"', '""') + '"'
+
+
+def fts_prefix_query(keyword: str) -> Optional[str]:
+    """把关键字拆成词并逐词做前缀匹配（词之间为 AND），无有效词时返回 None"""
+    terms = re.findall(r"\w+", keyword)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def _iter_chunks(lines: Iterable[str]):
+    chunk: List[str] = []
+    line_start = 1
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= LOG_CHUNK_LINES:
+            yield line_start, chunk
+            line_start += len(chunk)
+            chunk = []
+    if chunk:
+        yield line_start, chunk
+
+
+def index_log_lines(conn: Connection, exec_id: int, lines: Iterable[str]) -> int:
+    """按行块写入全文索引，返回索引的行数"""
+    count = 0
+    batch = []
+    for line_start, chunk in _iter_chunks(lines):
+        batch.append(
+            {"content": "".join(chunk), "exec_id": exec_id, "line_start": line_start}
+        )
+        count += len(chunk)
+        if len(batch) >= 50:
+            _insert_chunks(conn, batch)
+            batch = []
+    if batch:
+        _insert_chunks(conn, batch)
+    return count
+
+
+def _insert_chunks(conn: Connection, batch: List[dict]) -> None:
+    conn.execute(insert(exec_log_fts), batch)
+
+
+def index_exec_log(db: Session, exec_id: int, log_path: Optional[str]) -> bool:
+    """把已完成执行的日志写入全文索引（不提交），已索引或无日志时跳过"""
+    if not log_path:
+        return False
+    if db.get(ExecLogIndex, exec_id) is not None:
+        return False
+    path = Path(log_path)
+    if not path.exists():
+        return False
+
+    conn = db.connection()
+    with open(path, encoding="utf-8", errors="replace") as f:
+        line_count = index_log_lines(conn, exec_id, f)
+    db.add(ExecLogIndex(exec_id=exec_id, line_count=line_count))
+    return True
+
+
+def index_pending_logs(db: Session, batch_size: int = 100) -> int:
+    """补建尚未索引的已完成日志（例如升级前产生的日志）"""
+    total = 0
+    last_id = 0
+    while True:
+        records = (
+            db.query(ScriptExecRecord)
+            .outerjoin(ExecLogIndex, ExecLogIndex.exec_id == ScriptExecRecord.id)
+            .filter(
+                ExecLogIndex.exec_id.is_(None),
+                ScriptExecRecord.status.notin_(("queued", "running")),
+                ScriptExecRecord.log_path.isnot(None),
+                ScriptExecRecord.id > last_id,
+            )
+            .order_by(ScriptExecRecord.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not records:
+            return total
+        for record in records:
+            if index_exec_log(db, record.id, record.log_path):
+                db.commit()
+                total += 1
+        last_id = records[-1].id
+
+
+def remove_exec_logs(db: Session, script_id: int) -> None:
+    """删除某脚本所有执行日志的索引（不提交）"""
+    exec_ids = select(ScriptExecRecord.id).where(
+        ScriptExecRecord.script_id == script_id
+    )
+    db.execute(delete(exec_log_fts).where(exec_log_fts.c.exec_id.in_(exec_ids)))
+    db.execute(delete(ExecLogIndex).where(ExecLogIndex.exec_id.in_(exec_ids)))
+
+
+def _hit_line(line_start: int, highlighted: str) -> int:
+    pos = highlighted.find(_HIT_START)
+    if pos < 0:
+        return line_start
+    return line_start + highlighted.count("\n", 0, pos)
+
+
+def search_exec_logs(
+    db: Session,
+    keyword: str,
+    script_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 50,
+) -> List[dict]:
+    """全文检索执行日志，按执行开始时间倒序返回命中的行"""
+    fts = literal_column("exec_log_fts")
+    match = fts.op("MATCH")(fts_phrase(keyword))
+    # 先只取排序所需的列确定命中块，再只为这些块生成摘要，
+    # 避免常见词命中大量块时为每一块计算 snippet/highlight
+    query = (
+        select(
+            literal_column("exec_log_fts.rowid").label("chunk_id"),
+            exec_log_fts.c.exec_id,
+            exec_log_fts.c.line_start,
+            ScriptExecRecord.script_id,
+            ScriptExecRecord.start_time,
+        )
+        .join(ScriptExecRecord, ScriptExecRecord.id == exec_log_fts.c.exec_id)
+        .where(match)
+    )
+    if script_id is not None:
+        query = query.where(ScriptExecRecord.script_id == script_id)
+    if start is not None:
+        query = query.where(ScriptExecRecord.start_time >= start)
+    if end is not None:
+        query = query.where(ScriptExecRecord.start_time < end)
+    query = query.order_by(
+        ScriptExecRecord.start_time.desc(),
+        ScriptExecRecord.id.desc(),
+        exec_log_fts.c.line_start,
+    ).limit(limit)
+    hits = db.execute(query).all()
+    if not hits:
+        return []
+
+    chunk_ids = [hit.chunk_id for hit in hits]
+    details = {
+        row.chunk_id: row
+        for row in db.execute(
+            select(
+                literal_column("rowid").label("chunk_id"),
+                func.snippet(fts, 0, "<mark>", "</mark>", "…", 16).label("snippet"),
+                func.highlight(fts, 0, _HIT_START, _HIT_END).label("highlighted"),
+            )
+            .select_from(exec_log_fts)
+            .where(match, literal_column("rowid").in_(chunk_ids))
+        )
+    }
+    results = []
+    for hit in hits:
+        detail = details.get(hit.chunk_id)
+        if detail is None:
+            continue
+        results.append(
+            {
+                "exec_id": hit.exec_id,
+                "script_id": hit.script_id,
+                "start_time": hit.start_time,
+                "line": _hit_line(hit.line_start, detail.highlighted),
+                "snippet": detail.snippet,
+            }
+        )
+    return results
+
+
+def index_script(
+    db: Session, script: ScriptItem, content: Optional[str] = None
+) -> None:
+    """写入或刷新脚本的检索条目（不提交），content 为空时取最新版本内容"""
+    if content is None:
+        latest = get_latest_content(db, script.id)
+        content = latest[2] if latest is not None else None
+    db.execute(delete(script_fts).where(script_fts.c.rowid == script.id))
+    db.execute(
+        insert(script_fts).values(
+            rowid=script.id,
+            title=script.title,
+            description=script.description or "",
+            content=content or "",
+        )
+    )
+
+
+def remove_script_index(db: Session, script_id: int) -> None:
+    """删除脚本的检索条目（不提交）"""
+    db.execute(delete(script_fts).where(script_fts.c.rowid == script_id))
+
+
+def _latest_content(db: Session, row) -> Optional[str]:
+    # 最新版本的内容是完整快照时直接使用，以增量保存时才逐个还原
+    if row.content is not None or row.content_hash is None:
+        return row.content
+    return get_blob_content(db, row.content_hash)
+
+
+def rebuild_script_index(db: Session, force: bool = False) -> int:
+    """重建脚本检索索引，默认仅在索引为空而脚本表非空时执行"""
+    if not force:
+        indexed = db.scalar(select(func.count()).select_from(script_fts))
+        if indexed or not db.scalar(select(func.count(ScriptItem.id))):
+            return 0
+
+    latest = (
+        select(
+            ScriptVersion.script_id,
+            func.max(ScriptVersion.version).label("version"),
+        )
+        .group_by(ScriptVersion.script_id)
+        .subquery()
+    )
+    rows = db.execute(
+        select(
+            ScriptItem.id,
+            ScriptItem.title,
+            ScriptItem.description,
+            ScriptVersion.content_hash,
+            ScriptBlob.content,
+        )
+        .outerjoin(latest, latest.c.script_id == ScriptItem.id)
+        .outerjoin(
+            ScriptVersion,
+            (ScriptVersion.script_id == latest.c.script_id)
+            & (ScriptVersion.version == latest.c.version),
+        )
+        .outerjoin(ScriptBlob, ScriptBlob.hash == ScriptVersion.content_hash)
+    ).all()
+    db.execute(delete(script_fts))
+    if rows:
+        db.execute(
+            insert(script_fts),
+            [
+                {
+                    "rowid": row.id,
+                    "title": row.title,
+                    "description": row.description or "",
+                    "content": _latest_content(db, row) or "",
+                }
+                for row in rows
+            ],
+        )
+    db.commit()
+    return len(rows)
+
+
+def script_rank_subquery(keyword: str):
+    """命中关键字的脚本及其相关度（bm25，越小越相关），无有效词时返回 None"""
+    match = fts_prefix_query(keyword)
+    if match is None:
+        return None
+    fts = literal_column("script_fts")
+    return (
+        select(
+            script_fts.c.rowid.label("script_id"),
+            func.bm25(fts, *SCRIPT_RANK_WEIGHTS).label("rank"),
+        )
+        .where(fts.op("MATCH")(match))
+        .subquery()
+    )
@@ -0,0 +1,208 @@
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# 单个请求允许执行的 SQL 语句数上限，0 表示不检查
+MAX_QUERIES_PER_REQUEST = int(os.environ.get("OPS_MAX_QUERIES_PER_REQUEST", "0"))
+# 严格模式下超出上限的请求直接返回 500（用于测试/压测环境发现 N+1），否则只打印警告
+QUERY_GUARD_STRICT = os.environ.get("OPS_QUERY_GUARD_STRICT", "") == "1"
+# 慢查询阈值（毫秒），超过时记录语句、参数与执行计划；0 表示不记录
+SLOW_QUERY_MS = float(os.environ.get("OPS_SLOW_QUERY_MS", "200"))
+# 结构化访问日志：不设置或为 "-" 时输出到标准输出，"off" 关闭，其他值为文件路径
+ACCESS_LOG = os.environ.get("OPS_ACCESS_LOG", "-")
+
+_EXPLAINABLE = ("select", "with", "update", "delete", "insert")
+
+
+def _json_logger(name: str, target: str) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if target != "off" and not logger.handlers:
+        handler = (
+            logging.StreamHandler(sys.stdout)
+            if target == "-"
+            else logging.FileHandler(target, encoding="utf-8")
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+    return logger
+
+
+access_logger = _json_logger("opstool.access", ACCESS_LOG)
+slow_query_logger = _json_logger("opstool.slow_query", ACCESS_LOG)
+
+
+def log_json(logger: logging.Logger, **fields) -> None:
+    if not logger.handlers:
+        return
+    now = datetime.utcnow().isoformat(timespec="milliseconds") + "Z"
+    fields = {"time": now, **fields}
+    logger.info(json.dumps(fields, ensure_ascii=False, default=str))
+
+
+class QueryStats:
+    """一次请求（或一段代码）内的 SQL 统计"""
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.count = 0
+        self.db_time = 0.0
+        self.statements: List[str] = []
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar(
+    "query_stats", default=None
+)
+
+
+class TooManyQueries(RuntimeError):
+    pass
+
+
+def _explain(conn, statement: str, parameters) -> List[str]:
+    if conn.dialect.name != "sqlite":
+        return []
+    if not statement.lstrip().lower().startswith(_EXPLAINABLE):
+        return []
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+        return [row[-1] for row in cursor.fetchall()]
+    except Exception as e:
+        return [f"EXPLAIN 失败: {e}"]
+    finally:
+        cursor.close()
+
+
+def install_sql_stats(engine: Engine) -> None:
+    """在引擎上统计语句数与耗时并记录慢查询（异步引擎传入 sync_engine）"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        stats = _current.get()
+        if stats is not None:
+            stats.count += 1
+            stats.db_time += elapsed
+            stats.statements.append(statement)
+        if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+            log_json(
+                slow_query_logger,
+                event="slow_query",
+                request=stats.label if stats is not None else None,
+                duration_ms=round(elapsed * 1000, 2),
+                statement=statement,
+                parameters=repr(parameters)[:1000],
+                plan=[] if executemany else _explain(conn, statement, parameters),
+            )
+
+
+@contextmanager
+def sql_stats(label: str = "", limit: Optional[int] = None) -> Iterator[QueryStats]:
+    """统计代码块内执行的 SQL，超过 limit 条时抛出 TooManyQueries"""
+    stats = QueryStats(label)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+    if limit is not None and stats.count > limit:
+        raise TooManyQueries(
+            f"执行了 {stats.count} 条 SQL，超过上限 {limit}:\n"
+            + "\n".join(stats.statements)
+        )
+
+
+class SQLStatsMiddleware:
+    """ASGI 中间件：Server-Timing 响应头、结构化访问日志与可选的 SQL 语句数守卫
+
+    直接实现 ASGI 接口而不是用 BaseHTTPMiddleware，后者每个请求多一次任务
+    切换和响应流转发，开销在高并发下很明显。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        label = f"{scope['method']} {scope['path']}"
+        started = time.perf_counter()
+        state = {"status": 500, "rejected": False}
+
+        async def send_with_stats(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                headers = list(message.get("headers", []))
+                db_ms = stats.db_time * 1000
+                app_ms = (time.perf_counter() - started) * 1000
+                headers.append(
+                    (
+                        b"server-timing",
+                        f'db;dur={db_ms:.1f};desc="{stats.count} queries", '
+                        f"app;dur={app_ms:.1f}".encode("latin-1"),
+                    )
+                )
+                if MAX_QUERIES_PER_REQUEST:
+                    headers.append((b"x-sql-queries", str(stats.count).encode()))
+                    if stats.count > MAX_QUERIES_PER_REQUEST:
+                        print(
+                            f"警告：{label} 执行了 {stats.count} 条 SQL，"
+                            f"超过上限 {MAX_QUERIES_PER_REQUEST}"
+                        )
+                        if QUERY_GUARD_STRICT:
+                            # 丢弃原响应，改为 500 并列出执行的语句
+                            state["rejected"] = True
+                            state["status"] = 500
+                            body = "\n".join(stats.statements).encode("utf-8")
+                            await send(
+                                {
+                                    "type": "http.response.start",
+                                    "status": 500,
+                                    "headers": [
+                                        (b"content-type", b"text/plain; charset=utf-8"),
+                                        (b"content-length", str(len(body)).encode()),
+                                        (b"x-sql-queries", str(stats.count).encode()),
+                                    ],
+                                }
+                            )
+                            await send({"type": "http.response.body", "body": body})
+                            return
+                message = {**message, "headers": headers}
+            elif state["rejected"]:
+                return
+            await send(message)
+
+        try:
+            with sql_stats(label) as stats:
+                await self.app(scope, receive, send_with_stats)
+        finally:
+            # 未处理的异常由外层返回 500，这里照样记一条访问日志
+            session = scope.get("session") or {}
+            log_json(
+                access_logger,
+                event="access",
+                method=scope["method"],
+                path=scope["path"],
+                status=state["status"],
+                duration_ms=round((time.perf_counter() - started) * 1000, 2),
+                db_queries=stats.count,
+                db_ms=round(stats.db_time * 1000, 2),
+                user_id=session.get("user_id"),
+            )
@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+
+# 缓存条目的存活时间（秒）与最多缓存的用户数
+USER_CACHE_TTL = float(os.environ.get("OPS_USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.environ.get("OPS_USER_CACHE_SIZE", "1024"))
+# 检查数据库版本戳的最短间隔（秒），即其他进程修改用户后最长的生效延迟
+AUTH_STAMP_CHECK_INTERVAL = float(
+    os.environ.get("OPS_AUTH_STAMP_CHECK_INTERVAL", "1")
+)
+
+
+def bump_auth_stamp(db: Session) -> None:
+    """递增用户数据版本戳（不提交），修改或禁用用户、吊销令牌后调用"""
+    db.execute(
+        update(models.AuthStamp)
+        .where(models.AuthStamp.id == 1)
+        .values(version=models.AuthStamp.version + 1)
+    )
+
+
+class _TTLCache:
+    """线程安全的 TTL + LRU 字典"""
+
+    def __init__(self, ttl: float, max_size: int):
+        self._ttl = ttl
+        self._max_size = max_size
+        self._entries: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self._ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class UserCache:
+    """已登录用户的 TTL/LRU 缓存，按用户 id 缓存；API 令牌哈希到用户 id 的映射同样缓存
+
+    每个请求都要校验登录用户，缓存后不必每次查 user 表。本进程内修改用户时
+    调用 invalidate；其他进程（如 scripts/create_admin.py）修改用户时递增
+    auth_stamp 表的版本戳，这里最多每 AUTH_STAMP_CHECK_INTERVAL 秒检查一次，
+    发现变化就清空缓存。缓存的是已脱离会话的 User 实例，只能读取。
+    """
+
+    def __init__(
+        self,
+        ttl: float = USER_CACHE_TTL,
+        max_size: int = USER_CACHE_SIZE,
+        stamp_interval: float = AUTH_STAMP_CHECK_INTERVAL,
+    ):
+        self._users = _TTLCache(ttl, max_size)
+        self._tokens = _TTLCache(ttl, max_size)
+        self._stamp_interval = stamp_interval
+        self._stamp: Optional[int] = None
+        self._stamp_checked = 0.0
+
+    async def get(self, db: AsyncSession, user_id: int) -> Optional[models.User]:
+        """取用户，未命中或已过期时查库并写入缓存；用户不存在返回 None"""
+        await self._check_stamp(db)
+        user = self._users.get(user_id)
+        if user is not None:
+            return user
+        user = await db.get(models.User, user_id)
+        if user is not None:
+            self._users.put(user_id, user)
+        return user
+
+    async def get_by_token(
+        self, db: AsyncSession, token_hash: str
+    ) -> Optional[models.User]:
+        """按 API 令牌哈希取用户，令牌不存在时返回 None"""
+        await self._check_stamp(db)
+        user_id = self._tokens.get(token_hash)
+        if user_id is None:
+            user_id = await db.scalar(
+                select(models.ApiToken.user_id).where(
+                    models.ApiToken.token_hash == token_hash
+                )
+            )
+            if user_id is None:
+                return None
+            self._tokens.put(token_hash, user_id)
+        return await self.get(db, user_id)
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        """移除指定用户的缓存，不指定时清空全部（含令牌）"""
+        if user_id is None:
+            self._users.clear()
+            self._tokens.clear()
+        else:
+            self._users.pop(user_id)
+
+    def invalidate_token(self, token_hash: str) -> None:
+        self._tokens.pop(token_hash)
+
+    async def _check_stamp(self, db: AsyncSession) -> None:
+        now = time.monotonic()
+        if now - self._stamp_checked < self._stamp_interval:
+            return
+        # 先占住本轮检查，避免并发请求同时查询版本戳
+        self._stamp_checked = now
+        stamp = await db.scalar(
+            select(models.AuthStamp.version).where(models.AuthStamp.id == 1)
+        )
+        if stamp != self._stamp:
+            if self._stamp is not None:
+                self.invalidate()
+            self._stamp = stamp
+
+
+user_cache = UserCache()
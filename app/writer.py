@@ -0,0 +1,252 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+
+from .database import SessionLocal
+from .metrics import Gauge, Histogram, registry
+from .models import ScriptExecRecord
+
+# 一批写入最多等待的时间（毫秒）与最多合并的操作数
+WRITER_FLUSH_MS = int(os.environ.get("OPS_WRITER_FLUSH_MS", "20"))
+WRITER_MAX_BATCH = int(os.environ.get("OPS_WRITER_MAX_BATCH", "500"))
+# 提交遇到 database is locked 等暂时性错误时的重试次数与首次退避（毫秒，之后每次翻倍）
+WRITER_RETRIES = int(os.environ.get("OPS_WRITER_RETRIES", "5"))
+WRITER_RETRY_BACKOFF_MS = int(os.environ.get("OPS_WRITER_RETRY_BACKOFF_MS", "50"))
+
+_STOP = object()
+
+writer_queue_wait = registry.register(
+    Histogram(
+        "opstool_writer_queue_wait_seconds",
+        "执行状态写入从投递到提交的等待时间",
+    )
+)
+
+
+class _Create:
+    def __init__(self, values: dict, future: Future):
+        self.values = values
+        self.future = future
+        self.result: Optional[int] = None
+        self.submitted = time.monotonic()
+
+
+class _Update:
+    def __init__(self, exec_id: int, values: dict, future: Future):
+        self.exec_id = exec_id
+        self.values = values
+        self.future = future
+        self.result = None
+        self.submitted = time.monotonic()
+
+
+class _Call:
+    def __init__(self, func: Callable[[Session], None], future: Future):
+        self.func = func
+        self.future = future
+        self.result = None
+        # 本次尝试中保存点回滚的异常，批次提交后设置到 future
+        self.error: Optional[Exception] = None
+        self.submitted = time.monotonic()
+
+
+class ExecStateWriter:
+    """执行状态的单写线程
+
+    执行过程中的状态变化（创建、开始、结束等）都投递到队列，由唯一的
+    写线程合并后在一个事务里提交（group commit）：同一执行记录的多次
+    更新合并为一条 UPDATE，一批只需一次 fsync、一次获取写锁。
+    调用方拿到的 Future 在所在批次提交后完成。
+
+    提交遇到暂时性错误（如其他连接持有写锁超过 busy_timeout）时整批按
+    指数退避重试；其他错误时逐个操作单独提交，一个失败的操作不会让同批次
+    其他执行的结束状态丢失。
+    """
+
+    def __init__(
+        self,
+        session_factory: sessionmaker = SessionLocal,
+        flush_interval: float = WRITER_FLUSH_MS / 1000,
+        max_batch: int = WRITER_MAX_BATCH,
+        retries: int = WRITER_RETRIES,
+        retry_backoff: float = WRITER_RETRY_BACKOFF_MS / 1000,
+    ):
+        self._session_factory = session_factory
+        self._flush_interval = flush_interval
+        self._max_batch = max_batch
+        self._retries = retries
+        self._retry_backoff = retry_backoff
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="exec-state-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _submit(self, op) -> Future:
+        self._ensure_started()
+        self._queue.put(op)
+        return op.future
+
+    def create(self, **values) -> "Future[int]":
+        """新建执行记录，Future 结果为记录 id"""
+        return self._submit(_Create(values, Future()))
+
+    def update(self, exec_id: int, **values) -> "Future[None]":
+        """更新执行记录的字段，同一批次内对同一记录的更新会合并"""
+        return self._submit(_Update(exec_id, values, Future()))
+
+    def call(self, func: Callable[[Session], None]) -> "Future[None]":
+        """在写线程的批次事务中执行任意写操作（func 不应自行提交）"""
+        return self._submit(_Call(func, Future()))
+
+    def queue_depth(self) -> int:
+        """尚未被写线程取走的操作数"""
+        return self._queue.qsize()
+
+    def flush(self) -> None:
+        """等待此前投递的所有操作提交"""
+        self.call(lambda session: None).result()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _collect(self, first) -> List:
+        batch = [first]
+        deadline = time.monotonic() + self._flush_interval
+        while len(batch) < self._max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                op = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(op)
+            if op is _STOP:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect(self._queue.get())
+            stopping = batch[-1] is _STOP
+            if stopping:
+                batch.pop()
+            if batch:
+                self._commit(batch)
+            if stopping:
+                return
+
+    def _commit(self, batch: List) -> None:
+        try:
+            self._commit_with_retry(batch)
+        except OperationalError as exc:  # 重试后仍失败，整批失败
+            self._fail(batch, exc)
+        except Exception as exc:
+            if len(batch) == 1:
+                self._fail(batch, exc)
+                return
+            # 某个操作本身有问题，逐个提交找出它，其余操作照常落库
+            for op in batch:
+                try:
+                    self._commit_with_retry([op])
+                except Exception as op_exc:
+                    self._fail([op], op_exc)
+
+    def _commit_with_retry(self, batch: List) -> None:
+        delay = self._retry_backoff
+        for attempt in range(self._retries + 1):
+            try:
+                self._commit_once(batch)
+                return
+            except OperationalError:
+                if attempt >= self._retries:
+                    raise
+                time.sleep(delay)
+                delay *= 2
+
+    def _commit_once(self, batch: List) -> None:
+        """在一个事务中提交批次，成功后完成各 Future；失败时回滚并抛出"""
+        session = self._session_factory()
+        try:
+            # 按投递顺序处理；遇到 call 之前先落地已合并的更新，保证可见性顺序
+            pending: Dict[int, dict] = {}
+            for op in batch:
+                if isinstance(op, _Create):
+                    record = ScriptExecRecord(**op.values)
+                    session.add(record)
+                    session.flush()
+                    op.result = record.id
+                elif isinstance(op, _Update):
+                    pending.setdefault(op.exec_id, {}).update(op.values)
+                else:
+                    self._apply_updates(session, pending)
+                    pending = {}
+                    # 单个 call 失败只回滚它自己的保存点，不影响同批次其他状态
+                    op.error = None
+                    try:
+                        with session.begin_nested():
+                            op.func(session)
+                    except Exception as exc:
+                        op.error = exc
+            self._apply_updates(session, pending)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+        committed = time.monotonic()
+        for op in batch:
+            writer_queue_wait.observe(committed - op.submitted)
+            if isinstance(op, _Call) and op.error is not None:
+                op.future.set_exception(op.error)
+            else:
+                op.future.set_result(op.result)
+
+    @staticmethod
+    def _fail(batch: List, exc: Exception) -> None:
+        print(f"警告：执行状态写入失败（{len(batch)} 个操作）: {exc}")
+        for op in batch:
+            if not op.future.done():
+                op.future.set_exception(exc)
+
+    @staticmethod
+    def _apply_updates(session: Session, pending: Dict[int, dict]) -> None:
+        for exec_id, values in pending.items():
+            session.execute(
+                update(ScriptExecRecord)
+                .where(ScriptExecRecord.id == exec_id)
+                .values(**values)
+            )
+
+
+exec_writer = ExecStateWriter()
+
+registry.register(
+    Gauge(
+        "opstool_writer_queue_depth",
+        "等待单写线程处理的执行状态写入数",
+        collect=exec_writer.queue_depth,
+    )
+)
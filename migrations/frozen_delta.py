@@ -0,0 +1,58 @@
+"""迁移脚本使用的行级增量编码（冻结副本）
+
+与 0009 引入增量存储时 app/diffing.py 的实现逐字节一致。已发布的迁移
+产生的数据格式不能随应用代码变化，之后修改 app.diffing 时不要改动本文件；
+需要新的编码时新建模块和新的迁移版本。
+"""
+import json
+from difflib import SequenceMatcher
+from typing import List, Union
+
+# 行级增量的操作：正整数 n 表示照抄基准的 n 行，负整数 -n 表示跳过基准的 n 行，
+# 字符串列表表示插入这些行。行保留行尾换行符，还原结果与原文逐字节一致。
+DeltaOp = Union[int, List[str]]
+
+
+def split_lines(text: str) -> List[str]:
+    return text.splitlines(keepends=True)
+
+
+def make_delta(base: str, target: str) -> List[DeltaOp]:
+    """计算把 base 变为 target 的行级增量"""
+    base_lines = split_lines(base)
+    target_lines = split_lines(target)
+    ops: List[DeltaOp] = []
+    matcher = SequenceMatcher(None, base_lines, target_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append(i2 - i1)
+            continue
+        if i2 > i1:
+            ops.append(-(i2 - i1))
+        if j2 > j1:
+            ops.append(target_lines[j1:j2])
+    return ops
+
+
+def apply_delta(base: str, ops: List[DeltaOp]) -> str:
+    """把 make_delta 得到的增量应用到 base 上"""
+    base_lines = split_lines(base)
+    result: List[str] = []
+    pos = 0
+    for op in ops:
+        if isinstance(op, list):
+            result.extend(op)
+        elif op >= 0:
+            result.extend(base_lines[pos : pos + op])
+            pos += op
+        else:
+            pos -= op
+    return "".join(result)
+
+
+def encode_delta(ops: List[DeltaOp]) -> str:
+    return json.dumps(ops, ensure_ascii=False, separators=(",", ":"))
+
+
+def decode_delta(text: str) -> List[DeltaOp]:
+    return json.loads(text)
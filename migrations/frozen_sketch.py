@@ -0,0 +1,31 @@
+"""迁移脚本使用的耗时草图编码（冻结副本）
+
+与 0007 引入每日汇总时 app/exec_stats.py 中 DurationSketch 的分桶与 JSON
+格式一致。已发布的迁移写入的数据不能随应用代码变化，之后修改
+app.exec_stats 时不要改动本文件。
+"""
+import json
+import math
+from typing import Dict
+
+# 相对误差 1%，小于 1 毫秒的耗时记入最小的桶
+RELATIVE_ACCURACY = 0.01
+MIN_SECONDS = 0.001
+
+_LOG_GAMMA = math.log((1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY))
+
+
+def bucket_index(seconds: float) -> int:
+    return math.ceil(math.log(max(seconds, MIN_SECONDS)) / _LOG_GAMMA)
+
+
+def add_duration(buckets: Dict[int, int], seconds: float) -> None:
+    index = bucket_index(seconds)
+    buckets[index] = buckets.get(index, 0) + 1
+
+
+def encode_sketch(buckets: Dict[int, int]) -> str:
+    return json.dumps(
+        {str(index): count for index, count in sorted(buckets.items())},
+        separators=(",", ":"),
+    )
@@ -0,0 +1,113 @@
+"""baseline schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+
+已有数据库由 Base.metadata.create_all 建表，这里逐表检查后再创建，
+因此既能初始化新库，也能直接接管旧库。
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _has_table(name: str) -> bool:
+    if context.is_offline_mode():
+        return False
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade() -> None:
+    if not _has_table("script_category"):
+        op.create_table(
+            "script_category",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(100), nullable=False, unique=True),
+            sa.Column("description", sa.String(255), nullable=True),
+            sa.Column("order", sa.Integer(), nullable=True),
+        )
+        op.create_index("ix_script_category_id", "script_category", ["id"])
+
+    if not _has_table("script_item"):
+        op.create_table(
+            "script_item",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column(
+                "category_id",
+                sa.Integer(),
+                sa.ForeignKey("script_category.id"),
+                nullable=True,
+            ),
+            sa.Column("title", sa.String(200), nullable=False),
+            sa.Column("description", sa.String(500), nullable=True),
+            sa.Column("script_type", sa.String(50), nullable=False),
+            sa.Column("exec_command_template", sa.String(500), nullable=True),
+            sa.Column("script_path", sa.String(500), nullable=False),
+            sa.Column("enabled", sa.Boolean(), nullable=True),
+            sa.Column("is_dangerous", sa.Boolean(), nullable=True),
+            sa.Column("create_time", sa.DateTime(), nullable=True),
+            sa.Column("update_time", sa.DateTime(), nullable=True),
+        )
+        op.create_index("ix_script_item_id", "script_item", ["id"])
+
+    if not _has_table("script_version"):
+        op.create_table(
+            "script_version",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column(
+                "script_id",
+                sa.Integer(),
+                sa.ForeignKey("script_item.id"),
+                nullable=False,
+            ),
+            sa.Column("version", sa.Integer(), nullable=False),
+            sa.Column("content", sa.Text(), nullable=False),
+            sa.Column("editor", sa.String(100), nullable=True),
+            sa.Column("remark", sa.String(255), nullable=True),
+            sa.Column("create_time", sa.DateTime(), nullable=True),
+        )
+        op.create_index("ix_script_version_id", "script_version", ["id"])
+
+    if not _has_table("script_exec_record"):
+        op.create_table(
+            "script_exec_record",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column(
+                "script_id",
+                sa.Integer(),
+                sa.ForeignKey("script_item.id"),
+                nullable=False,
+            ),
+            sa.Column("start_time", sa.DateTime(), nullable=True),
+            sa.Column("end_time", sa.DateTime(), nullable=True),
+            sa.Column("status", sa.String(50), nullable=True),
+            sa.Column("exit_code", sa.Integer(), nullable=True),
+            sa.Column("operator", sa.String(100), nullable=True),
+            sa.Column("params_json", sa.Text(), nullable=True),
+            sa.Column("log_path", sa.String(500), nullable=True),
+        )
+        op.create_index("ix_script_exec_record_id", "script_exec_record", ["id"])
+
+    if not _has_table("user"):
+        op.create_table(
+            "user",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("username", sa.String(100), nullable=False, unique=True),
+            sa.Column("hashed_password", sa.String(255), nullable=False),
+            sa.Column("is_active", sa.Boolean(), nullable=True),
+            sa.Column("create_time", sa.DateTime(), nullable=True),
+        )
+        op.create_index("ix_user_id", "user", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("user")
+    op.drop_table("script_exec_record")
+    op.drop_table("script_version")
+    op.drop_table("script_item")
+    op.drop_table("script_category")
@@ -0,0 +1,57 @@
+"""full-text search tables for exec logs and script catalog
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if context.is_offline_mode() or not sa.inspect(op.get_bind()).has_table(
+        "exec_log_index"
+    ):
+        op.create_table(
+            "exec_log_index",
+            sa.Column(
+                "exec_id",
+                sa.Integer(),
+                sa.ForeignKey("script_exec_record.id"),
+                primary_key=True,
+            ),
+            sa.Column("line_count", sa.Integer(), nullable=False),
+            sa.Column("indexed_at", sa.DateTime(), nullable=True),
+        )
+    op.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS exec_log_fts USING fts5(
+            content,
+            exec_id UNINDEXED,
+            line_start UNINDEXED,
+            tokenize = 'unicode61'
+        )
+        """
+    )
+    op.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS script_fts USING fts5(
+            title,
+            description,
+            content,
+            tokenize = 'unicode61',
+            prefix = '2 3'
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS script_fts")
+    op.execute("DROP TABLE IF EXISTS exec_log_fts")
+    op.drop_table("exec_log_index")
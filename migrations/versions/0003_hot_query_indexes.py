@@ -0,0 +1,77 @@
+"""composite indexes for hot queries and unique script versions
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def _renumber_duplicate_versions() -> None:
+    if context.is_offline_mode():
+        return
+    bind = op.get_bind()
+    script_ids = bind.execute(
+        sa.text(
+            "SELECT DISTINCT script_id FROM script_version "
+            "GROUP BY script_id, version HAVING COUNT(*) > 1"
+        )
+    ).scalars().all()
+    for script_id in script_ids:
+        version_ids = bind.execute(
+            sa.text(
+                "SELECT id FROM script_version WHERE script_id = :sid "
+                "ORDER BY version, id"
+            ),
+            {"sid": script_id},
+        ).scalars().all()
+        bind.execute(
+            sa.text("UPDATE script_version SET version = :ver WHERE id = :id"),
+            [{"ver": n, "id": vid} for n, vid in enumerate(version_ids, start=1)],
+        )
+
+
+def upgrade() -> None:
+    # 脚本列表游标分页 / 首页按启用状态取最近更新
+    op.create_index(
+        "ix_script_item_update_time_id",
+        "script_item",
+        ["update_time", "id"],
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_script_item_enabled_update_time",
+        "script_item",
+        ["enabled", "update_time"],
+        if_not_exists=True,
+    )
+    # 脚本执行历史按开始时间倒序
+    op.create_index(
+        "ix_exec_record_script_start_id",
+        "script_exec_record",
+        ["script_id", "start_time", "id"],
+        if_not_exists=True,
+    )
+
+    # 并发保存可能产生过重复版本号，建唯一索引前按 (version, id) 重新编号
+    _renumber_duplicate_versions()
+    op.create_index(
+        "uq_script_version_script_id_version",
+        "script_version",
+        ["script_id", "version"],
+        unique=True,
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("uq_script_version_script_id_version", "script_version")
+    op.drop_index("ix_exec_record_script_start_id", "script_exec_record")
+    op.drop_index("ix_script_item_enabled_update_time", "script_item")
+    op.drop_index("ix_script_item_update_time_id", "script_item")
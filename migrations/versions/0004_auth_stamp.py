@@ -0,0 +1,26 @@
+"""auth stamp for invalidating cached users
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    auth_stamp = op.create_table(
+        "auth_stamp",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("version", sa.Integer(), nullable=False),
+    )
+    op.bulk_insert(auth_stamp, [{"id": 1, "version": 0}])
+
+
+def downgrade() -> None:
+    op.drop_table("auth_stamp")
@@ -0,0 +1,34 @@
+"""per-user API tokens
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "api_token",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("user.id"), nullable=False),
+        sa.Column("name", sa.String(length=100), nullable=False),
+        sa.Column("token_hash", sa.String(length=64), nullable=False),
+        sa.Column("token_prefix", sa.String(length=16), nullable=False),
+        sa.Column("create_time", sa.DateTime(), nullable=True),
+        sa.UniqueConstraint("token_hash"),
+    )
+    op.create_index("ix_api_token_id", "api_token", ["id"])
+    op.create_index("ix_api_token_user_id", "api_token", ["user_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_api_token_user_id", table_name="api_token")
+    op.drop_index("ix_api_token_id", table_name="api_token")
+    op.drop_table("api_token")
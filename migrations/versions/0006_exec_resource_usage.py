@@ -0,0 +1,35 @@
+"""resource usage columns on script_exec_record
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+_COLUMNS = (
+    ("cpu_user_seconds", sa.Float()),
+    ("cpu_system_seconds", sa.Float()),
+    ("max_rss_kb", sa.Integer()),
+    ("read_bytes", sa.BigInteger()),
+    ("write_bytes", sa.BigInteger()),
+    ("voluntary_ctx_switches", sa.BigInteger()),
+    ("involuntary_ctx_switches", sa.BigInteger()),
+)
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("script_exec_record") as batch_op:
+        for name, type_ in _COLUMNS:
+            batch_op.add_column(sa.Column(name, type_, nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("script_exec_record") as batch_op:
+        for name, _ in reversed(_COLUMNS):
+            batch_op.drop_column(name)
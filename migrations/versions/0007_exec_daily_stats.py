@@ -0,0 +1,124 @@
+"""daily execution rollups per script
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+from migrations.frozen_sketch import add_duration, encode_sketch
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+script_exec_record = sa.table(
+    "script_exec_record",
+    sa.column("id"),
+    sa.column("script_id"),
+    sa.column("start_time", sa.DateTime()),
+    sa.column("end_time", sa.DateTime()),
+    sa.column("status"),
+)
+script_exec_daily = sa.table(
+    "script_exec_daily",
+    sa.column("script_id"),
+    sa.column("day", sa.Date()),
+    sa.column("runs"),
+    sa.column("successes"),
+    sa.column("failures"),
+    sa.column("total_seconds"),
+    sa.column("max_seconds"),
+    sa.column("duration_sketch"),
+)
+
+
+def _backfill() -> None:
+    """按已结束的执行记录补建每日汇总（与迁移编写时的 rebuild_exec_stats 一致）"""
+    conn = op.get_bind()
+    rows = {}
+    last_id = 0
+    while True:
+        records = conn.execute(
+            sa.select(
+                script_exec_record.c.id,
+                script_exec_record.c.script_id,
+                script_exec_record.c.start_time,
+                script_exec_record.c.end_time,
+                script_exec_record.c.status,
+            )
+            .where(
+                script_exec_record.c.id > last_id,
+                script_exec_record.c.status.in_(("success", "fail")),
+                script_exec_record.c.start_time.isnot(None),
+                script_exec_record.c.end_time.isnot(None),
+            )
+            .order_by(script_exec_record.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not records:
+            break
+        for record in records:
+            key = (record.script_id, record.start_time.date())
+            row = rows.get(key)
+            if row is None:
+                row = rows[key] = {
+                    "script_id": key[0],
+                    "day": key[1],
+                    "runs": 0,
+                    "successes": 0,
+                    "failures": 0,
+                    "total_seconds": 0.0,
+                    "max_seconds": 0.0,
+                    "buckets": {},
+                }
+            seconds = max((record.end_time - record.start_time).total_seconds(), 0.0)
+            row["runs"] += 1
+            row["successes" if record.status == "success" else "failures"] += 1
+            row["total_seconds"] += seconds
+            row["max_seconds"] = max(row["max_seconds"], seconds)
+            add_duration(row["buckets"], seconds)
+        last_id = records[-1].id
+    if rows:
+        conn.execute(
+            script_exec_daily.insert(),
+            [
+                {
+                    **{k: v for k, v in row.items() if k != "buckets"},
+                    "duration_sketch": encode_sketch(row["buckets"]),
+                }
+                for row in rows.values()
+            ],
+        )
+
+
+def upgrade() -> None:
+    op.create_table(
+        "script_exec_daily",
+        sa.Column(
+            "script_id",
+            sa.Integer(),
+            sa.ForeignKey("script_item.id"),
+            primary_key=True,
+        ),
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("runs", sa.Integer(), nullable=False),
+        sa.Column("successes", sa.Integer(), nullable=False),
+        sa.Column("failures", sa.Integer(), nullable=False),
+        sa.Column("total_seconds", sa.Float(), nullable=False),
+        sa.Column("max_seconds", sa.Float(), nullable=False),
+        sa.Column("duration_sketch", sa.Text(), nullable=False),
+    )
+    op.create_index("ix_script_exec_daily_day", "script_exec_daily", ["day"])
+    if not context.is_offline_mode():
+        # 用已有的执行记录补建汇总
+        _backfill()
+
+
+def downgrade() -> None:
+    op.drop_index("ix_script_exec_daily_day", table_name="script_exec_daily")
+    op.drop_table("script_exec_daily")
@@ -0,0 +1,91 @@
+"""last-run summary columns on script_item
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("script_item") as batch_op:
+        batch_op.add_column(sa.Column("last_exec_id", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("last_status", sa.String(length=50), nullable=True))
+        batch_op.add_column(sa.Column("last_run_at", sa.DateTime(), nullable=True))
+        batch_op.add_column(
+            sa.Column("run_count", sa.Integer(), nullable=False, server_default="0")
+        )
+        batch_op.add_column(
+            sa.Column("fail_count", sa.Integer(), nullable=False, server_default="0")
+        )
+
+    # 用已结束的执行记录补齐，update_time 不变
+    script = sa.table(
+        "script_item",
+        sa.column("id"),
+        sa.column("last_exec_id"),
+        sa.column("last_status"),
+        sa.column("last_run_at"),
+        sa.column("run_count"),
+        sa.column("fail_count"),
+    )
+    record = sa.table(
+        "script_exec_record",
+        sa.column("id"),
+        sa.column("script_id"),
+        sa.column("start_time"),
+        sa.column("status"),
+    )
+    finished = sa.and_(
+        record.c.script_id == script.c.id, record.c.status != "running"
+    )
+    last = (
+        sa.select(record.c.id)
+        .where(finished)
+        .order_by(record.c.start_time.desc(), record.c.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    op.execute(
+        script.update().values(
+            run_count=sa.select(sa.func.count())
+            .select_from(record)
+            .where(finished)
+            .scalar_subquery(),
+            fail_count=sa.select(sa.func.count())
+            .select_from(record)
+            .where(finished, record.c.status != "success")
+            .scalar_subquery(),
+            last_exec_id=last,
+        )
+    )
+    op.execute(
+        script.update()
+        .where(script.c.last_exec_id.isnot(None))
+        .values(
+            last_status=sa.select(record.c.status)
+            .where(record.c.id == script.c.last_exec_id)
+            .scalar_subquery(),
+            last_run_at=sa.select(record.c.start_time)
+            .where(record.c.id == script.c.last_exec_id)
+            .scalar_subquery(),
+        )
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("script_item") as batch_op:
+        for name in (
+            "fail_count",
+            "run_count",
+            "last_run_at",
+            "last_status",
+            "last_exec_id",
+        ):
+            batch_op.drop_column(name)
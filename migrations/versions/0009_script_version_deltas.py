@@ -0,0 +1,83 @@
+"""store script versions as periodic snapshots plus line deltas
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19
+"""
+import os
+
+from alembic import context, op
+import sqlalchemy as sa
+
+from migrations.frozen_delta import apply_delta, decode_delta, encode_delta, make_delta
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+# 与 OPS_VERSION_SNAPSHOT_INTERVAL 一致；迁移内自带编码逻辑，不依赖之后会变化的应用代码
+SNAPSHOT_INTERVAL = int(os.environ.get("OPS_VERSION_SNAPSHOT_INTERVAL", "20"))
+
+script_version = sa.table(
+    "script_version",
+    sa.column("id"),
+    sa.column("script_id"),
+    sa.column("version"),
+    sa.column("content"),
+    sa.column("delta"),
+)
+
+
+def _reencode(snapshot_interval: int) -> None:
+    """按快照间隔重新编码全部版本，间隔为 0 时全部还原为完整内容"""
+    conn = op.get_bind()
+    script_ids = conn.execute(sa.select(script_version.c.script_id).distinct()).scalars()
+    for script_id in list(script_ids):
+        rows = conn.execute(
+            sa.select(
+                script_version.c.id,
+                script_version.c.version,
+                script_version.c.content,
+                script_version.c.delta,
+            )
+            .where(script_version.c.script_id == script_id)
+            .order_by(script_version.c.version)
+        ).all()
+        contents = []
+        for row in rows:
+            if row.content is not None:
+                contents.append(row.content)
+            else:
+                contents.append(apply_delta(contents[-1], decode_delta(row.delta)))
+        since_snapshot = 0
+        for i, row in enumerate(rows):
+            content, delta = contents[i], None
+            consecutive = i > 0 and rows[i - 1].version == row.version - 1
+            if consecutive and since_snapshot < snapshot_interval:
+                encoded = encode_delta(make_delta(contents[i - 1], content))
+                if len(encoded) < len(content):
+                    content, delta = None, encoded
+            since_snapshot = 0 if delta is None else since_snapshot + 1
+            if (row.content, row.delta) != (content, delta):
+                conn.execute(
+                    script_version.update()
+                    .where(script_version.c.id == row.id)
+                    .values(content=content, delta=delta)
+                )
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("script_version") as batch_op:
+        batch_op.alter_column("content", existing_type=sa.Text(), nullable=True)
+        batch_op.add_column(sa.Column("delta", sa.Text(), nullable=True))
+    if not context.is_offline_mode():
+        _reencode(SNAPSHOT_INTERVAL)
+
+
+def downgrade() -> None:
+    if not context.is_offline_mode():
+        _reencode(0)
+    with op.batch_alter_table("script_version") as batch_op:
+        batch_op.drop_column("delta")
+        batch_op.alter_column("content", existing_type=sa.Text(), nullable=False)
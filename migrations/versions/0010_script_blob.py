@@ -0,0 +1,168 @@
+"""content-addressed script blobs referenced by versions
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19
+"""
+import hashlib
+import os
+
+from alembic import context, op
+import sqlalchemy as sa
+
+from migrations.frozen_delta import apply_delta, decode_delta, encode_delta, make_delta
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+# 与 OPS_VERSION_SNAPSHOT_INTERVAL 一致
+SNAPSHOT_INTERVAL = int(os.environ.get("OPS_VERSION_SNAPSHOT_INTERVAL", "20"))
+
+script_version = sa.table(
+    "script_version",
+    sa.column("id"),
+    sa.column("script_id"),
+    sa.column("version"),
+    sa.column("content"),
+    sa.column("delta"),
+    sa.column("content_hash"),
+)
+script_blob = sa.table(
+    "script_blob",
+    sa.column("hash"),
+    sa.column("content"),
+    sa.column("delta"),
+    sa.column("base_hash"),
+    sa.column("depth"),
+)
+
+
+def _move_to_blobs() -> None:
+    """还原每个版本的全文，按哈希去重写入 script_blob，增量以上一版本内容为基准"""
+    conn = op.get_bind()
+    depths = {}
+    script_ids = conn.execute(sa.select(script_version.c.script_id).distinct()).scalars()
+    for script_id in list(script_ids):
+        rows = conn.execute(
+            sa.select(
+                script_version.c.id,
+                script_version.c.version,
+                script_version.c.content,
+                script_version.c.delta,
+            )
+            .where(script_version.c.script_id == script_id)
+            .order_by(script_version.c.version)
+        ).all()
+        previous = previous_hash = None
+        for row in rows:
+            if row.content is not None:
+                content = row.content
+            else:
+                content = apply_delta(previous, decode_delta(row.delta))
+            digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+            if digest not in depths:
+                blob = {
+                    "hash": digest,
+                    "content": content,
+                    "delta": None,
+                    "base_hash": None,
+                    "depth": 0,
+                }
+                base_depth = depths.get(previous_hash)
+                if base_depth is not None and base_depth < SNAPSHOT_INTERVAL:
+                    delta = encode_delta(make_delta(previous, content))
+                    if len(delta) < len(content):
+                        blob.update(
+                            content=None,
+                            delta=delta,
+                            base_hash=previous_hash,
+                            depth=base_depth + 1,
+                        )
+                conn.execute(script_blob.insert().values(**blob))
+                depths[digest] = blob["depth"]
+            conn.execute(
+                script_version.update()
+                .where(script_version.c.id == row.id)
+                .values(content_hash=digest)
+            )
+            previous, previous_hash = content, digest
+
+
+def _restore_from_blobs() -> None:
+    """把每个版本引用的内容还原为全文写回 script_version.content"""
+    conn = op.get_bind()
+    blobs = {row.hash: row for row in conn.execute(sa.select(script_blob)).all()}
+    contents = {}
+
+    def resolve(digest):
+        chain = []
+        while digest not in contents and blobs[digest].delta is not None:
+            chain.append(digest)
+            digest = blobs[digest].base_hash
+        if digest not in contents:
+            contents[digest] = blobs[digest].content
+        content = contents[digest]
+        for link in reversed(chain):
+            content = contents[link] = apply_delta(
+                content, decode_delta(blobs[link].delta)
+            )
+        return content
+
+    rows = conn.execute(
+        sa.select(script_version.c.id, script_version.c.content_hash)
+    ).all()
+    for row in rows:
+        conn.execute(
+            script_version.update()
+            .where(script_version.c.id == row.id)
+            .values(content=resolve(row.content_hash))
+        )
+
+
+def upgrade() -> None:
+    op.create_table(
+        "script_blob",
+        sa.Column("hash", sa.String(length=64), primary_key=True),
+        sa.Column("content", sa.Text(), nullable=True),
+        sa.Column("delta", sa.Text(), nullable=True),
+        sa.Column(
+            "base_hash",
+            sa.String(length=64),
+            sa.ForeignKey("script_blob.hash"),
+            nullable=True,
+        ),
+        sa.Column("depth", sa.Integer(), nullable=False),
+        sa.Column("create_time", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_script_blob_base_hash", "script_blob", ["base_hash"])
+    with op.batch_alter_table("script_version") as batch_op:
+        batch_op.add_column(sa.Column("content_hash", sa.String(length=64), nullable=True))
+    if not context.is_offline_mode():
+        _move_to_blobs()
+    with op.batch_alter_table("script_version") as batch_op:
+        batch_op.alter_column(
+            "content_hash", existing_type=sa.String(length=64), nullable=False
+        )
+        batch_op.create_foreign_key(
+            "fk_script_version_content_hash", "script_blob", ["content_hash"], ["hash"]
+        )
+        batch_op.create_index("ix_script_version_content_hash", ["content_hash"])
+        batch_op.drop_column("delta")
+        batch_op.drop_column("content")
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("script_version") as batch_op:
+        batch_op.add_column(sa.Column("content", sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column("delta", sa.Text(), nullable=True))
+    if not context.is_offline_mode():
+        # 全部还原为完整内容，0009 的降级不再需要重新编码
+        _restore_from_blobs()
+    with op.batch_alter_table("script_version") as batch_op:
+        batch_op.drop_index("ix_script_version_content_hash")
+        batch_op.drop_constraint("fk_script_version_content_hash", type_="foreignkey")
+        batch_op.drop_column("content_hash")
+    op.drop_index("ix_script_blob_base_hash", table_name="script_blob")
+    op.drop_table("script_blob")
@@ -0,0 +1,35 @@
+"""version id and content hash of the snapshot each execution ran
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 已有的执行记录运行的是当时的脚本文件，无法确定版本，保持为空
+    with op.batch_alter_table("script_exec_record") as batch_op:
+        batch_op.add_column(sa.Column("version_id", sa.Integer(), nullable=True))
+        batch_op.add_column(
+            sa.Column("content_hash", sa.String(length=64), nullable=True)
+        )
+        batch_op.create_foreign_key(
+            "fk_script_exec_record_version_id",
+            "script_version",
+            ["version_id"],
+            ["id"],
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("script_exec_record") as batch_op:
+        batch_op.drop_constraint("fk_script_exec_record_version_id", type_="foreignkey")
+        batch_op.drop_column("content_hash")
+        batch_op.drop_column("version_id")
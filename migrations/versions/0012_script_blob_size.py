@@ -0,0 +1,64 @@
+"""content size on script_blob for metadata-only version listings
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-19
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+from migrations.frozen_delta import apply_delta, decode_delta
+
+revision = "0012"
+down_revision = "0011"
+branch_labels = None
+depends_on = None
+
+script_blob = sa.table(
+    "script_blob",
+    sa.column("hash"),
+    sa.column("content"),
+    sa.column("delta"),
+    sa.column("base_hash"),
+    sa.column("depth"),
+    sa.column("size"),
+)
+
+
+def _backfill_sizes() -> None:
+    """按深度升序还原每份内容（增量的基准总是先算出），写入字节数"""
+    conn = op.get_bind()
+    rows = conn.execute(
+        sa.select(
+            script_blob.c.hash,
+            script_blob.c.content,
+            script_blob.c.delta,
+            script_blob.c.base_hash,
+        ).order_by(script_blob.c.depth)
+    ).all()
+    contents = {}
+    for row in rows:
+        if row.content is not None:
+            content = row.content
+        else:
+            content = apply_delta(contents[row.base_hash], decode_delta(row.delta))
+        contents[row.hash] = content
+        conn.execute(
+            script_blob.update()
+            .where(script_blob.c.hash == row.hash)
+            .values(size=len(content.encode("utf-8")))
+        )
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("script_blob") as batch_op:
+        batch_op.add_column(sa.Column("size", sa.Integer(), nullable=True))
+    if not context.is_offline_mode():
+        _backfill_sizes()
+    with op.batch_alter_table("script_blob") as batch_op:
+        batch_op.alter_column("size", existing_type=sa.Integer(), nullable=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("script_blob") as batch_op:
+        batch_op.drop_column("size")
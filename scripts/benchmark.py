@@ -0,0 +1,1159 @@
+"""
+性能基准脚本
+
+使用方法:
+    python scripts/benchmark.py <场景> [参数]
+
+场景:
+    logsearch: 执行日志全文索引的索引耗时、索引大小与查询延迟
+    catalog: 脚本目录检索，对比 LIKE 与 FTS5 的查询延迟
+    dbconcurrency: 并发读写吞吐，对比 compat 与 production 两种 SQLite 方案
+    runstate: 执行状态写入吞吐，对比每次直接提交与单写线程批量提交
+    http: 启动 uvicorn，用大量并发连接压测 /api/scripts 与 /api/exec/{id}
+    login: 大量并发登录时的登录延迟、429 拒绝数，以及其他接口是否被拖慢
+    queries: 统计每个页面与接口请求的 SQL 语句数，超过上限（N+1）时返回非零
+    stats: 执行统计，对比扫描执行记录与读取每日汇总的延迟，并校验分位数误差
+    scheduler: 长短任务混合提交时，对比先进先出与按预测耗时调度的排队时间
+    versions: 脚本版本历史，对比每版保存全文与快照 + 增量的存储大小与读取延迟，
+              以及多个脚本使用相同内容时的存储增量
+    diff: 版本差异，对比 difflib 与大文件时使用的近线性算法的耗时，以及差异缓存的效果
+
+示例:
+    python scripts/benchmark.py logsearch --logs 100000 --lines 50
+    python scripts/benchmark.py catalog --scripts 50000
+    python scripts/benchmark.py dbconcurrency --writers 4 --readers 16
+    python scripts/benchmark.py runstate --workers 32
+    python scripts/benchmark.py http --clients 500
+    python scripts/benchmark.py login --clients 64 --rounds 12
+    python scripts/benchmark.py queries --max 5
+    python scripts/benchmark.py stats --records 1000000
+    python scripts/benchmark.py scheduler --workers 2
+    python scripts/benchmark.py versions --lines 3000 --versions 300
+    python scripts/benchmark.py diff --lines 50000
+    # 对比旧版本：git worktree add /tmp/old <commit> 后指定 --app-dir /tmp/old
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from sqlalchemy import create_engine, false, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app import diffing
+from app.database import SQLITE_PROFILES, create_db_engine, upgrade_database
+from app.auth import get_password_hash
+from app.exec_stats import rebuild_exec_stats, summarize
+from app.models import (
+    ScriptBlob,
+    ScriptCategory,
+    ScriptExecDaily,
+    ScriptExecRecord,
+    ScriptItem,
+    ScriptVersion,
+    User,
+)
+from app.scheduler import ExecScheduler
+from app.script_versions import (
+    add_version,
+    blob_cache,
+    content_hash,
+    diff_cache,
+    diff_versions,
+    get_latest_content,
+    get_version_content,
+)
+from app.writer import ExecStateWriter
+from app.search import (
+    index_log_lines,
+    rebuild_script_index,
+    script_rank_subquery,
+    search_exec_logs,
+)
+
+_WORDS = (
+    "deploy service restart config backup upload check disk memory "
+    "nginx mysql redis timeout retry ok done health status sync"
+).split()
+
+
+def _temp_engine(tmp_dir: str):
+    db_path = Path(tmp_dir) / "bench.db"
+    url = f"sqlite:///{db_path}"
+    upgrade_database(url)
+    return create_engine(url), db_path
+
+
+def _insert_versions(conn, versions) -> None:
+    """批量写入 (script_id, version, content)，内容一律保存为全文快照"""
+    blobs = {}
+    rows = []
+    for script_id, version, content in versions:
+        digest = content_hash(content)
+        blobs[digest] = {
+            "hash": digest,
+            "content": content,
+            "depth": 0,
+            "size": len(content.encode("utf-8")),
+        }
+        rows.append(
+            {"script_id": script_id, "version": version, "content_hash": digest}
+        )
+    conn.execute(ScriptBlob.__table__.insert(), list(blobs.values()))
+    conn.execute(ScriptVersion.__table__.insert(), rows)
+
+
+def _report(name: str, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(
+        f"{name}: p50={statistics.median(samples) * 1000:.2f}ms "
+        f"p95={p95 * 1000:.2f}ms n={len(samples)}"
+    )
+
+
+def bench_logsearch(args):
+    rnd = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine, db_path = _temp_engine(tmp_dir)
+        base_time = datetime.utcnow() - timedelta(days=30)
+
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            conn.execute(
+                ScriptExecRecord.__table__.insert(),
+                [
+                    {
+                        "id": i,
+                        "script_id": i % args.scripts + 1,
+                        "start_time": base_time + timedelta(seconds=i * 20),
+                        "status": "success",
+                    }
+                    for i in range(1, args.logs + 1)
+                ],
+            )
+            for i in range(1, args.logs + 1):
+                lines = [
+                    " ".join(rnd.choices(_WORDS, k=8)) + "\n"
+                    for _ in range(args.lines)
+                ]
+                if i % 1000 == 0:
+                    lines[rnd.randrange(args.lines)] = "Connection refused\n"
+                index_log_lines(conn, i, lines)
+        elapsed = time.perf_counter() - started
+        print(
+            f"索引 {args.logs} 份日志（每份 {args.lines} 行）: {elapsed:.1f}s, "
+            f"数据库大小 {db_path.stat().st_size / 1024 / 1024:.1f} MiB"
+        )
+
+        db = sessionmaker(bind=engine)()
+        for name, kwargs in (
+            ("罕见短语", {"keyword": "Connection refused"}),
+            ("常见词", {"keyword": "deploy"}),
+            ("按脚本过滤", {"keyword": "timeout", "script_id": 3}),
+            (
+                "按时间过滤",
+                {"keyword": "nginx", "start": base_time + timedelta(days=20)},
+            ),
+        ):
+            samples = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                search_exec_logs(db, **kwargs)
+                samples.append(time.perf_counter() - t0)
+            _report(name, samples)
+        db.close()
+        engine.dispose()
+
+
+def _fts_scripts(keyword: str):
+    """与 /api/scripts?keyword= 相同的检索：按相关度取第一页"""
+    ranked = script_rank_subquery(keyword)
+    if ranked is None:
+        return select(ScriptItem).where(false())
+    return (
+        select(ScriptItem)
+        .join(ranked, ranked.c.script_id == ScriptItem.id)
+        .order_by(ranked.c.rank, ScriptItem.id)
+        .limit(50)
+    )
+
+
+def bench_catalog(args):
+    rnd = random.Random(42)
+    # 内容词表：少量常见运维词 + 大量长尾标识符，接近真实脚本的词频分布
+    vocab = _WORDS + [f"var{i}" for i in range(5000)]
+    weights = [50] * len(_WORDS) + [1] * 5000
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine, db_path = _temp_engine(tmp_dir)
+        with engine.begin() as conn:
+            conn.execute(
+                ScriptItem.__table__.insert(),
+                [
+                    {
+                        "id": i,
+                        "title": " ".join(rnd.choices(_WORDS, k=3)) + f" {i}",
+                        "description": " ".join(rnd.choices(_WORDS, k=10)),
+                        "script_type": "shell",
+                        "script_path": f"s{i}.sh",
+                    }
+                    for i in range(1, args.scripts + 1)
+                ],
+            )
+            _insert_versions(
+                conn,
+                [
+                    (
+                        i,
+                        1,
+                        "\n".join(
+                            " ".join(rnd.choices(vocab, weights, k=6))
+                            for _ in range(args.lines)
+                        ),
+                    )
+                    for i in range(1, args.scripts + 1)
+                ],
+            )
+
+        db = sessionmaker(bind=engine)()
+        started = time.perf_counter()
+        rebuild_script_index(db, force=True)
+        print(
+            f"索引 {args.scripts} 个脚本: {time.perf_counter() - started:.1f}s, "
+            f"数据库大小 {db_path.stat().st_size / 1024 / 1024:.1f} MiB"
+        )
+
+        for keyword in ("nginx", "resta", "mysql backup", "var123", "12345"):
+            like_samples, fts_samples = [], []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                db.query(ScriptItem).filter(
+                    ScriptItem.title.like(f"%{keyword}%")
+                ).order_by(ScriptItem.update_time.desc()).all()
+                like_samples.append(time.perf_counter() - t0)
+
+                t0 = time.perf_counter()
+                db.scalars(_fts_scripts(keyword)).all()
+                fts_samples.append(time.perf_counter() - t0)
+            _report(f"LIKE  '{keyword}'", like_samples)
+            _report(f"FTS5  '{keyword}'", fts_samples)
+        db.close()
+        engine.dispose()
+
+
+def _run_concurrency(profile: str, args) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = Path(tmp_dir) / "bench.db"
+        url = f"sqlite:///{db_path}"
+        upgrade_database(url)
+        engine = create_db_engine(url, profile)
+        with engine.begin() as conn:
+            conn.execute(
+                ScriptExecRecord.__table__.insert(),
+                [
+                    {"id": i, "script_id": i % 50 + 1, "status": "running"}
+                    for i in range(1, args.records + 1)
+                ],
+            )
+
+        counts = {"write": 0, "read": 0, "locked": 0}
+        lock = threading.Lock()
+        stop = threading.Event()
+
+        def bump(key):
+            with lock:
+                counts[key] += 1
+
+        def writer(seed):
+            rnd = random.Random(seed)
+            while not stop.is_set():
+                try:
+                    with engine.begin() as conn:
+                        conn.execute(
+                            update(ScriptExecRecord)
+                            .where(
+                                ScriptExecRecord.id
+                                == rnd.randint(1, args.records)
+                            )
+                            .values(status="success", end_time=datetime.utcnow())
+                        )
+                    bump("write")
+                except OperationalError:
+                    bump("locked")
+
+        def reader(seed):
+            rnd = random.Random(seed)
+            while not stop.is_set():
+                try:
+                    with engine.connect() as conn:
+                        conn.execute(
+                            select(ScriptExecRecord)
+                            .where(ScriptExecRecord.script_id == rnd.randint(1, 50))
+                            .order_by(ScriptExecRecord.start_time.desc())
+                            .limit(10)
+                        ).all()
+                    bump("read")
+                except OperationalError:
+                    bump("locked")
+
+        threads = [
+            threading.Thread(target=writer, args=(i,)) for i in range(args.writers)
+        ] + [
+            threading.Thread(target=reader, args=(1000 + i,))
+            for i in range(args.readers)
+        ]
+        for t in threads:
+            t.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        engine.dispose()
+
+        print(
+            f"{profile:<10} 写 {counts['write'] / args.seconds:8.0f}/s  "
+            f"读 {counts['read'] / args.seconds:8.0f}/s  "
+            f"database is locked {counts['locked']} 次"
+        )
+
+
+def bench_dbconcurrency(args):
+    for profile in args.profiles or list(SQLITE_PROFILES):
+        _run_concurrency(profile, args)
+
+
+def _direct_run(Session, script_id: int) -> None:
+    """原实现：创建、写日志路径、写结束状态、刷新，各自提交"""
+    db = Session()
+    try:
+        record = ScriptExecRecord(script_id=script_id, status="running")
+        db.add(record)
+        db.commit()
+        db.refresh(record)
+        record.log_path = f"logs/{record.id}.log"
+        db.commit()
+        record.status = "success"
+        record.exit_code = 0
+        record.end_time = datetime.utcnow()
+        db.commit()
+        db.refresh(record)
+    finally:
+        db.close()
+
+
+def _writer_run(writer: ExecStateWriter, Session, script_id: int) -> None:
+    exec_id = writer.create(
+        script_id=script_id, status="running", start_time=datetime.utcnow()
+    ).result()
+    writer.update(exec_id, log_path=f"logs/{exec_id}.log")
+    writer.update(
+        exec_id, status="success", exit_code=0, end_time=datetime.utcnow()
+    ).result()
+    db = Session()
+    try:
+        db.get(ScriptExecRecord, exec_id)
+    finally:
+        db.close()
+
+
+def bench_runstate(args):
+    for mode in ("direct", "writer"):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            url = f"sqlite:///{Path(tmp_dir) / 'bench.db'}"
+            upgrade_database(url)
+            engine = create_db_engine(url, args.profile)
+            Session = sessionmaker(bind=engine)
+            writer = ExecStateWriter(Session)
+            done = [0]
+            errors = [0]
+            lock = threading.Lock()
+            stop = threading.Event()
+
+            def worker(n):
+                while not stop.is_set():
+                    try:
+                        if mode == "direct":
+                            _direct_run(Session, n % 50 + 1)
+                        else:
+                            _writer_run(writer, Session, n % 50 + 1)
+                        with lock:
+                            done[0] += 1
+                    except OperationalError:
+                        with lock:
+                            errors[0] += 1
+
+            threads = [
+                threading.Thread(target=worker, args=(i,))
+                for i in range(args.workers)
+            ]
+            for t in threads:
+                t.start()
+            time.sleep(args.seconds)
+            stop.set()
+            for t in threads:
+                t.join()
+            writer.stop()
+            engine.dispose()
+            print(
+                f"{mode:<7} {done[0] / args.seconds:8.0f} 次执行/s  "
+                f"database is locked {errors[0]} 次"
+            )
+
+
+def _seed_http_data(url: str, args) -> None:
+    engine = create_engine(url)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(
+            User.__table__.insert(),
+            [{"username": "bench", "hashed_password": get_password_hash("bench")}],
+        )
+        conn.execute(
+            ScriptItem.__table__.insert(),
+            [
+                {
+                    "id": i,
+                    "title": f"script {i}",
+                    "script_type": "shell",
+                    "script_path": f"bench_{i}.sh",
+                    "enabled": True,
+                    "is_dangerous": False,
+                    "create_time": now,
+                    "update_time": now - timedelta(seconds=i),
+                }
+                for i in range(1, args.scripts + 1)
+            ],
+        )
+        conn.execute(
+            ScriptExecRecord.__table__.insert(),
+            [
+                {
+                    "id": i,
+                    "script_id": i % args.scripts + 1,
+                    "start_time": now - timedelta(seconds=i),
+                    "end_time": now - timedelta(seconds=i) + timedelta(seconds=1),
+                    "status": "success",
+                    "exit_code": 0,
+                }
+                for i in range(1, args.execs + 1)
+            ],
+        )
+    engine.dispose()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _http_request(reader, writer, method: str, path: str, headers: str, body=b""):
+    """极简 HTTP/1.1 客户端（长连接），避免客户端本身成为瓶颈"""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: bench\r\n{headers}"
+        f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1")
+        + body
+    )
+    await writer.drain()
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("连接已关闭")
+    response_headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        response_headers.setdefault(name.strip().lower(), []).append(value.strip())
+    length = int(response_headers.get("content-length", ["0"])[0])
+    payload = await reader.readexactly(length)
+    return int(status_line.split()[1]), response_headers, payload
+
+
+async def _auth_header(port: int, auth: str) -> str:
+    """登录拿到 session cookie；auth 为 token 时再用它换一个 API 令牌"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        _, headers, _ = await _http_request(
+            reader,
+            writer,
+            "POST",
+            "/api/login",
+            "Content-Type: application/x-www-form-urlencoded\r\n",
+            b"username=bench&password=bench",
+        )
+    finally:
+        writer.close()
+    cookies = [c.split(";", 1)[0] for c in headers.get("set-cookie", [])]
+    if not cookies:
+        raise RuntimeError("登录失败，未拿到 session cookie")
+    cookie_header = f"Cookie: {'; '.join(cookies)}\r\n"
+    if auth == "session":
+        return cookie_header
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        status, _, payload = await _http_request(
+            reader,
+            writer,
+            "POST",
+            "/api/tokens",
+            cookie_header + "Content-Type: application/json\r\n",
+            json.dumps({"name": "benchmark"}).encode("utf-8"),
+        )
+    finally:
+        writer.close()
+    if status != 200:
+        raise RuntimeError(f"创建 API 令牌失败: {status}")
+    return f"Authorization: Bearer {json.loads(payload)['token']}\r\n"
+
+
+async def _http_load(port: int, headers: str, paths, clients: int, seconds: float):
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + seconds
+
+    async def client(seed):
+        nonlocal errors
+        rnd = random.Random(seed)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    status, _, _ = await _http_request(
+                        reader, writer, "GET", paths(rnd), headers
+                    )
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    errors += 1
+                    writer.close()
+                    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                    continue
+                if status == 200:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+        finally:
+            writer.close()
+
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    return latencies, errors
+
+
+@contextmanager
+def _uvicorn(app_dir: Path, url: str, **env_overrides):
+    """在子进程中启动被测应用，返回监听端口"""
+    port = _free_port()
+    # 访问日志默认关闭，避免压测输出被刷屏
+    env = {
+        **os.environ,
+        "OPS_ACCESS_LOG": "off",
+        "OPS_DATABASE_URL": url,
+        **env_overrides,
+    }
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--log-level", "warning", "--no-access-log",
+        ],
+        cwd=app_dir,
+        env=env,
+    )
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            raise RuntimeError("uvicorn 未能启动")
+        yield port
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def bench_http(args):
+    app_dir = Path(args.app_dir).resolve()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        url = f"sqlite:///{Path(tmp_dir) / 'bench.db'}"
+        upgrade_database(url)
+        _seed_http_data(url, args)
+
+        with _uvicorn(app_dir, url) as port:
+            headers = asyncio.run(_auth_header(port, args.auth))
+            scenarios = [
+                ("/api/scripts", lambda rnd: "/api/scripts?limit=50"),
+                (
+                    "/api/exec/{id}",
+                    lambda rnd: f"/api/exec/{rnd.randint(1, args.execs)}",
+                ),
+            ]
+            print(
+                f"{app_dir}: {args.clients} 并发连接，{args.auth} 认证，"
+                f"每项 {args.seconds:.0f}s"
+            )
+            for name, paths in scenarios:
+                latencies, errors = asyncio.run(
+                    _http_load(port, headers, paths, args.clients, args.seconds)
+                )
+                print(
+                    f"{name:<16} {len(latencies) / args.seconds:8.0f} req/s  "
+                    f"错误 {errors}"
+                )
+                if latencies:
+                    _report(f"{name:<16} 延迟", latencies)
+
+
+async def _login_contention(port: int, headers: str, args):
+    """登录风暴期间，同时测量登录延迟与普通接口延迟"""
+    deadline = time.monotonic() + args.seconds
+    login_latencies, probe_latencies = [], []
+    counts = {"ok": 0, "rejected": 0, "failed": 0}
+    body = b"username=bench&password=bench"
+    form = "Content-Type: application/x-www-form-urlencoded\r\n"
+
+    async def login_client():
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                status, response_headers, _ = await _http_request(
+                    reader, writer, "POST", "/api/login", form, body
+                )
+                if status == 303:
+                    counts["ok"] += 1
+                    login_latencies.append(time.perf_counter() - started)
+                elif status == 429:
+                    counts["rejected"] += 1
+                    retry_after = response_headers.get("retry-after", ["1"])[0]
+                    await asyncio.sleep(float(retry_after))
+                else:
+                    counts["failed"] += 1
+        finally:
+            writer.close()
+
+    async def probe_client(seed):
+        rnd = random.Random(seed)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                status, _, _ = await _http_request(
+                    reader, writer, "GET", f"/api/exec/{rnd.randint(1, args.execs)}",
+                    headers,
+                )
+                if status == 200:
+                    probe_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.01)
+        finally:
+            writer.close()
+
+    await asyncio.gather(
+        *(login_client() for _ in range(args.clients)),
+        *(probe_client(i) for i in range(args.probes)),
+    )
+    return login_latencies, probe_latencies, counts
+
+
+def bench_login(args):
+    app_dir = Path(args.app_dir).resolve()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        url = f"sqlite:///{Path(tmp_dir) / 'bench.db'}"
+        upgrade_database(url)
+        _seed_http_data(url, args)
+
+        with _uvicorn(
+            app_dir, url, OPS_BCRYPT_ROUNDS=str(args.rounds)
+        ) as port:
+            headers = asyncio.run(_auth_header(port, "token"))
+            logins, probes, counts = asyncio.run(
+                _login_contention(port, headers, args)
+            )
+        print(
+            f"{args.clients} 个并发登录 + {args.probes} 个普通请求，"
+            f"bcrypt rounds={args.rounds}，{args.seconds:.0f}s"
+        )
+        print(
+            f"登录成功 {counts['ok'] / args.seconds:.1f}/s  "
+            f"429 拒绝 {counts['rejected']}  其他失败 {counts['failed']}"
+        )
+        if logins:
+            _report("登录延迟", logins)
+        if probes:
+            _report("登录风暴期间 /api/exec/{id} 延迟", probes)
+
+
+QUERY_CHECK_ROUTES = [
+    "/",
+    "/manage/scripts",
+    "/scripts/1",
+    "/api/me",
+    "/api/categories",
+    "/api/scripts",
+    "/api/scripts?keyword=script",
+    "/api/scripts/1",
+    "/api/scripts/1/content",
+    "/api/scripts/1/versions",
+    "/api/scripts/1/versions/2",
+    "/api/scripts/1/diff?from=1&to=3",
+    "/api/scripts/1/execs",
+    "/api/exec/1",
+    "/api/exec/1/log",
+    "/api/logs/search?q=ok",
+    "/api/tokens",
+    "/api/scripts/1/stats",
+    "/api/stats/scripts",
+]
+
+
+def check_queries(args):
+    """逐个请求页面与接口，统计每个请求的 SQL 语句数，超过上限时返回非零"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        url = f"sqlite:///{Path(tmp_dir) / 'bench.db'}"
+        upgrade_database(url)
+        _seed_http_data(url, args)
+        engine = create_engine(url)
+        with engine.begin() as conn:
+            conn.execute(
+                ScriptCategory.__table__.insert(),
+                [{"id": i, "name": f"category {i}", "order": i} for i in range(1, 11)],
+            )
+            conn.execute(
+                update(ScriptItem).values(category_id=ScriptItem.id % 10 + 1)
+            )
+            _insert_versions(
+                conn,
+                [
+                    (s, v, f"echo {s} {v}")
+                    for s in range(1, args.scripts + 1)
+                    for v in range(1, 4)
+                ],
+            )
+        engine.dispose()
+
+        with _uvicorn(
+            Path(args.app_dir).resolve(),
+            url,
+            OPS_MAX_QUERIES_PER_REQUEST=str(args.max),
+            OPS_QUERY_GUARD_STRICT="1",
+        ) as port:
+            headers = asyncio.run(_auth_header(port, "session"))
+
+            async def fetch_all():
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                try:
+                    # 先请求一次，让用户缓存等进程级缓存就绪
+                    await _http_request(reader, writer, "GET", "/api/me", headers)
+                    results = []
+                    for path in QUERY_CHECK_ROUTES:
+                        status, response_headers, _ = await _http_request(
+                            reader, writer, "GET", path, headers
+                        )
+                        count = response_headers.get("x-sql-queries", ["?"])[0]
+                        results.append((path, status, count))
+                    return results
+                finally:
+                    writer.close()
+
+            results = asyncio.run(fetch_all())
+
+    failed = False
+    for path, status, count in results:
+        mark = "OK"
+        if status != 200:
+            mark = "超出上限" if status == 500 else f"HTTP {status}"
+            failed = True
+        print(f"{count:>3} 条 SQL  {path:<32} {mark}")
+    sys.exit(1 if failed else 0)
+
+
+def bench_stats(args):
+    rnd = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine, _ = _temp_engine(tmp_dir)
+        now = datetime.utcnow()
+        base_time = now - timedelta(days=args.days)
+        step = args.days * 86400 / args.records
+        with engine.begin() as conn:
+            conn.execute(
+                ScriptItem.__table__.insert(),
+                [
+                    {"id": i, "title": f"s{i}", "script_type": "shell", "script_path": "s"}
+                    for i in range(1, args.scripts + 1)
+                ],
+            )
+            batch = []
+            for i in range(1, args.records + 1):
+                start = base_time + timedelta(seconds=i * step)
+                batch.append(
+                    {
+                        "id": i,
+                        "script_id": i % args.scripts + 1,
+                        "start_time": start,
+                        "end_time": start
+                        + timedelta(seconds=rnd.lognormvariate(1, 1.2)),
+                        "status": "success" if rnd.random() < 0.9 else "fail",
+                    }
+                )
+                if len(batch) >= 10000:
+                    conn.execute(ScriptExecRecord.__table__.insert(), batch)
+                    batch = []
+            if batch:
+                conn.execute(ScriptExecRecord.__table__.insert(), batch)
+
+        db = sessionmaker(bind=engine)()
+        started = time.perf_counter()
+        rebuild_exec_stats(db)
+        db.commit()
+        print(
+            f"由 {args.records} 条执行记录补建汇总: "
+            f"{time.perf_counter() - started:.1f}s"
+        )
+
+        window_start = (now - timedelta(days=args.window - 1)).date()
+        scan_samples, rollup_samples = [], []
+        for _ in range(args.repeat):
+            script_id = rnd.randint(1, args.scripts)
+            t0 = time.perf_counter()
+            rows = db.execute(
+                select(
+                    ScriptExecRecord.start_time,
+                    ScriptExecRecord.end_time,
+                    ScriptExecRecord.status,
+                ).where(
+                    ScriptExecRecord.script_id == script_id,
+                    ScriptExecRecord.start_time
+                    >= datetime.combine(window_start, datetime.min.time()),
+                )
+            ).all()
+            durations = sorted(
+                (row.end_time - row.start_time).total_seconds() for row in rows
+            )
+            exact = {
+                "runs": len(rows),
+                "p50": durations[int(0.5 * (len(durations) - 1))],
+                "p95": durations[int(0.95 * (len(durations) - 1))],
+            }
+            scan_samples.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            summary = summarize(
+                db.scalars(
+                    select(ScriptExecDaily).where(
+                        ScriptExecDaily.script_id == script_id,
+                        ScriptExecDaily.day >= window_start,
+                    )
+                ).all()
+            )
+            rollup_samples.append(time.perf_counter() - t0)
+            assert summary["runs"] == exact["runs"], (summary, exact)
+            for q in ("p50", "p95"):
+                error = abs(summary[f"{q}_seconds"] - exact[q]) / exact[q]
+                if error > 0.011:
+                    print(f"警告：脚本 {script_id} {q} 相对误差 {error:.3%}")
+        _report(f"扫描执行记录（{args.window} 天）", scan_samples)
+        _report(f"读取每日汇总（{args.window} 天）", rollup_samples)
+        db.close()
+        engine.dispose()
+
+
+def bench_scheduler(args):
+    """用 sleep 代替真实脚本，长任务先提交、短任务随后陆续到达"""
+    durations = {1: args.long_seconds, 2: args.short_seconds}
+    for mode, predictor in (
+        # 预测值都相同时优先级只取决于入队时间，即先进先出
+        ("fifo", lambda script_id: 1.0),
+        ("predicted", durations.get),
+    ):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            engine, _ = _temp_engine(tmp_dir)
+            Session = sessionmaker(bind=engine)
+            # 调度器在任务开始时按 id 读取脚本
+            with Session() as db:
+                db.add_all(
+                    ScriptItem(
+                        id=i, title=f"s{i}", script_type="shell", script_path=f"s{i}.sh"
+                    )
+                    for i in durations
+                )
+                db.commit()
+            writer = ExecStateWriter(Session)
+            submitted = {}
+            waits = {1: [], 2: []}
+
+            def fake_run(script, params_json, operator, writer, exec_id):
+                waits[script.id].append(time.monotonic() - submitted[exec_id])
+                time.sleep(durations[script.id])
+                writer.update(exec_id, status="success")
+                return exec_id
+
+            scheduler = ExecScheduler(
+                workers=args.workers,
+                session_factory=Session,
+                writer=writer,
+                runner=fake_run,
+                predictor=predictor,
+            )
+            for _ in range(args.long_jobs):
+                t0 = time.monotonic()
+                submitted[scheduler.submit(1, None, None)] = t0
+            for _ in range(args.short_jobs):
+                t0 = time.monotonic()
+                submitted[scheduler.submit(2, None, None)] = t0
+                time.sleep(args.short_seconds)
+            while sum(len(w) for w in waits.values()) < len(submitted):
+                time.sleep(0.05)
+            time.sleep(args.long_seconds)
+            scheduler.stop()
+            writer.stop()
+            engine.dispose()
+            _report(f"{mode:<9} 短任务排队", waits[2])
+            _report(f"{mode:<9} 长任务排队", waits[1])
+
+
+def bench_versions(args):
+    rnd = random.Random(42)
+    lines = [" ".join(rnd.choices(_WORDS, k=8)) + "\n" for _ in range(args.lines)]
+    texts = ["".join(lines)]
+    for v in range(1, args.versions):
+        for _ in range(args.edits):
+            lines[rnd.randrange(len(lines))] = " ".join(rnd.choices(_WORDS, k=8)) + "\n"
+        texts.append("".join(lines))
+
+    # 快照间隔为 0 即每个版本都保存全文（改动前的存储方式）
+    for mode, interval in (("全文", 0), ("快照+增量", args.interval)):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            engine, db_path = _temp_engine(tmp_dir)
+            Session = sessionmaker(bind=engine)
+            db = Session()
+            db.add(
+                ScriptItem(id=1, title="deploy", script_type="shell", script_path="d.sh")
+            )
+            save_samples = []
+            for v, text in enumerate(texts, 1):
+                t0 = time.perf_counter()
+                add_version(db, 1, v, text, snapshot_interval=interval)
+                db.commit()
+                save_samples.append(time.perf_counter() - t0)
+            db.close()
+            with engine.connect() as conn:
+                conn.exec_driver_sql("VACUUM")
+            size = db_path.stat().st_size / 1024 / 1024
+            print(f"{mode}: {args.versions} 个版本，数据库 {size:.1f} MiB")
+            _report(f"{mode} 保存新版本", save_samples)
+
+            db = Session()
+            latest_samples, cold_samples, old_samples = [], [], []
+            for _ in range(args.repeat):
+                blob_cache.clear()
+                t0 = time.perf_counter()
+                _, _, content = get_latest_content(db, 1)
+                cold_samples.append(time.perf_counter() - t0)
+                assert content == texts[-1]
+                t0 = time.perf_counter()
+                get_latest_content(db, 1)
+                latest_samples.append(time.perf_counter() - t0)
+                v = rnd.randint(1, args.versions)
+                blob_cache.clear()
+                t0 = time.perf_counter()
+                assert get_version_content(db, 1, v) == texts[v - 1]
+                old_samples.append(time.perf_counter() - t0)
+            _report(f"{mode} 读取最新版本（未缓存）", cold_samples)
+            _report(f"{mode} 读取最新版本（已缓存）", latest_samples)
+            _report(f"{mode} 读取任意历史版本（未缓存）", old_samples)
+
+            # 其他脚本保存完全相同的内容时只新增版本行，不再保存正文
+            for i in range(2, args.copies + 2):
+                db.add(
+                    ScriptItem(
+                        id=i, title=f"copy {i}", script_type="shell", script_path="c.sh"
+                    )
+                )
+                add_version(db, i, 1, texts[-1], snapshot_interval=interval)
+            db.commit()
+            db.close()
+            with engine.connect() as conn:
+                conn.exec_driver_sql("VACUUM")
+            grown = db_path.stat().st_size / 1024 / 1024 - size
+            print(
+                f"{mode}: 另有 {args.copies} 个脚本使用相同内容，"
+                f"数据库增加 {grown:.2f} MiB"
+            )
+            engine.dispose()
+            blob_cache.clear()
+
+
+def bench_diff(args):
+    rnd = random.Random(42)
+    # 脚本里常见大量重复行（空行、括号、fi/done），是 difflib 的不利情形
+    common = ["\n", "}\n", "fi\n", "done\n"]
+    lines = [
+        rnd.choice(common)
+        if rnd.random() < 0.3
+        else " ".join(rnd.choices(_WORDS, k=6)) + "\n"
+        for _ in range(args.lines)
+    ]
+    base = "".join(lines)
+    for _ in range(args.edits):
+        pos = rnd.randrange(len(lines))
+        if rnd.random() < 0.5:
+            lines[pos] = " ".join(rnd.choices(_WORDS, k=6)) + "\n"
+        else:
+            lines.insert(pos, rnd.choice(common))
+    target = "".join(lines)
+    a, b = diffing.split_lines(base), diffing.split_lines(target)
+
+    default_threshold = diffing.DIFF_LINEAR_LINES
+    for name, threshold in (("difflib", 10**9), ("近线性", 0)):
+        diffing.DIFF_LINEAR_LINES = threshold
+        samples = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            opcodes = diffing.line_opcodes(a, b)
+            samples.append(time.perf_counter() - t0)
+        changed = sum(
+            i2 - i1 + j2 - j1 for tag, i1, i2, j1, j2 in opcodes if tag != "equal"
+        )
+        assert diffing.apply_delta(base, diffing.make_delta(base, target)) == target
+        _report(f"{name} {args.lines} 行（差异 {changed} 行）", samples)
+    diffing.DIFF_LINEAR_LINES = default_threshold
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine, _ = _temp_engine(tmp_dir)
+        db = sessionmaker(bind=engine)()
+        db.add(
+            ScriptItem(id=1, title="deploy", script_type="shell", script_path="d.sh")
+        )
+        add_version(db, 1, 1, base)
+        add_version(db, 1, 2, target)
+        db.commit()
+        cold, cached = [], []
+        for _ in range(args.repeat):
+            diff_cache.clear()
+            t0 = time.perf_counter()
+            diff_versions(db, 1, 1, 2)
+            cold.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            diff_versions(db, 1, 1, 2)
+            cached.append(time.perf_counter() - t0)
+        _report("版本差异（未缓存）", cold)
+        _report("版本差异（已缓存）", cached)
+        db.close()
+        engine.dispose()
+        diff_cache.clear()
+        blob_cache.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OPStool 性能基准")
+    sub = parser.add_subparsers(dest="scenario", required=True)
+
+    p = sub.add_parser("logsearch", help="执行日志全文检索")
+    p.add_argument("--logs", type=int, default=100000)
+    p.add_argument("--lines", type=int, default=50)
+    p.add_argument("--scripts", type=int, default=200)
+    p.add_argument("--repeat", type=int, default=20)
+    p.set_defaults(func=bench_logsearch)
+
+    p = sub.add_parser("catalog", help="脚本目录检索")
+    p.add_argument("--scripts", type=int, default=50000)
+    p.add_argument("--lines", type=int, default=40)
+    p.add_argument("--repeat", type=int, default=20)
+    p.set_defaults(func=bench_catalog)
+
+    p = sub.add_parser("dbconcurrency", help="SQLite 并发读写吞吐")
+    p.add_argument("--writers", type=int, default=4)
+    p.add_argument("--readers", type=int, default=16)
+    p.add_argument("--records", type=int, default=5000)
+    p.add_argument("--seconds", type=float, default=10)
+    p.add_argument("--profiles", nargs="*", choices=list(SQLITE_PROFILES))
+    p.set_defaults(func=bench_dbconcurrency)
+
+    p = sub.add_parser("runstate", help="执行状态写入吞吐")
+    p.add_argument("--workers", type=int, default=32)
+    p.add_argument("--seconds", type=float, default=10)
+    p.add_argument("--profile", default="production", choices=list(SQLITE_PROFILES))
+    p.set_defaults(func=bench_runstate)
+
+    p = sub.add_parser("http", help="HTTP 接口并发吞吐")
+    p.add_argument("--clients", type=int, default=500)
+    p.add_argument("--seconds", type=float, default=15)
+    p.add_argument("--scripts", type=int, default=2000)
+    p.add_argument("--execs", type=int, default=50000)
+    p.add_argument("--app-dir", default=str(project_root), help="被测代码所在目录")
+    p.add_argument("--auth", default="session", choices=["session", "token"])
+    p.set_defaults(func=bench_http)
+
+    p = sub.add_parser("login", help="登录风暴下的登录延迟与接口延迟")
+    p.add_argument("--clients", type=int, default=64)
+    p.add_argument("--probes", type=int, default=8)
+    p.add_argument("--seconds", type=float, default=15)
+    p.add_argument("--rounds", type=int, default=12)
+    p.add_argument("--scripts", type=int, default=100)
+    p.add_argument("--execs", type=int, default=1000)
+    p.add_argument("--app-dir", default=str(project_root), help="被测代码所在目录")
+    p.set_defaults(func=bench_login)
+
+    p = sub.add_parser("queries", help="每个请求的 SQL 语句数检查（N+1）")
+    p.add_argument("--max", type=int, default=5, help="单个请求允许的 SQL 语句数")
+    p.add_argument("--scripts", type=int, default=50)
+    p.add_argument("--execs", type=int, default=500)
+    p.add_argument("--app-dir", default=str(project_root), help="被测代码所在目录")
+    p.set_defaults(func=check_queries)
+
+    p = sub.add_parser("stats", help="执行统计：扫描执行记录与每日汇总")
+    p.add_argument("--records", type=int, default=1000000)
+    p.add_argument("--scripts", type=int, default=50)
+    p.add_argument("--days", type=int, default=365)
+    p.add_argument("--window", type=int, default=30)
+    p.add_argument("--repeat", type=int, default=20)
+    p.set_defaults(func=bench_stats)
+
+    p = sub.add_parser("scheduler", help="执行调度：先进先出与按预测耗时")
+    p.add_argument("--workers", type=int, default=2)
+    p.add_argument("--long-jobs", type=int, default=4)
+    p.add_argument("--long-seconds", type=float, default=3.0)
+    p.add_argument("--short-jobs", type=int, default=40)
+    p.add_argument("--short-seconds", type=float, default=0.05)
+    p.set_defaults(func=bench_scheduler)
+
+    p = sub.add_parser("versions", help="脚本版本历史的存储与读取")
+    p.add_argument("--lines", type=int, default=3000)
+    p.add_argument("--versions", type=int, default=300)
+    p.add_argument("--edits", type=int, default=5, help="每个版本改动的行数")
+    p.add_argument("--interval", type=int, default=20, help="快照间隔")
+    p.add_argument("--copies", type=int, default=100, help="复用最新内容的脚本数")
+    p.add_argument("--repeat", type=int, default=50)
+    p.set_defaults(func=bench_versions)
+
+    p = sub.add_parser("diff", help="版本差异计算")
+    p.add_argument("--lines", type=int, default=50000)
+    p.add_argument("--edits", type=int, default=200)
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_diff)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,26 +3,41 @@
 
 使用方法:
     python scripts/create_admin.py <username> <password> [--update]
+    python scripts/create_admin.py --file <users.csv|users.jsonl> [--update] [--dry-run] [--workers N]
 
 参数:
     username: 用户名
     password: 密码
     --update: 可选，如果用户已存在则更新密码
+    --file: 批量模式，从 CSV（表头 username,password[,is_active]）或 JSONL
+            （每行一个对象，字段同 CSV）读取用户，多进程并行哈希密码，
+            在一个事务中写入，并逐行输出结果
+    --dry-run: 批量模式下只检查并输出将要执行的操作，不写数据库
+    --workers: 批量模式下哈希密码的进程数，默认为 CPU 核数
 
 示例:
     python scripts/create_admin.py admin mypassword123
     python scripts/create_admin.py admin newpassword123 --update
+    python scripts/create_admin.py --file users.csv --dry-run
+    python scripts/create_admin.py --file users.jsonl --update
 """
+import argparse
+import csv
+import json
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 # 添加项目根目录到 Python 路径
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
-from app.database import SessionLocal
+from sqlalchemy import select
+
+from app.database import SessionLocal, upgrade_database
 from app.models import User
 from app.auth import get_password_hash
+from app.user_cache import bump_auth_stamp
 
 
 def create_or_update_admin_user(username: str, password: str, update_if_exists: bool = False):
@@ -43,6 +58,8 @@ def create_or_update_admin_user(username: str, password: str, update_if_exists:
             hashed_password = get_password_hash(password)
             existing_user.hashed_password = hashed_password
             existing_user.is_active = True
+            # 通知运行中的服务清空用户缓存
+            bump_auth_stamp(db)
             db.commit()
             db.refresh(existing_user)
             
@@ -72,21 +89,192 @@ def create_or_update_admin_user(username: str, password: str, update_if_exists:
         db.close()
 
 
+# 批量模式每行的处理结果
+CREATE, UPDATE, SKIP, ERROR = "创建", "更新", "跳过", "错误"
+
+
+def _parse_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ("1", "true", "yes", "y", "是"):
+        return True
+    if text in ("0", "false", "no", "n", "否"):
+        return False
+    raise ValueError(f"无法识别的 is_active 值: {value}")
+
+
+def read_user_rows(path: Path):
+    """读取 CSV 或 JSONL，返回 [(行号, 字段字典)]"""
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if path.suffix.lower() == ".csv":
+            # 第 1 行是表头，数据从第 2 行开始
+            return list(enumerate(csv.DictReader(f), start=2))
+        rows = []
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                rows.append((line_no, json.loads(line)))
+            except json.JSONDecodeError as e:
+                rows.append((line_no, {"_error": f"JSON 解析失败: {e}"}))
+        return rows
+
+
+def plan_bulk_users(db, rows, update_if_exists: bool):
+    """确定每行要执行的操作，返回 [{line, username, action, message, ...}]"""
+    plans = []
+    seen = set()
+    for line_no, row in rows:
+        plan = {"line": line_no, "username": "", "action": ERROR, "message": ""}
+        plans.append(plan)
+        if not isinstance(row, dict):
+            plan["message"] = "格式错误，应为对象"
+            continue
+        if "_error" in row:
+            plan["message"] = row["_error"]
+            continue
+        username = str(row.get("username") or "").strip()
+        password = str(row.get("password") or "")
+        plan["username"] = username
+        if not username or not password:
+            plan["message"] = "用户名和密码不能为空"
+            continue
+        if username in seen:
+            plan["message"] = "文件中用户名重复"
+            continue
+        seen.add(username)
+        try:
+            is_active = _parse_bool(row.get("is_active", True))
+        except ValueError as e:
+            plan["message"] = str(e)
+            continue
+        plan.update(action=CREATE, password=password, is_active=is_active)
+        if len(password) < 6:
+            plan["message"] = "警告: 密码长度建议至少6位"
+
+    # 一次查询取出文件中已存在的用户
+    usernames = [p["username"] for p in plans if p["action"] == CREATE]
+    existing = {}
+    for i in range(0, len(usernames), 500):
+        for user in db.scalars(
+            select(User).where(User.username.in_(usernames[i:i + 500]))
+        ):
+            existing[user.username] = user
+    for plan in plans:
+        if plan["action"] != CREATE or plan["username"] not in existing:
+            continue
+        if update_if_exists:
+            plan["action"] = UPDATE
+            plan["user"] = existing[plan["username"]]
+        else:
+            plan["action"] = SKIP
+            plan["message"] = "用户已存在（使用 --update 更新）"
+    return plans
+
+
+def bulk_create_or_update_users(
+    path: Path,
+    update_if_exists: bool = False,
+    dry_run: bool = False,
+    workers=None,
+) -> bool:
+    """批量创建或更新用户，在一个事务中写入；有错误行时不写入并返回 False"""
+    db = SessionLocal()
+    try:
+        plans = plan_bulk_users(db, read_user_rows(path), update_if_exists)
+        todo = [p for p in plans if p["action"] in (CREATE, UPDATE)]
+        # 全部成功或全部不写：有错误行时不写入，修正文件后可直接重跑
+        has_errors = any(p["action"] == ERROR for p in plans)
+
+        if todo and not dry_run and not has_errors:
+            # bcrypt 是 CPU 密集操作，分散到多个进程
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                hashes = list(
+                    pool.map(
+                        get_password_hash,
+                        [p["password"] for p in todo],
+                        chunksize=max(1, len(todo) // 64),
+                    )
+                )
+            for plan, hashed_password in zip(todo, hashes):
+                if plan["action"] == CREATE:
+                    db.add(
+                        User(
+                            username=plan["username"],
+                            hashed_password=hashed_password,
+                            is_active=plan["is_active"],
+                        )
+                    )
+                else:
+                    plan["user"].hashed_password = hashed_password
+                    plan["user"].is_active = plan["is_active"]
+            if any(p["action"] == UPDATE for p in todo):
+                # 通知运行中的服务清空用户缓存
+                bump_auth_stamp(db)
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"操作失败，所有更改已回滚: {e}")
+        return False
+    finally:
+        db.close()
+
+    prefix = "[dry-run] " if dry_run else ""
+    if has_errors and not dry_run:
+        prefix = "[未写入] "
+    for plan in plans:
+        message = f" - {plan['message']}" if plan["message"] else ""
+        print(f"{prefix}第 {plan['line']} 行 {plan['username'] or '-'}: {plan['action']}{message}")
+
+    counts = {action: 0 for action in (CREATE, UPDATE, SKIP, ERROR)}
+    for plan in plans:
+        counts[plan["action"]] += 1
+    print(
+        f"{prefix}共 {len(plans)} 行：创建 {counts[CREATE]}，更新 {counts[UPDATE]}，"
+        f"跳过 {counts[SKIP]}，错误 {counts[ERROR]}"
+    )
+    if has_errors and not dry_run:
+        print("存在错误行，未写入任何用户，请修正后重新执行")
+    return counts[ERROR] == 0
+
+
 if __name__ == "__main__":
-    if len(sys.argv) < 3 or len(sys.argv) > 4:
+    parser = argparse.ArgumentParser(
+        description="创建或更新管理员用户",
+        epilog="示例: python scripts/create_admin.py admin mypassword123",
+    )
+    parser.add_argument("username", nargs="?")
+    parser.add_argument("password", nargs="?")
+    parser.add_argument("--update", "-u", action="store_true", help="用户已存在时更新密码")
+    parser.add_argument("--file", type=Path, help="批量模式：CSV 或 JSONL 用户文件")
+    parser.add_argument("--dry-run", action="store_true", help="批量模式：只检查不写入")
+    parser.add_argument("--workers", type=int, help="批量模式：哈希密码的进程数")
+    args = parser.parse_args()
+
+    if args.file:
+        if args.username or args.password:
+            parser.error("--file 与 <username> <password> 不能同时使用")
+        if not args.file.exists():
+            print(f"错误: 文件不存在 {args.file}")
+            sys.exit(1)
+        upgrade_database()
+        success = bulk_create_or_update_users(
+            args.file, args.update, dry_run=args.dry_run, workers=args.workers
+        )
+        sys.exit(0 if success else 1)
+
+    if not args.username or not args.password:
         print("使用方法: python scripts/create_admin.py <username> <password> [--update]")
         print("示例:")
         print("  创建用户: python scripts/create_admin.py admin mypassword123")
         print("  更新密码: python scripts/create_admin.py admin newpassword123 --update")
+        print("  批量导入: python scripts/create_admin.py --file users.csv [--dry-run]")
         sys.exit(1)
     
-    username = sys.argv[1]
-    password = sys.argv[2]
-    update_if_exists = "--update" in sys.argv or "-u" in sys.argv
-    
-    if not username or not password:
-        print("错误: 用户名和密码不能为空")
-        sys.exit(1)
+    username = args.username
+    password = args.password
+    update_if_exists = args.update
     
     if len(password) < 6:
         print("警告: 密码长度建议至少6位")
@@ -94,5 +282,6 @@ if __name__ == "__main__":
         if response.lower() != 'y':
             sys.exit(1)
     
+    upgrade_database()
     success = create_or_update_admin_user(username, password, update_if_exists)
     sys.exit(0 if success else 1)
@@ -0,0 +1,240 @@
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+# 应用在导入时读取配置，须在导入 app 之前指向临时数据库
+_tmp_dir = tempfile.mkdtemp(prefix="opstool-test-")
+os.environ.setdefault("OPS_DATABASE_URL", f"sqlite:///{Path(_tmp_dir) / 'test.db'}")
+os.environ.setdefault("OPS_ACCESS_LOG", "off")
+# 测试里的密码哈希用最低代价，避免 bcrypt 拖慢测试
+os.environ.setdefault("OPS_BCRYPT_ROUNDS", "4")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import create_engine, event  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app import sql_stats  # noqa: E402
+from app.auth import get_password_hash  # noqa: E402
+from app.database import upgrade_database  # noqa: E402
+from app.models import (  # noqa: E402
+    ScriptBlob,
+    ScriptCategory,
+    ScriptExecRecord,
+    ScriptItem,
+    ScriptVersion,
+    User,
+)
+from app.script_versions import content_hash  # noqa: E402
+from app.writer import ExecStateWriter  # noqa: E402
+
+TEST_USER = "tester"
+TEST_PASSWORD = "tester-password"
+
+
+@pytest.fixture
+def migrated_engine(tmp_path):
+    """迁移到最新版本的临时 SQLite 数据库"""
+    url = f"sqlite:///{tmp_path / 'migrated.db'}"
+    upgrade_database(url)
+    engine = create_engine(url)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(migrated_engine):
+    return sessionmaker(bind=migrated_engine)
+
+
+@pytest.fixture
+def writer(session_factory):
+    """指向临时数据库的执行状态写线程，批次间隔缩短以加快测试"""
+    writer = ExecStateWriter(session_factory, flush_interval=0.005)
+    yield writer
+    writer.stop(timeout=10)
+
+
+@pytest.fixture(scope="session")
+def web_app():
+    """应用实例（整个测试会话共用 OPS_DATABASE_URL 指向的临时数据库）"""
+    with pytest.MonkeyPatch.context() as mp:
+        # 模板与静态文件目录相对于项目根目录
+        mp.chdir(project_root)
+        from app.database import engine
+        from app.main import app
+
+        with engine.begin() as conn:
+            conn.execute(
+                User.__table__.insert(),
+                [
+                    {
+                        "username": TEST_USER,
+                        "hashed_password": get_password_hash(TEST_PASSWORD),
+                    }
+                ],
+            )
+        yield app
+
+
+def login(client: TestClient, username: str = TEST_USER, password: str = TEST_PASSWORD):
+    return client.post(
+        "/api/login",
+        data={"username": username, "password": password},
+        follow_redirects=False,
+    )
+
+
+@pytest.fixture(scope="session")
+def client(web_app):
+    """以 TEST_USER 登录的客户端"""
+    with TestClient(web_app) as test_client:
+        assert login(test_client).status_code == 303
+        yield test_client
+
+
+# 路由巡检：单个请求允许的 SQL 语句数，与 scripts/benchmark.py queries 的默认值一致
+SWEEP_MAX_QUERIES = 5
+SWEEP_SCRIPTS = 30
+# 巡检数据的 id 起点，避开其他测试通过接口创建的脚本
+SWEEP_BASE = 1000
+SWEEP_ROUTES = [
+    "/",
+    "/manage/scripts",
+    "/scripts/{script}",
+    "/api/me",
+    "/api/categories",
+    "/api/scripts",
+    "/api/scripts?keyword=script",
+    "/api/scripts/{script}",
+    "/api/scripts/{script}/content",
+    "/api/scripts/{script}/versions",
+    "/api/scripts/{script}/versions/2",
+    "/api/scripts/{script}/diff?from=1&to=3",
+    "/api/scripts/{script}/execs",
+    "/api/exec/{exec}",
+    "/api/exec/{exec}/log",
+    "/api/logs/search?q=ok",
+    "/api/tokens",
+    "/api/scripts/{script}/stats",
+    "/api/stats/scripts",
+]
+
+
+def sweep_path(route: str) -> str:
+    return route.format(script=SWEEP_BASE + 1, exec=SWEEP_BASE + 1)
+
+
+def _seed_sweep(engine) -> None:
+    now = datetime.utcnow()
+    scripts = range(SWEEP_BASE + 1, SWEEP_BASE + SWEEP_SCRIPTS + 1)
+    contents = {(s, v): f"echo {s} {v}\n" for s in scripts for v in range(1, 4)}
+    with engine.begin() as conn:
+        conn.execute(
+            ScriptCategory.__table__.insert(),
+            [
+                {"id": SWEEP_BASE + i, "name": f"category {i}", "order": i}
+                for i in range(1, 6)
+            ],
+        )
+        conn.execute(
+            ScriptItem.__table__.insert(),
+            [
+                {
+                    "id": s,
+                    "category_id": SWEEP_BASE + s % 5 + 1,
+                    "title": f"script {s}",
+                    "script_type": "shell",
+                    "script_path": f"test_{s}.sh",
+                    "enabled": True,
+                    "update_time": now - timedelta(seconds=s - SWEEP_BASE),
+                }
+                for s in scripts
+            ],
+        )
+        conn.execute(
+            ScriptBlob.__table__.insert(),
+            [
+                {
+                    "hash": content_hash(c),
+                    "content": c,
+                    "depth": 0,
+                    "size": len(c.encode("utf-8")),
+                }
+                for c in contents.values()
+            ],
+        )
+        conn.execute(
+            ScriptVersion.__table__.insert(),
+            [
+                {"script_id": s, "version": v, "content_hash": content_hash(c)}
+                for (s, v), c in contents.items()
+            ],
+        )
+        conn.execute(
+            ScriptExecRecord.__table__.insert(),
+            [
+                {
+                    "id": SWEEP_BASE + i,
+                    "script_id": SWEEP_BASE + i % SWEEP_SCRIPTS + 1,
+                    "start_time": now - timedelta(seconds=i),
+                    "end_time": now - timedelta(seconds=i) + timedelta(seconds=1),
+                    "status": "success",
+                    "exit_code": 0,
+                }
+                for i in range(1, 101)
+            ],
+        )
+
+
+@pytest.fixture(scope="session")
+def route_sweep(client):
+    """开启严格的 SQL 语句数守卫逐个请求 SWEEP_ROUTES
+
+    返回 {路由: (响应, [(SQL, 参数), ...])}，SQL 为该请求实际执行的语句，
+    供语句数与执行计划检查共用。
+    """
+    from app.database import async_engine, async_read_engine, engine
+
+    _seed_sweep(engine)
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            captured.append((statement, parameters))
+
+    engines = {async_engine.sync_engine, async_read_engine.sync_engine}
+    for target in engines:
+        event.listen(target, "before_cursor_execute", capture)
+    results = {}
+    try:
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr(sql_stats, "MAX_QUERIES_PER_REQUEST", SWEEP_MAX_QUERIES)
+            mp.setattr(sql_stats, "QUERY_GUARD_STRICT", True)
+            # 先请求一次，让用户缓存等进程级缓存就绪
+            assert client.get("/api/me").status_code == 200
+            for route in SWEEP_ROUTES:
+                captured.clear()
+                response = client.get(sweep_path(route))
+                results[route] = (response, list(captured))
+    finally:
+        for target in engines:
+            event.remove(target, "before_cursor_execute", capture)
+    return results
+
+
+def create_script(client: TestClient, script_path: Path, **fields) -> dict:
+    """通过接口创建脚本，script_path 用绝对路径，不写入仓库的 scripts 目录"""
+    payload = {"title": script_path.stem, "script_type": "shell", **fields}
+    response = client.post(
+        "/api/scripts", json={**payload, "script_path": str(script_path)}
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
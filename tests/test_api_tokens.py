@@ -0,0 +1,42 @@
+from fastapi.testclient import TestClient
+
+from conftest import TEST_USER
+
+
+def _bearer(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_token_authenticates_without_session(client, web_app):
+    created = client.post("/api/tokens", json={"name": "ci"}).json()
+    assert created["token"].startswith(created["token_prefix"])
+
+    # 不带会话 Cookie 的客户端，不触发应用启动事件
+    anonymous = TestClient(web_app)
+    assert anonymous.get("/api/me").status_code == 401
+    response = anonymous.get("/api/me", headers=_bearer(created["token"]))
+    assert response.status_code == 200
+    assert response.json()["username"] == TEST_USER
+
+    listed = client.get("/api/tokens").json()
+    assert [t["id"] for t in listed if t["name"] == "ci"] == [created["id"]]
+    assert all("token" not in t for t in listed)
+
+
+def test_revoked_token_is_rejected(client, web_app):
+    created = client.post("/api/tokens", json={"name": "revoked"}).json()
+    anonymous = TestClient(web_app)
+    headers = _bearer(created["token"])
+    # 先请求一次，令牌进入缓存
+    assert anonymous.get("/api/me", headers=headers).status_code == 200
+
+    assert client.delete(f"/api/tokens/{created['id']}").json() == {"ok": True}
+    assert anonymous.get("/api/me", headers=headers).status_code == 401
+    assert client.delete(f"/api/tokens/{created['id']}").status_code == 404
+
+
+def test_unknown_token_is_rejected(client):
+    # 令牌优先于会话：即使已登录，错误的令牌也返回 401
+    response = client.get("/api/me", headers=_bearer("ops_not_a_real_token"))
+    assert response.status_code == 401
+    assert client.get("/api/me").status_code == 200
@@ -0,0 +1,142 @@
+import json
+
+import pytest
+from sqlalchemy import select
+
+from app.auth import get_password_hash, verify_password
+from app.models import AuthStamp, User
+from scripts import create_admin
+from scripts.create_admin import (
+    CREATE,
+    ERROR,
+    SKIP,
+    UPDATE,
+    bulk_create_or_update_users,
+    plan_bulk_users,
+    read_user_rows,
+)
+
+
+@pytest.fixture
+def db(session_factory, monkeypatch):
+    monkeypatch.setattr(create_admin, "SessionLocal", session_factory)
+    with session_factory() as db:
+        db.add(User(username="existing", hashed_password=get_password_hash("old-pass")))
+        db.commit()
+        yield db
+
+
+def _users(db) -> dict:
+    db.expire_all()
+    return {u.username: u for u in db.scalars(select(User))}
+
+
+def _stamp(db) -> int:
+    return db.scalar(select(AuthStamp.version).where(AuthStamp.id == 1))
+
+
+def test_read_csv_rows(tmp_path):
+    path = tmp_path / "users.csv"
+    # Excel 导出的 CSV 带 BOM
+    path.write_text(
+        "\ufeffusername,password,is_active\nalice,secret1,yes\nbob,secret2,0\n",
+        encoding="utf-8",
+    )
+    assert read_user_rows(path) == [
+        (2, {"username": "alice", "password": "secret1", "is_active": "yes"}),
+        (3, {"username": "bob", "password": "secret2", "is_active": "0"}),
+    ]
+
+
+def test_read_jsonl_rows(tmp_path):
+    path = tmp_path / "users.jsonl"
+    path.write_text(
+        json.dumps({"username": "alice", "password": "secret1"})
+        + "\n\n{not json}\n"
+        + json.dumps({"username": "bob", "password": "secret2", "is_active": False})
+        + "\n",
+        encoding="utf-8",
+    )
+    rows = read_user_rows(path)
+    assert [line for line, _ in rows] == [1, 3, 4]
+    assert rows[0][1] == {"username": "alice", "password": "secret1"}
+    assert rows[1][1]["_error"].startswith("JSON 解析失败")
+    assert rows[2][1]["is_active"] is False
+
+
+def test_plan_rows(db):
+    rows = [
+        (2, {"username": "alice", "password": "secret1"}),
+        (3, {"username": " existing ", "password": "new-pass"}),
+        (4, {"username": "alice", "password": "secret2"}),
+        (5, {"username": "", "password": "secret3"}),
+        (6, {"username": "carol", "password": "secret4", "is_active": "maybe"}),
+        (7, {"username": "dave", "password": "short", "is_active": "否"}),
+        (8, ["not", "an", "object"]),
+    ]
+    plans = plan_bulk_users(db, rows, update_if_exists=False)
+    assert [(p["line"], p["action"]) for p in plans] == [
+        (2, CREATE),
+        (3, SKIP),
+        (4, ERROR),
+        (5, ERROR),
+        (6, ERROR),
+        (7, CREATE),
+        (8, ERROR),
+    ]
+    assert plans[1]["username"] == "existing"
+    assert plans[5]["is_active"] is False
+    assert plans[5]["message"].startswith("警告")
+
+    plans = plan_bulk_users(db, rows[1:2], update_if_exists=True)
+    assert plans[0]["action"] == UPDATE
+    assert plans[0]["user"].username == "existing"
+
+
+def test_bulk_create_and_update(db, tmp_path):
+    path = tmp_path / "users.csv"
+    path.write_text(
+        "username,password,is_active\n"
+        "alice,alice-pass,1\n"
+        "bob,bob-pass,false\n"
+        "existing,new-pass,是\n",
+        encoding="utf-8",
+    )
+    stamp = _stamp(db)
+    assert bulk_create_or_update_users(path, update_if_exists=True, workers=1)
+
+    users = _users(db)
+    assert verify_password("alice-pass", users["alice"].hashed_password)
+    assert (users["alice"].is_active, users["bob"].is_active) == (True, False)
+    assert verify_password("new-pass", users["existing"].hashed_password)
+    # 更新已有用户后通知运行中的服务清空用户缓存
+    assert _stamp(db) == stamp + 1
+
+
+def test_dry_run_writes_nothing(db, tmp_path, capsys):
+    path = tmp_path / "users.jsonl"
+    path.write_text(
+        json.dumps({"username": "alice", "password": "alice-pass"}) + "\n",
+        encoding="utf-8",
+    )
+    assert bulk_create_or_update_users(path, dry_run=True, workers=1)
+    assert set(_users(db)) == {"existing"}
+    assert "[dry-run] 第 1 行 alice: 创建" in capsys.readouterr().out
+
+
+def test_error_row_rejects_whole_file(db, tmp_path, capsys):
+    path = tmp_path / "users.csv"
+    path.write_text(
+        "username,password\nalice,alice-pass\nexisting,new-pass\nbob,\n",
+        encoding="utf-8",
+    )
+    stamp = _stamp(db)
+    assert not bulk_create_or_update_users(path, update_if_exists=True, workers=1)
+
+    users = _users(db)
+    assert set(users) == {"existing"}
+    assert verify_password("old-pass", users["existing"].hashed_password)
+    assert _stamp(db) == stamp
+    out = capsys.readouterr().out
+    assert "[未写入] 第 4 行 bob: 错误" in out
+    assert "未写入任何用户" in out
@@ -0,0 +1,160 @@
+import difflib
+import random
+import re
+
+import pytest
+
+from app import diffing, script_versions
+from app.diffing import (
+    DIFF_LINEAR_LINES,
+    apply_delta,
+    decode_delta,
+    diff_hunks,
+    encode_delta,
+    format_unified,
+    make_delta,
+)
+from app.models import ScriptItem
+from app.script_versions import add_version, diff_cache, diff_versions
+
+_HUNK = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@$")
+
+
+def _edited(lines: int, seed: int) -> tuple:
+    """lines 行的文本及随机增删改后的版本，含重复行、CRLF 与无结尾换行"""
+    rng = random.Random(seed)
+    a = [f"line {i % (lines // 3 or 1)} {i}\n" for i in range(lines)]
+    a[1] = "echo crlf\r\n"
+    a += ["}\n"] * 5
+    b = list(a)
+    for _ in range(max(lines // 50, 3)):
+        k = rng.randrange(len(b))
+        action = rng.choice(("insert", "delete", "replace"))
+        if action == "insert":
+            b[k:k] = [f"inserted {rng.random()}\n"] * rng.randint(1, 4)
+        elif action == "delete":
+            del b[k : k + rng.randint(1, 4)]
+        else:
+            b[k] = f"replaced {rng.random()}\n"
+    return "".join(a), "".join(b).rstrip("\n")
+
+
+def _apply_unified(a: str, patch: str) -> str:
+    """按 unified diff 文本修改 a，同时校验每个差异块头部的行数"""
+    a_lines = a.splitlines(keepends=True)
+    lines = patch.splitlines(keepends=True)
+    assert lines[0].startswith("--- ") and lines[1].startswith("+++ ")
+    out, pos, k = [], 0, 2
+    while k < len(lines):
+        m = _HUNK.match(lines[k].rstrip("\n"))
+        assert m, lines[k]
+        from_start, from_count, _, to_count = (
+            int(g) if g is not None else 1 for g in m.groups()
+        )
+        start = from_start - 1 if from_count else from_start
+        out.extend(a_lines[pos:start])
+        pos = start
+        k += 1
+        seen_from = seen_to = 0
+        while k < len(lines) and not lines[k].startswith("@@"):
+            op, text = lines[k][0], lines[k][1:]
+            k += 1
+            if k < len(lines) and lines[k] == "\\ No newline at end of file\n":
+                text = text[:-1]
+                k += 1
+            if op in " -":
+                assert a_lines[pos] == text
+                pos += 1
+                seen_from += 1
+            if op in " +":
+                out.append(text)
+                seen_to += 1
+        assert (seen_from, seen_to) == (from_count, to_count)
+    out.extend(a_lines[pos:])
+    return "".join(out)
+
+
+@pytest.mark.parametrize(
+    "lines", [10, DIFF_LINEAR_LINES // 2 - 100, DIFF_LINEAR_LINES // 2 + 100]
+)
+@pytest.mark.parametrize("seed", range(3))
+def test_delta_round_trip(lines, seed):
+    a, b = _edited(lines, seed)
+    ops = decode_delta(encode_delta(make_delta(a, b)))
+    assert apply_delta(a, ops) == b
+    assert apply_delta(b, make_delta(b, a)) == a
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_linear_algorithm_round_trip(monkeypatch, seed):
+    # 同一输入强制走近线性算法，结果同样能还原
+    monkeypatch.setattr(diffing, "DIFF_LINEAR_LINES", 0)
+    a, b = _edited(300, seed)
+    assert apply_delta(a, make_delta(a, b)) == b
+    assert _apply_unified(a, format_unified(diff_hunks(a, b), "a", "b")) == b
+
+
+@pytest.mark.parametrize(
+    "lines", [60, DIFF_LINEAR_LINES // 2 - 100, DIFF_LINEAR_LINES // 2 + 100]
+)
+def test_unified_output_applies(lines):
+    a, b = _edited(lines, 1)
+    patch = format_unified(diff_hunks(a, b), "v1", "v2")
+    assert patch.startswith("--- v1\n+++ v2\n")
+    assert _apply_unified(a, patch) == b
+
+
+def test_unified_output_matches_difflib():
+    a, b = _edited(60, 2)
+    b += "\n"
+    expected = "".join(
+        difflib.unified_diff(
+            a.splitlines(keepends=True), b.splitlines(keepends=True), "v1", "v2"
+        )
+    )
+    assert format_unified(diff_hunks(a, b), "v1", "v2") == expected
+
+
+def test_unified_edge_cases():
+    assert format_unified(diff_hunks("same\n", "same\n"), "a", "b") == ""
+    assert format_unified(diff_hunks("", "new\n"), "a", "b") == (
+        "--- a\n+++ b\n@@ -0,0 +1 @@\n+new\n"
+    )
+    assert format_unified(diff_hunks("x\n", "x"), "a", "b") == (
+        "--- a\n+++ b\n@@ -1 +1 @@\n-x\n+x\n\\ No newline at end of file\n"
+    )
+
+
+def test_diff_cache_shared_by_content(session_factory, monkeypatch):
+    calls = []
+
+    def counting_diff_hunks(a, b, context=3):
+        calls.append(context)
+        return diff_hunks(a, b, context)
+
+    monkeypatch.setattr(script_versions, "diff_hunks", counting_diff_hunks)
+    diff_cache.clear()
+    with session_factory() as db:
+        for script_id in (1, 2):
+            db.add(
+                ScriptItem(
+                    id=script_id, title="s", script_type="shell", script_path="s.sh"
+                )
+            )
+            add_version(db, script_id, 1, "echo 1\n")
+            add_version(db, script_id, 2, "echo 2\n")
+        db.commit()
+
+        first = diff_versions(db, 1, 1, 2)
+        assert diff_versions(db, 1, 1, 2) == first
+        # 另一个脚本的相同内容命中同一缓存项
+        assert diff_versions(db, 2, 1, 2) == first
+        assert calls == [3]
+        # 上下文行数是缓存键的一部分
+        diff_versions(db, 1, 1, 2, context=0)
+        assert calls == [3, 0]
+        # 相同版本不计算差异，不存在的版本返回 None
+        assert diff_versions(db, 1, 2, 2)[2] == []
+        assert diff_versions(db, 1, 1, 9) is None
+        assert calls == [3, 0]
+    diff_cache.clear()
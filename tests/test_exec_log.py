@@ -0,0 +1,65 @@
+import struct
+from datetime import datetime, timedelta
+
+from app.exec_log import LineTimestampWriter, read_log_range, timestamp_path
+
+START = datetime(2026, 1, 1, 8, 0, 0)
+HEADER = "=== header ===\n"
+LINES = ["first\n", "第二行\n", "third\n", "fourth\n"]
+
+
+def _write_log(tmp_path):
+    """正文前有一段不计时的头部，每行间隔 1 秒"""
+    log_path = tmp_path / "run.log"
+    with open(log_path, "wb") as log, LineTimestampWriter(
+        log_path, START, len(HEADER.encode("utf-8"))
+    ) as line_times:
+        log.write(HEADER.encode("utf-8"))
+        for i, line in enumerate(LINES):
+            log.write(line.encode("utf-8"))
+            line_times.record(log.tell(), START + timedelta(seconds=i + 1))
+    return log_path
+
+
+def test_timestamp_body_is_little_endian(tmp_path):
+    log_path = _write_log(tmp_path)
+    raw = timestamp_path(log_path).read_bytes()
+    body = raw[struct.calcsize("<8sqq"):]
+    assert list(struct.iter_unpack("<II", body)) == [
+        (1000, len(line.encode("utf-8"))) for line in LINES
+    ]
+
+
+def test_read_log_range_window(tmp_path):
+    log_path = _write_log(tmp_path)
+    assert read_log_range(log_path) == "".join(LINES)
+    assert read_log_range(
+        log_path, START + timedelta(seconds=2), START + timedelta(seconds=3)
+    ) == "".join(LINES[1:3])
+    assert read_log_range(log_path, start=START + timedelta(seconds=4)) == LINES[3]
+    assert read_log_range(log_path, end=START + timedelta(seconds=1)) == LINES[0]
+    assert read_log_range(log_path, start=START + timedelta(seconds=10)) == ""
+
+
+def test_read_log_range_with_timestamps(tmp_path):
+    log_path = _write_log(tmp_path)
+    text = read_log_range(
+        log_path,
+        START + timedelta(seconds=2),
+        START + timedelta(seconds=2),
+        with_timestamps=True,
+    )
+    assert text == "[2026-01-01T08:00:02.000Z] 第二行\n"
+
+
+def test_read_log_range_ignores_partial_record(tmp_path):
+    log_path = _write_log(tmp_path)
+    with open(timestamp_path(log_path), "ab") as f:
+        f.write(b"\x01\x02\x03")
+    assert read_log_range(log_path) == "".join(LINES)
+
+
+def test_read_log_range_without_timestamps(tmp_path):
+    log_path = tmp_path / "plain.log"
+    log_path.write_text("no timestamps\n", encoding="utf-8")
+    assert read_log_range(log_path) is None
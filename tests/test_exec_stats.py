@@ -0,0 +1,155 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.exec_stats import (
+    SKETCH_RELATIVE_ACCURACY,
+    DurationSketch,
+    predict_duration,
+    rebuild_exec_stats,
+    record_exec_stats,
+    record_last_run,
+    summarize,
+)
+from app.models import ScriptExecDaily, ScriptExecRecord, ScriptItem
+
+
+def _durations(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return [rng.lognormvariate(2, 1.5) for _ in range(count)]
+
+
+def _exact(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("q", [0.0, 0.25, 0.5, 0.9, 0.95, 0.99, 1.0])
+def test_quantile_within_relative_accuracy(seed, q):
+    values = _durations(5000, seed)
+    sketch = DurationSketch()
+    for value in values:
+        sketch.add(value)
+    exact = _exact(values, q)
+    assert abs(sketch.quantile(q) - exact) <= SKETCH_RELATIVE_ACCURACY * exact
+
+
+def test_merge_equals_single_sketch():
+    first, second = _durations(1000, 1), _durations(3000, 2)
+    merged = DurationSketch()
+    combined = DurationSketch()
+    for values in (first, second):
+        part = DurationSketch()
+        for value in values:
+            part.add(value)
+            combined.add(value)
+        # 经过 JSON 往返，与每日汇总表里保存的形式相同
+        merged.merge(DurationSketch.from_json(part.to_json()))
+    assert merged.buckets == combined.buckets
+    assert merged.count == 4000
+    for q in (0.5, 0.95):
+        exact = _exact(first + second, q)
+        assert abs(merged.quantile(q) - exact) <= SKETCH_RELATIVE_ACCURACY * exact
+
+
+def test_empty_and_tiny_durations():
+    sketch = DurationSketch.from_json(None)
+    assert sketch.quantile(0.5) is None
+    sketch.add(0)
+    sketch.add(0.0001)
+    assert sketch.count == 2
+    assert sketch.quantile(1.0) == pytest.approx(0.001, rel=SKETCH_RELATIVE_ACCURACY)
+
+
+@pytest.fixture
+def db(session_factory):
+    with session_factory() as db:
+        db.add(ScriptItem(id=1, title="s", script_type="shell", script_path="s.sh"))
+        db.commit()
+        yield db
+
+
+def test_daily_rollup_increments(db):
+    day = datetime(2026, 1, 1, 8)
+    record_exec_stats(db, 1, day, "success", 2.0)
+    record_exec_stats(db, 1, day + timedelta(hours=15), "fail", 5.0)
+    record_exec_stats(db, 1, day + timedelta(days=1), "success", 1.0)
+    db.commit()
+
+    rows = db.query(ScriptExecDaily).order_by(ScriptExecDaily.day).all()
+    assert [(r.day.isoformat(), r.runs, r.successes, r.failures) for r in rows] == [
+        ("2026-01-01", 2, 1, 1),
+        ("2026-01-02", 1, 1, 0),
+    ]
+    assert (rows[0].total_seconds, rows[0].max_seconds) == (7.0, 5.0)
+    assert DurationSketch.from_json(rows[0].duration_sketch).count == 2
+
+    summary = summarize(rows)
+    assert (summary["runs"], summary["success_rate"]) == (3, pytest.approx(2 / 3))
+    assert summary["avg_seconds"] == pytest.approx(8 / 3)
+    assert summary["max_seconds"] == 5.0
+    assert summary["p50_seconds"] == pytest.approx(2.0, rel=SKETCH_RELATIVE_ACCURACY)
+
+
+def test_rebuild_matches_incremental(db):
+    start = datetime(2026, 1, 1)
+    durations = _durations(50, 3)
+    for i, seconds in enumerate(durations):
+        begin = start + timedelta(hours=i)
+        status = "fail" if i % 5 == 0 else "success"
+        db.add(
+            ScriptExecRecord(
+                script_id=1,
+                status=status,
+                start_time=begin,
+                end_time=begin + timedelta(seconds=seconds),
+            )
+        )
+        record_exec_stats(db, 1, begin, status, seconds)
+    # 排队中被取消、仍在运行的执行不计入
+    db.add(ScriptExecRecord(script_id=1, status="cancelled", start_time=start))
+    db.add(ScriptExecRecord(script_id=1, status="running", start_time=start))
+    db.commit()
+    incremental = {
+        r.day: (r.runs, r.failures, DurationSketch.from_json(r.duration_sketch).buckets)
+        for r in db.query(ScriptExecDaily)
+    }
+
+    assert rebuild_exec_stats(db, batch_size=7) == 50
+    db.commit()
+    rebuilt = {
+        r.day: (r.runs, r.failures, DurationSketch.from_json(r.duration_sketch).buckets)
+        for r in db.query(ScriptExecDaily)
+    }
+    assert rebuilt == incremental
+
+
+def test_record_last_run_keeps_latest(db):
+    start = datetime(2026, 1, 1)
+    record_last_run(db, 1, 10, start + timedelta(minutes=5), "success")
+    # 更早开始、更晚结束的执行只计数，不覆盖最近执行
+    record_last_run(db, 1, 9, start, "fail")
+    db.commit()
+    script = db.get(ScriptItem, 1)
+    db.refresh(script)
+    assert (script.last_exec_id, script.last_status) == (10, "success")
+    assert (script.run_count, script.fail_count) == (2, 1)
+
+
+def test_predict_duration_uses_recent_days(db):
+    now = datetime.utcnow()
+    assert predict_duration(db, 1, 7) is None
+    for seconds in (10.0, 20.0, 30.0):
+        record_exec_stats(db, 1, now, "success", seconds)
+    # 窗口之外的历史不参与预测
+    for _ in range(10):
+        record_exec_stats(db, 1, now - timedelta(days=30), "success", 1000.0)
+    db.commit()
+    assert predict_duration(db, 1, 7) == pytest.approx(
+        20.0, rel=SKETCH_RELATIVE_ACCURACY
+    )
+    assert predict_duration(db, 1, 60) == pytest.approx(
+        1000.0, rel=SKETCH_RELATIVE_ACCURACY
+    )
@@ -0,0 +1,66 @@
+import pytest
+
+from app import executor
+from app.models import ScriptExecDaily, ScriptExecRecord, ScriptItem
+from app.run_snapshots import RunSnapshotCache
+from app.script_versions import add_version
+
+
+@pytest.fixture
+def run(tmp_path, monkeypatch, session_factory, writer):
+    monkeypatch.setattr(executor, "LOG_BASE_DIR", tmp_path / "logs")
+    snapshots = RunSnapshotCache(tmp_path / "snapshots")
+
+    def run(script_id, command):
+        with session_factory() as db:
+            db.add(
+                ScriptItem(
+                    id=script_id,
+                    title=f"s{script_id}",
+                    script_type="shell",
+                    script_path=f"s{script_id}.sh",
+                    exec_command_template=command,
+                )
+            )
+            add_version(db, script_id, 1, "echo hi\n")
+            db.commit()
+            script = db.get(ScriptItem, script_id)
+        return executor.run_script(
+            script,
+            None,
+            "tester",
+            writer=writer,
+            snapshots=snapshots,
+            session_factory=session_factory,
+        )
+
+    return run
+
+
+def test_run_updates_status_and_summary_together(run, session_factory):
+    exec_id = run(1, "exit 3")
+    with session_factory() as db:
+        record = db.get(ScriptExecRecord, exec_id)
+        script = db.get(ScriptItem, 1)
+        daily = db.query(ScriptExecDaily).filter_by(script_id=1).one()
+        assert (record.status, record.exit_code) == ("fail", 3)
+        assert record.end_time is not None
+        assert (script.last_exec_id, script.last_status) == (exec_id, "fail")
+        assert (script.run_count, script.fail_count) == (1, 1)
+        assert (daily.runs, daily.failures) == (1, 1)
+
+
+def test_failed_rollup_leaves_status_unchanged(run, session_factory, monkeypatch):
+    def broken(*args):
+        raise RuntimeError("rollup failed")
+
+    monkeypatch.setattr(executor, "record_exec_stats", broken)
+    with pytest.raises(RuntimeError, match="rollup failed"):
+        run(1, "true")
+    with session_factory() as db:
+        record = db.query(ScriptExecRecord).one()
+        script = db.get(ScriptItem, 1)
+        # 结束状态与摘要在同一个保存点里，一起回滚
+        assert record.status == "running"
+        assert record.end_time is None
+        assert (script.last_status, script.run_count) == (None, 0)
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import ScriptExecRecord, ScriptItem
+from app.search import LOG_CHUNK_LINES, index_exec_log, search_exec_logs
+
+LINES = 2 * LOG_CHUNK_LINES + 50
+# 各标记所在的行号（从 1 开始）：块的首行、末行与相邻块的首行
+MARKED = [1, 2, LOG_CHUNK_LINES, LOG_CHUNK_LINES + 1, 2 * LOG_CHUNK_LINES, LINES]
+
+
+def _write_log(path, exec_id: int) -> None:
+    lines = [f"exec {exec_id} plain output {n}\n" for n in range(1, LINES + 1)]
+    for n in MARKED:
+        lines[n - 1] = f"exec {exec_id} marker{n} found\n"
+    # 两个执行都有的词，只出现在第 150 行
+    lines[149] = "shared needle here\n"
+    path.write_text("".join(lines), encoding="utf-8")
+
+
+@pytest.fixture
+def db(session_factory, tmp_path):
+    start = datetime(2026, 1, 1)
+    with session_factory() as db:
+        db.add(ScriptItem(id=1, title="s", script_type="shell", script_path="s.sh"))
+        db.add(ScriptItem(id=2, title="t", script_type="shell", script_path="t.sh"))
+        for exec_id, script_id in ((1, 1), (2, 2)):
+            log_path = tmp_path / f"{exec_id}.log"
+            _write_log(log_path, exec_id)
+            db.add(
+                ScriptExecRecord(
+                    id=exec_id,
+                    script_id=script_id,
+                    status="success",
+                    start_time=start + timedelta(hours=exec_id),
+                    log_path=str(log_path),
+                )
+            )
+            db.flush()
+            assert index_exec_log(db, exec_id, str(log_path))
+        db.commit()
+        # 已索引的日志不会重复索引
+        assert not index_exec_log(db, 1, str(tmp_path / "1.log"))
+        yield db
+
+
+@pytest.mark.parametrize("line", MARKED)
+def test_hit_maps_to_exec_and_line(db, line):
+    hits = search_exec_logs(db, f"marker{line}")
+    assert [(h["exec_id"], h["line"]) for h in hits] == [(2, line), (1, line)]
+    assert f"<mark>marker{line}</mark>" in hits[0]["snippet"]
+
+
+def test_hits_ordered_by_start_time_and_filtered(db):
+    hits = search_exec_logs(db, "needle")
+    assert [(h["exec_id"], h["script_id"], h["line"]) for h in hits] == [
+        (2, 2, 150),
+        (1, 1, 150),
+    ]
+    assert [h["exec_id"] for h in search_exec_logs(db, "needle", script_id=1)] == [1]
+    later = datetime(2026, 1, 1, 1, 30)
+    assert [h["exec_id"] for h in search_exec_logs(db, "needle", start=later)] == [2]
+    assert [h["exec_id"] for h in search_exec_logs(db, "needle", end=later)] == [1]
+
+
+def test_one_hit_per_chunk(db):
+    # "exec 1" 出现在每一行，每个块只返回块内的第一处命中
+    hits = search_exec_logs(db, "exec 1", script_id=1)
+    chunk_starts = [1, LOG_CHUNK_LINES + 1, 2 * LOG_CHUNK_LINES + 1]
+    assert [h["line"] for h in hits] == chunk_starts
+    assert search_exec_logs(db, "exec 1", script_id=1, limit=2)[-1]["line"] == (
+        LOG_CHUNK_LINES + 1
+    )
+
+
+def test_no_hits(db):
+    assert search_exec_logs(db, "absent-word") == []
@@ -0,0 +1,95 @@
+import re
+
+from app.metrics import (
+    METRICS_MAX_SCRIPT_LABELS,
+    CappedLabel,
+    Counter,
+    Gauge,
+    Histogram,
+    Registry,
+)
+
+# Prometheus 文本格式 0.0.4 的样本行：指标名、可选的标签、数值
+_SAMPLE = re.compile(
+    r'^[a-zA-Z_:][a-zA-Z0-9_:]*'
+    r'(\{[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\[\\n"])*"'
+    r'(,[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\[\\n"])*")*\})?'
+    r' (-?[0-9.e+-]+|\+Inf|-Inf|NaN)$'
+)
+
+
+def _check_exposition(text: str) -> None:
+    assert text.endswith("\n")
+    typed = set()
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            continue
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            assert kind in ("counter", "gauge", "histogram")
+            typed.add(name)
+            continue
+        assert _SAMPLE.match(line), line
+        name = re.match(r"[^{ ]+", line).group()
+        assert re.sub(r"_(bucket|sum|count)$", "", name) in typed or name in typed
+
+
+def test_exposition_format():
+    registry = Registry()
+    requests = registry.register(
+        Counter("test_requests_total", "请求数", ("route", "status"))
+    )
+    registry.register(Counter("test_errors_total", "错误数"))
+    registry.register(Gauge("test_depth", "队列长度", collect=lambda: 3))
+    latency = registry.register(
+        Histogram("test_latency_seconds", "耗时", ("route",), buckets=(0.1, 1))
+    )
+    requests.inc(route='/a"b\\c\nd', status=200)
+    requests.inc(2, route="/x", status=500)
+    for value in (0.05, 0.1, 0.5, 3):
+        latency.observe(value, route="/x")
+
+    text = registry.render()
+    _check_exposition(text)
+    lines = text.splitlines()
+    assert "# TYPE test_requests_total counter" in lines
+    assert 'test_requests_total{route="/a\\"b\\\\c\\nd",status="200"} 1' in lines
+    assert 'test_requests_total{route="/x",status="500"} 2' in lines
+    # 无标签的计数器没有数据时也输出 0
+    assert "test_errors_total 0" in lines
+    assert "test_depth 3" in lines
+    # 桶计数是累计的，边界值计入 le 等于它的桶
+    assert lines[-5:] == [
+        'test_latency_seconds_bucket{route="/x",le="0.1"} 2',
+        'test_latency_seconds_bucket{route="/x",le="1"} 3',
+        'test_latency_seconds_bucket{route="/x",le="+Inf"} 4',
+        'test_latency_seconds_sum{route="/x"} 3.65',
+        'test_latency_seconds_count{route="/x"} 4',
+    ]
+
+
+def test_script_labels_past_limit_fold_into_other():
+    label = CappedLabel(METRICS_MAX_SCRIPT_LABELS)
+    runs = Counter("test_runs_total", "执行数", ("script",))
+    for script_id in range(1, METRICS_MAX_SCRIPT_LABELS + 11):
+        runs.inc(script=label(script_id))
+    # 已占用名额的脚本之后仍使用自己的标签
+    runs.inc(script=label(1))
+
+    samples = runs.render()[2:]
+    assert len(samples) == METRICS_MAX_SCRIPT_LABELS + 1
+    assert 'test_runs_total{script="1"} 2' in samples
+    assert f'test_runs_total{{script="{METRICS_MAX_SCRIPT_LABELS}"}} 1' in samples
+    assert 'test_runs_total{script="other"} 10' in samples
+    assert label(METRICS_MAX_SCRIPT_LABELS + 1) == "other"
+
+
+def test_metrics_endpoint(client):
+    assert client.get("/api/exec/999999").status_code == 404
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    _check_exposition(response.text)
+    # 按路由模板而不是实际路径打标签
+    assert 'route="/api/exec/{exec_id}",status="404"' in response.text
+    assert "/api/exec/999999" not in response.text
@@ -0,0 +1,125 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import ScriptCategory, ScriptExecRecord, ScriptItem
+from app.pagination import encode_cursor
+from conftest import create_script
+
+# 本模块数据的 id 起点，避开其他测试的数据
+BASE = 2000
+SAME_TIME = datetime(2026, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture(scope="module")
+def tied_data(web_app):
+    """一个分类下 23 个脚本，其中 20 个更新时间相同；脚本 BASE+1 有 17 条执行记录，
+    开始时间每 3 条相同"""
+    from app.database import engine
+
+    with engine.begin() as conn:
+        conn.execute(
+            ScriptCategory.__table__.insert(),
+            [{"id": BASE, "name": "pagination", "order": BASE}],
+        )
+        conn.execute(
+            ScriptItem.__table__.insert(),
+            [
+                {
+                    "id": BASE + i,
+                    "category_id": BASE,
+                    "title": f"page {i}",
+                    "script_type": "shell",
+                    "script_path": f"page_{i}.sh",
+                    "update_time": SAME_TIME
+                    if i <= 20
+                    else SAME_TIME + timedelta(minutes=i),
+                }
+                for i in range(1, 24)
+            ],
+        )
+        conn.execute(
+            ScriptExecRecord.__table__.insert(),
+            [
+                {
+                    "id": BASE + i,
+                    "script_id": BASE + 1,
+                    "status": "success",
+                    "start_time": SAME_TIME - timedelta(minutes=i // 3),
+                }
+                for i in range(1, 18)
+            ],
+        )
+
+
+def _collect(client, url: str, limit: int, **filters) -> list:
+    pages = []
+    cursor = None
+    while True:
+        params = {**filters, "limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(url, params=params)
+        assert response.status_code == 200, response.text
+        body = response.json()
+        assert len(body["items"]) <= limit
+        pages.append([item["id"] for item in body["items"]])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("limit", [1, 5, 20, 23, 50])
+def test_scripts_stable_across_pages_with_ties(client, tied_data, limit):
+    pages = _collect(client, "/api/scripts", limit, category_id=BASE)
+    ids = [i for page in pages for i in page]
+    # 更新时间倒序，相同时按 id 倒序；每个脚本恰好出现一次
+    expected = [BASE + i for i in range(23, 20, -1)] + [
+        BASE + i for i in range(20, 0, -1)
+    ]
+    assert ids == expected
+    assert len(pages) == max(1, -(-23 // limit))
+
+
+@pytest.mark.parametrize("limit", [2, 3, 4])
+def test_execs_stable_across_pages_with_ties(client, tied_data, limit):
+    pages = _collect(client, f"/api/scripts/{BASE + 1}/execs", limit)
+    ids = [i for page in pages for i in page]
+    # 开始时间倒序，相同时按 id 倒序
+    expected = sorted(
+        range(BASE + 1, BASE + 18),
+        key=lambda i: (SAME_TIME - timedelta(minutes=(i - BASE) // 3), i),
+        reverse=True,
+    )
+    assert ids == expected
+
+
+def test_keyword_pages_with_equal_rank(client, tmp_path):
+    created = [
+        create_script(client, tmp_path / f"tie{i}.sh", title="pagerank tie")["id"]
+        for i in range(5)
+    ]
+    pages = _collect(client, "/api/scripts", 2, keyword="pagerank")
+    assert [i for page in pages for i in page] == sorted(created)
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not base64!",
+        base64.urlsafe_b64encode(b"not json").decode(),
+        encode_cursor([1]),
+        encode_cursor([1, 2, 3]),
+        base64.urlsafe_b64encode(json.dumps({"a": 1}).encode()).decode(),
+        base64.urlsafe_b64encode(json.dumps([{"dt": "bad"}, 1]).encode()).decode(),
+    ],
+)
+@pytest.mark.parametrize(
+    "url", ["/api/scripts", f"/api/scripts/{BASE + 1}/execs"]
+)
+def test_malformed_cursor_is_400(client, tied_data, url, cursor):
+    response = client.get(url, params={"cursor": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "无效的分页游标"
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+
+import bcrypt
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from app import auth
+from app.auth import (
+    BCRYPT_ROUNDS,
+    PasswordPool,
+    PasswordPoolFull,
+    password_needs_rehash,
+    verify_password,
+)
+from app.models import User
+from conftest import login
+
+
+def test_pool_rejects_when_full():
+    release = threading.Event()
+
+    async def scenario():
+        pool = PasswordPool(workers=1, queue_limit=1)
+        running = asyncio.ensure_future(pool.run(release.wait, 10))
+        queued = asyncio.ensure_future(pool.run(lambda: "queued"))
+        await asyncio.sleep(0.05)
+        assert pool.pending == 2
+        with pytest.raises(PasswordPoolFull):
+            await pool.run(lambda: "rejected")
+        release.set()
+        assert await running is True
+        assert await queued == "queued"
+        assert pool.pending == 0
+        # 有空位后恢复接收
+        assert await pool.run(lambda: "accepted") == "accepted"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+
+
+def test_login_returns_429_when_pool_full(web_app, monkeypatch):
+    # 容量为 0 的线程池：任何密码校验都被拒绝
+    full = PasswordPool(workers=1, queue_limit=-1)
+    monkeypatch.setattr(auth, "password_pool", full)
+    response = login(TestClient(web_app))
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "1"
+
+
+def test_login_rehashes_with_configured_rounds(web_app, monkeypatch):
+    from app.database import engine
+
+    rounds = BCRYPT_ROUNDS + 1
+    old_hash = bcrypt.hashpw(b"rehash-password", bcrypt.gensalt(rounds)).decode()
+    assert password_needs_rehash(old_hash)
+    with engine.begin() as conn:
+        conn.execute(
+            User.__table__.insert(),
+            [{"username": "rehash-user", "hashed_password": old_hash}],
+        )
+    monkeypatch.setattr(auth, "password_pool", PasswordPool(workers=1, queue_limit=1))
+
+    # TestClient 在返回响应前执行完后台任务
+    response = login(TestClient(web_app), "rehash-user", "rehash-password")
+    assert response.status_code == 303
+    with engine.connect() as conn:
+        new_hash = conn.scalar(
+            select(User.hashed_password).where(User.username == "rehash-user")
+        )
+    assert new_hash != old_hash
+    assert new_hash.split("$")[2] == f"{BCRYPT_ROUNDS:02d}"
+    assert not password_needs_rehash(new_hash)
+    assert verify_password("rehash-password", new_hash)
+
+    # 代价因子已一致，再次登录不再改写
+    response = login(TestClient(web_app), "rehash-user", "rehash-password")
+    assert response.status_code == 303
+    with engine.connect() as conn:
+        assert conn.scalar(
+            select(User.hashed_password).where(User.username == "rehash-user")
+        ) == new_hash
+
+
+def test_wrong_password_does_not_rehash(web_app):
+    from app.database import engine
+
+    old_hash = bcrypt.hashpw(b"right", bcrypt.gensalt(BCRYPT_ROUNDS + 1)).decode()
+    with engine.begin() as conn:
+        conn.execute(
+            User.__table__.insert(),
+            [{"username": "wrong-password", "hashed_password": old_hash}],
+        )
+    response = login(TestClient(web_app), "wrong-password", "wrong")
+    assert response.status_code == 303
+    assert "error" in response.headers["location"]
+    with engine.connect() as conn:
+        assert conn.scalar(
+            select(User.hashed_password).where(User.username == "wrong-password")
+        ) == old_hash
@@ -0,0 +1,20 @@
+import pytest
+
+from app import sql_stats
+from conftest import SWEEP_MAX_QUERIES, SWEEP_ROUTES, sweep_path
+
+
+@pytest.mark.parametrize("route", SWEEP_ROUTES)
+def test_route_query_count(route_sweep, route):
+    response, statements = route_sweep[route]
+    assert response.status_code == 200, response.text
+    assert int(response.headers["x-sql-queries"]) <= SWEEP_MAX_QUERIES
+    assert len(statements) == int(response.headers["x-sql-queries"])
+
+
+def test_guard_rejects_request_over_limit(route_sweep, client, monkeypatch):
+    monkeypatch.setattr(sql_stats, "MAX_QUERIES_PER_REQUEST", 1)
+    monkeypatch.setattr(sql_stats, "QUERY_GUARD_STRICT", True)
+    response = client.get(sweep_path("/scripts/{script}"))
+    assert response.status_code == 500
+    assert int(response.headers["x-sql-queries"]) > 1
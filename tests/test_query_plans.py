@@ -0,0 +1,65 @@
+from typing import List
+
+import pytest
+
+from conftest import SWEEP_ROUTES
+
+# 执行计划中允许全表扫描与临时排序的对象
+EXEMPT_SCANS = (
+    # 分类只有几十行
+    "script_category",
+    # 全文检索按 bm25 排序只能临时排序，命中行数受 LIMIT 限制
+    "script_fts",
+    "exec_log_fts",
+    # 增量链递归 CTE，最多 VERSION_SNAPSHOT_INTERVAL + 1 行
+    "blob_chain",
+)
+
+
+def explain(conn, statement: str, parameters) -> List[str]:
+    """SQLite 的 EXPLAIN QUERY PLAN，返回每一步的说明"""
+    return [
+        row[-1]
+        for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+    ]
+
+
+def plan_problems(details: List[str]) -> List[str]:
+    """执行计划中的全表扫描与临时排序
+
+    按索引顺序扫描（SCAN ... USING INDEX，无过滤条件的第一页列表只能如此，
+    靠 LIMIT 提前结束）不算问题。
+    """
+    return [
+        d
+        for d in details
+        if (d.startswith("SCAN ") and " USING " not in d) or "TEMP B-TREE" in d
+    ]
+
+
+@pytest.mark.parametrize("route", SWEEP_ROUTES)
+def test_route_queries_use_index(route_sweep, route):
+    """路由实际执行的查询（含参数）在应用数据库上不做全表扫描和临时排序"""
+    from app.database import engine
+
+    _, statements = route_sweep[route]
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+                continue
+            details = explain(conn, statement, parameters)
+            assert details
+            if any(
+                d.startswith(f"SCAN {name}") for d in details for name in EXEMPT_SCANS
+            ):
+                continue
+            assert plan_problems(details) == [], f"{statement}\n" + "\n".join(details)
+
+
+def test_plan_problems_flags_scan_and_temp_sort():
+    assert plan_problems(["SCAN script_item"]) == ["SCAN script_item"]
+    assert plan_problems(["USE TEMP B-TREE FOR ORDER BY"]) == [
+        "USE TEMP B-TREE FOR ORDER BY"
+    ]
+    ordered = "SCAN script_item USING INDEX ix_script_item_update_time_id"
+    assert plan_problems([ordered]) == []
@@ -0,0 +1,81 @@
+import subprocess
+import sys
+
+import pytest
+
+from app.resource_usage import (
+    ProcessSampler,
+    merge_usage,
+    sample_process_tree,
+    wait_with_rusage,
+)
+
+# 子进程：占用约 64 MB 内存，做一段 CPU 计算，写文件后等待采样
+CHILD = """
+import os, sys, time
+data = b"x" * (64 * 1024 * 1024)
+total = sum(range(3_000_000))
+with open(sys.argv[1], "wb") as f:
+    f.write(b"y" * 1024 * 1024)
+    f.flush()
+    os.fsync(f.fileno())
+time.sleep(0.3)
+"""
+
+linux_only = pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="需要 /proc 与 wait4"
+)
+
+
+@linux_only
+def test_short_child_usage(tmp_path):
+    # 先抬高本进程的峰值内存：fork 出的子进程的 ru_maxrss 会带上它
+    ballast = b"z" * (256 * 1024 * 1024)
+    process = subprocess.Popen([sys.executable, "-c", CHILD, str(tmp_path / "out")])
+    sampler = ProcessSampler(process.pid, interval=0.02).start()
+    exit_code, rusage = wait_with_rusage(process)
+    usage = merge_usage(rusage, sampler.stop())
+    del ballast
+
+    assert exit_code == 0
+    assert "max_rss_kb" not in rusage
+    assert usage["cpu_user_seconds"] > 0
+    assert usage["cpu_system_seconds"] >= 0
+    for key in (
+        "read_bytes",
+        "write_bytes",
+        "voluntary_ctx_switches",
+        "involuntary_ctx_switches",
+    ):
+        assert usage[key] >= 0
+    assert usage["voluntary_ctx_switches"] > 0
+    # 峰值内存来自采样：包含子进程的 64 MB，但不含本进程的 256 MB
+    assert 64 * 1024 <= usage["max_rss_kb"] < 200 * 1024
+
+
+@linux_only
+def test_sample_process_tree_includes_children():
+    process = subprocess.Popen(["sh", "-c", "sleep 1 & sleep 1; wait"])
+    try:
+        for _ in range(100):
+            totals = sample_process_tree(process.pid)
+            if totals and totals["max_rss_kb"]:
+                break
+        assert totals["max_rss_kb"] > 0
+    finally:
+        process.kill()
+        process.wait()
+    assert sample_process_tree(process.pid) is None
+
+
+def test_merge_usage_takes_rss_from_samples():
+    rusage = {"cpu_user_seconds": 0.5, "read_bytes": 4096, "write_bytes": 0}
+    peak = {"read_bytes": 100, "write_bytes": 8192, "max_rss_kb": 2048}
+    assert merge_usage(rusage, peak) == {
+        "cpu_user_seconds": 0.5,
+        "read_bytes": 4096,
+        "write_bytes": 8192,
+        "max_rss_kb": 2048,
+    }
+    assert merge_usage(None, {}) == {}
+    assert "max_rss_kb" not in merge_usage(rusage, {})
@@ -0,0 +1,113 @@
+import os
+import stat
+
+import pytest
+
+from app import run_snapshots
+from app.run_snapshots import RunSnapshotCache
+from app.script_versions import content_hash
+
+
+def _snapshot(cache, content, suffix=".sh"):
+    return cache.path_for(content_hash(content), suffix)
+
+
+def test_path_is_content_addressed(tmp_path):
+    cache = RunSnapshotCache(tmp_path)
+    digest = content_hash("echo 1\n")
+    assert cache.path_for(digest, ".sh") == tmp_path / digest[:2] / f"{digest}.sh"
+    assert cache.path_for(digest) == tmp_path / digest[:2] / digest
+
+
+def test_acquire_writes_read_only_snapshot(tmp_path):
+    cache = RunSnapshotCache(tmp_path)
+    content = "echo 1\r\necho 中文\n"
+    path = _snapshot(cache, content)
+    with cache.acquire(path, lambda: content) as acquired:
+        assert acquired == path
+        assert path.read_bytes() == content.encode("utf-8")
+    assert stat.S_IMODE(path.stat().st_mode) == 0o555
+    assert not [p for p in path.parent.iterdir() if p != path]
+
+
+def test_repeated_acquire_reuses_snapshot(tmp_path):
+    cache = RunSnapshotCache(tmp_path)
+    path = _snapshot(cache, "echo 1\n")
+    loads = []
+
+    def load():
+        loads.append(1)
+        return "echo 1\n"
+
+    with cache.acquire(path, load):
+        pass
+    os.utime(path, (1, 1))
+    with cache.acquire(path, load):
+        pass
+    assert len(loads) == 1
+    # 复用时刷新最近使用时间
+    assert path.stat().st_mtime > 1
+
+
+def test_existing_snapshot_is_not_replaced(tmp_path, monkeypatch):
+    cache = RunSnapshotCache(tmp_path)
+    content = "echo 1\n"
+    path = _snapshot(cache, content)
+
+    def load():
+        # 模拟另一个进程在检查之后、改名之前物化了同一内容
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content.encode("utf-8"))
+        return content
+
+    def fail_replace(src, dst):
+        raise PermissionError("target is in use")
+
+    monkeypatch.setattr(run_snapshots.os, "replace", fail_replace)
+    with cache.acquire(path, load):
+        assert path.read_bytes() == content.encode("utf-8")
+    assert list(path.parent.iterdir()) == [path]
+
+
+def test_collect_evicts_least_recently_used(tmp_path):
+    writer = RunSnapshotCache(tmp_path)
+    paths = []
+    for i in range(3):
+        content = f"echo {i}\n"
+        path = _snapshot(writer, content)
+        with writer.acquire(path, lambda: content):
+            pass
+        os.utime(path, (100 + i, 100 + i))
+        paths.append(path)
+
+    # 最早写入的一个刚被使用过，应淘汰第二个
+    os.utime(paths[0], (200, 200))
+    assert RunSnapshotCache(tmp_path, max_files=2).collect() == 1
+    assert [p.exists() for p in paths] == [True, False, True]
+
+
+def test_collect_skips_snapshots_in_use(tmp_path):
+    cache = RunSnapshotCache(tmp_path, max_files=1)
+    old = _snapshot(cache, "echo old\n")
+    new = _snapshot(cache, "echo new\n")
+    with cache.acquire(old, lambda: "echo old\n"):
+        os.utime(old, (1, 1))
+        with cache.acquire(new, lambda: "echo new\n"):
+            pass
+        assert old.exists() and new.exists()
+    assert cache.collect() == 1
+    assert not old.exists()
+    assert new.exists()
+
+
+@pytest.mark.parametrize("max_files", [0, 1])
+def test_acquire_evicts_after_writing(tmp_path, max_files):
+    cache = RunSnapshotCache(tmp_path, max_files=max_files)
+    first = _snapshot(cache, "echo 1\n")
+    with cache.acquire(first, lambda: "echo 1\n"):
+        pass
+    os.utime(first, (1, 1))
+    second = _snapshot(cache, "echo 2\n")
+    with cache.acquire(second, lambda: "echo 2\n"):
+        assert second.exists()
+    assert not first.exists()
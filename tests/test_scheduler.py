@@ -0,0 +1,209 @@
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import ScriptItem
+from app.scheduler import ExecScheduler
+
+# 各脚本的预测耗时（秒），脚本 1 用作占住工作线程的长任务
+PREDICTED = {1: 100.0, 2: 30.0, 3: 1.0, 4: 10.0}
+
+
+class FakeWriter:
+    """只记录写入的执行状态写线程"""
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self.updates = []
+
+    def create(self, **values):
+        future = Future()
+        future.set_result(next(self._ids))
+        return future
+
+    def update(self, exec_id, **values):
+        self.updates.append((exec_id, values))
+
+
+class FakeRunner:
+    """按调用顺序记录脚本 id，blocked 中的脚本等到 release 才返回"""
+
+    def __init__(self, blocked=(1,)):
+        self.started = []
+        self.blocked = set(blocked)
+        self.release = threading.Event()
+        self.fail = set()
+
+    def __call__(self, script, params_json, operator, writer, exec_id):
+        self.started.append(script.id)
+        if script.id in self.blocked:
+            assert self.release.wait(10)
+        if script.id in self.fail:
+            raise RuntimeError("runner crashed")
+        return exec_id
+
+
+def _wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "等待超时"
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def make_scheduler(session_factory):
+    with session_factory() as db:
+        db.add_all(
+            ScriptItem(id=i, title=f"s{i}", script_type="shell", script_path=f"s{i}")
+            for i in PREDICTED
+        )
+        db.commit()
+    schedulers = []
+
+    def make(runner, workers=1, aging_rate=0.0, predictor=PREDICTED.get):
+        scheduler = ExecScheduler(
+            workers=workers,
+            aging_rate=aging_rate,
+            default_seconds=5.0,
+            session_factory=session_factory,
+            writer=FakeWriter(),
+            runner=runner,
+            predictor=predictor,
+        )
+        schedulers.append((scheduler, runner))
+        return scheduler
+
+    yield make
+    for scheduler, runner in schedulers:
+        scheduler.stop()
+        runner.release.set()
+
+
+def test_shortest_predicted_runs_first(make_scheduler):
+    runner = FakeRunner()
+    scheduler = make_scheduler(runner)
+    scheduler.submit(1, None, "tester")
+    _wait_for(lambda: runner.started == [1])
+    for script_id in (2, 3, 4):
+        scheduler.submit(script_id, None, "tester")
+    assert scheduler.queue_depth() == 3
+
+    runner.release.set()
+    _wait_for(lambda: len(runner.started) == 4)
+    assert runner.started == [1, 3, 4, 2]
+
+
+def test_waiting_job_ages_ahead_of_short_job(make_scheduler):
+    runner = FakeRunner()
+    # 每等待 1 秒预测耗时视为减少 1000 秒，等待 0.1 秒足以抵消 29 秒的差距
+    scheduler = make_scheduler(runner, aging_rate=1000.0)
+    scheduler.submit(1, None, "tester")
+    _wait_for(lambda: runner.started == [1])
+    scheduler.submit(2, None, "tester")
+    time.sleep(0.1)
+    scheduler.submit(3, None, "tester")
+
+    runner.release.set()
+    _wait_for(lambda: len(runner.started) == 3)
+    assert runner.started == [1, 2, 3]
+
+
+def test_estimate_simulates_queue(make_scheduler):
+    runner = FakeRunner()
+    scheduler = make_scheduler(runner)
+    running = scheduler.submit(1, None, "tester")
+    _wait_for(lambda: runner.started == [1])
+    slow = scheduler.submit(2, None, "tester")
+    fast = scheduler.submit(4, None, "tester")
+    now = datetime.utcnow()
+
+    estimate = scheduler.estimate(running)
+    assert "queue_position" not in estimate
+    assert estimate["predicted_seconds"] == 100.0
+    assert abs(estimate["eta_end"] - (now + timedelta(seconds=100))) < timedelta(
+        seconds=2
+    )
+
+    estimate = scheduler.estimate(fast)
+    assert estimate["queue_position"] == 1
+    assert abs(estimate["eta_start"] - (now + timedelta(seconds=100))) < timedelta(
+        seconds=2
+    )
+
+    # 排在预测 10 秒的任务之后，等运行中的任务结束再等 10 秒
+    estimate = scheduler.estimate(slow)
+    assert estimate["queue_position"] == 2
+    assert abs(estimate["eta_start"] - (now + timedelta(seconds=110))) < timedelta(
+        seconds=2
+    )
+    assert estimate["eta_end"] - estimate["eta_start"] == timedelta(seconds=30)
+
+    assert scheduler.estimate(9999) is None
+
+
+def test_stop_cancels_queued(make_scheduler):
+    runner = FakeRunner()
+    scheduler = make_scheduler(runner)
+    scheduler.submit(1, None, "tester")
+    _wait_for(lambda: runner.started == [1])
+    queued = [scheduler.submit(i, None, "tester") for i in (2, 3)]
+
+    scheduler.stop()
+    runner.release.set()
+    after_stop = scheduler.submit(4, None, "tester")
+    writer = scheduler._writer
+    cancelled = [i for i, values in writer.updates if values["status"] == "cancelled"]
+    assert cancelled == queued + [after_stop]
+    assert scheduler.queue_depth() == 0
+    time.sleep(0.05)
+    assert runner.started == [1]
+
+
+def test_runner_exception_marks_fail(make_scheduler):
+    runner = FakeRunner(blocked=())
+    runner.fail.add(3)
+    scheduler = make_scheduler(runner)
+    exec_id = scheduler.submit(3, None, "tester")
+    writer = scheduler._writer
+    _wait_for(lambda: writer.updates)
+    [(updated, values)] = writer.updates
+    assert updated == exec_id
+    assert (values["status"], values["exit_code"]) == ("fail", -1)
+    # 失败后工作线程继续处理后续任务
+    scheduler.submit(4, None, "tester")
+    _wait_for(lambda: runner.started == [3, 4])
+
+
+def test_deleted_script_is_cancelled(make_scheduler, session_factory):
+    runner = FakeRunner(blocked=())
+    scheduler = make_scheduler(runner)
+    with session_factory() as db:
+        db.delete(db.get(ScriptItem, 2))
+        db.commit()
+    exec_id = scheduler.submit(2, None, "tester")
+    writer = scheduler._writer
+    _wait_for(lambda: writer.updates)
+    assert writer.updates[0][0] == exec_id
+    assert writer.updates[0][1]["status"] == "cancelled"
+    assert runner.started == []
+
+
+def test_predict_falls_back_and_caches():
+    calls = []
+
+    def predictor(script_id):
+        calls.append(script_id)
+        if script_id == 1:
+            raise RuntimeError("no stats")
+        return None if script_id == 2 else 7.0
+
+    scheduler = ExecScheduler(default_seconds=5.0, predictor=predictor)
+    assert scheduler.predict(1) == 5.0
+    assert scheduler.predict(2) == 5.0
+    assert scheduler.predict(3) == 7.0
+    assert scheduler.predict(3) == 7.0
+    assert calls == [1, 2, 3]
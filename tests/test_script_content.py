@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+from sqlalchemy import func, select
+
+import app.main
+from app.models import ScriptBlob, ScriptVersion
+from app.script_versions import content_hash
+from conftest import create_script
+
+
+def _versions(script_id: int) -> list:
+    from app.database import engine
+
+    with engine.connect() as conn:
+        return conn.scalars(
+            select(ScriptVersion.version)
+            .where(ScriptVersion.script_id == script_id)
+            .order_by(ScriptVersion.version)
+        ).all()
+
+
+def test_save_writes_file_and_adds_version(client, tmp_path):
+    path = tmp_path / "save.sh"
+    script = create_script(client, path, initial_content="echo 1\n")
+
+    response = client.put(
+        f"/api/scripts/{script['id']}/content", json={"content": "echo 2\n"}
+    )
+    assert response.json() == {"ok": True, "version": 2}
+    assert path.read_text(encoding="utf-8") == "echo 2\n"
+    assert _versions(script["id"]) == [1, 2]
+
+
+def test_identical_content_is_unchanged(client, tmp_path):
+    path = tmp_path / "same.sh"
+    script = create_script(client, path, initial_content="echo same\n")
+
+    response = client.put(
+        f"/api/scripts/{script['id']}/content", json={"content": "echo same\n"}
+    )
+    assert response.json() == {"ok": True, "version": 1, "unchanged": True}
+    assert _versions(script["id"]) == [1]
+
+
+def test_version_conflict_leaves_file_untouched(client, tmp_path, monkeypatch):
+    path = tmp_path / "conflict.sh"
+    script = create_script(client, path, initial_content="echo 1\n")
+    url = f"/api/scripts/{script['id']}/content"
+    assert client.put(url, json={"content": "echo 2\n"}).status_code == 200
+
+    # 模拟并发：读到的最新版本已过期，新版本号与已提交的版本冲突
+    async def stale_latest_version(db, script_id):
+        return SimpleNamespace(version=1, content_hash=content_hash("echo 1\n"))
+
+    monkeypatch.setattr(app.main, "_latest_version", stale_latest_version)
+    response = client.put(url, json={"content": "echo lost\n"})
+    assert response.status_code == 409
+    assert path.read_text(encoding="utf-8") == "echo 2\n"
+    assert _versions(script["id"]) == [1, 2]
+
+
+def test_scripts_with_same_content_share_blob(client, tmp_path):
+    content = "echo shared by two scripts\n"
+    first = create_script(client, tmp_path / "a.sh", initial_content=content)
+    second = create_script(client, tmp_path / "b.sh", initial_content="echo b\n")
+    client.put(f"/api/scripts/{second['id']}/content", json={"content": content})
+
+    from app.database import engine
+
+    digest = content_hash(content)
+    with engine.connect() as conn:
+        blobs = conn.scalar(
+            select(func.count(ScriptBlob.hash)).where(ScriptBlob.hash == digest)
+        )
+        scripts = conn.scalars(
+            select(ScriptVersion.script_id).where(ScriptVersion.content_hash == digest)
+        ).all()
+    assert blobs == 1
+    assert sorted(scripts) == [first["id"], second["id"]]
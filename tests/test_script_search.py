@@ -0,0 +1,65 @@
+from app.search import fts_prefix_query
+from conftest import create_script
+
+
+def _search(client, keyword: str) -> list:
+    response = client.get("/api/scripts", params={"keyword": keyword})
+    assert response.status_code == 200, response.text
+    return [item["id"] for item in response.json()["items"]]
+
+
+def test_index_follows_create_edit_delete(client, tmp_path):
+    script = create_script(
+        client,
+        tmp_path / "sync.sh",
+        title="alphasync backup",
+        description="nightly betasync job",
+        initial_content="echo gammasync\n",
+    )["id"]
+    for word in ("alphasync", "betasync", "gammasync"):
+        assert _search(client, word) == [script]
+
+    client.put(f"/api/scripts/{script}", json={"title": "deltasync backup"})
+    assert _search(client, "alphasync") == []
+    assert _search(client, "deltasync") == [script]
+    # 只改标题时保留内容的索引
+    assert _search(client, "gammasync") == [script]
+
+    client.put(
+        f"/api/scripts/{script}/content", json={"content": "echo epsilonsync\n"}
+    )
+    assert _search(client, "gammasync") == []
+    assert _search(client, "epsilonsync") == [script]
+
+    assert client.delete(f"/api/scripts/{script}").json() == {"ok": True}
+    for word in ("deltasync", "betasync", "epsilonsync"):
+        assert _search(client, word) == []
+
+
+def test_bm25_ranks_title_over_description_over_content(client, tmp_path):
+    in_content = create_script(
+        client, tmp_path / "c.sh", title="c", initial_content="echo rankword\n"
+    )["id"]
+    in_description = create_script(
+        client, tmp_path / "d.sh", title="d", description="rankword"
+    )["id"]
+    in_title = create_script(client, tmp_path / "t.sh", title="rankword")["id"]
+    assert _search(client, "rankword") == [in_title, in_description, in_content]
+
+
+def test_prefix_and_multiple_words(client, tmp_path):
+    both = create_script(
+        client, tmp_path / "p1.sh", title="prefixdeployment prefixrollback"
+    )["id"]
+    one = create_script(client, tmp_path / "p2.sh", title="prefixdeployment")["id"]
+    assert sorted(_search(client, "prefixdep")) == sorted([both, one])
+    # 多个词之间为 AND，每个词都做前缀匹配
+    assert _search(client, "prefixdep prefixroll") == [both]
+    assert _search(client, "deployment") == []
+
+
+def test_keyword_syntax_is_escaped(client):
+    assert fts_prefix_query('a"b OR c*') == '"a"* "b"* "OR"* "c"*'
+    assert fts_prefix_query("?!") is None
+    assert _search(client, "?!") == []
+    assert client.get("/api/scripts", params={"keyword": 'x" OR "'}).status_code == 200
@@ -0,0 +1,171 @@
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import Session
+
+from app.database import ALEMBIC_INI
+from app.models import ScriptBlob, ScriptItem, ScriptVersion
+from app.script_versions import (
+    VERSION_SNAPSHOT_INTERVAL,
+    add_version,
+    blob_cache,
+    content_hash,
+    delete_orphan_blobs,
+    get_version_content,
+)
+
+
+def _contents(count: int, lines: int = 50) -> list:
+    """逐版本修改一行、追加一行，末版不带结尾换行"""
+    body = [f"echo line {i}" + ("\r\n" if i % 7 == 0 else "\n") for i in range(lines)]
+    contents = []
+    for v in range(count):
+        body[v % lines] = f"echo edited in {v}\n"
+        body.append(f"echo appended {v}\n")
+        contents.append("".join(body))
+    contents[-1] = contents[-1].rstrip("\n")
+    return contents
+
+
+@pytest.fixture
+def db(session_factory):
+    with session_factory() as db:
+        db.add_all(
+            ScriptItem(id=i, title=f"s{i}", script_type="shell", script_path=f"s{i}")
+            for i in (1, 2)
+        )
+        db.commit()
+        yield db
+    blob_cache.clear()
+
+
+def _depths(db, script_id: int) -> list:
+    return db.scalars(
+        select(ScriptBlob.depth)
+        .join(ScriptVersion, ScriptVersion.content_hash == ScriptBlob.hash)
+        .where(ScriptVersion.script_id == script_id)
+        .order_by(ScriptVersion.version)
+    ).all()
+
+
+@pytest.mark.parametrize("interval", [3, VERSION_SNAPSHOT_INTERVAL])
+def test_round_trip_through_delta_chain(db, interval):
+    contents = _contents(2 * interval + 3)
+    for version, content in enumerate(contents, start=1):
+        add_version(db, 1, version, content, snapshot_interval=interval)
+    db.commit()
+
+    # 增量深度达到 interval 后下一版本存为快照
+    expected = [v % (interval + 1) for v in range(len(contents))]
+    assert _depths(db, 1) == expected
+    blob_cache.clear()
+    for version, content in enumerate(contents, start=1):
+        assert get_version_content(db, 1, version) == content
+
+
+def test_unrelated_content_stored_as_snapshot(db):
+    add_version(db, 1, 1, "echo a\n" * 20)
+    add_version(db, 1, 2, "完全不同的内容\n")
+    db.commit()
+    assert _depths(db, 1) == [0, 0]
+    blob_cache.clear()
+    assert get_version_content(db, 1, 2) == "完全不同的内容\n"
+
+
+def test_same_content_shared_across_scripts(db):
+    contents = _contents(4)
+    for version, content in enumerate(contents, start=1):
+        add_version(db, 1, version, content)
+    add_version(db, 2, 1, contents[2])
+    db.commit()
+
+    depth = db.scalar(
+        select(ScriptBlob.depth).where(ScriptBlob.hash == content_hash(contents[2]))
+    )
+    assert depth == 2
+    blob_cache.clear()
+    assert get_version_content(db, 2, 1) == contents[2]
+
+
+def test_orphan_cleanup_keeps_delta_bases(db):
+    contents = _contents(3)
+    for version, content in enumerate(contents, start=1):
+        add_version(db, 1, version, content)
+    add_version(db, 2, 1, contents[2])
+    db.commit()
+
+    # 脚本 1 的版本删除后，脚本 2 引用的内容依赖的增量基准仍须保留
+    db.query(ScriptVersion).filter_by(script_id=1).delete()
+    assert delete_orphan_blobs(db) == 0
+    db.commit()
+    blob_cache.clear()
+    assert get_version_content(db, 2, 1) == contents[2]
+
+    db.query(ScriptVersion).filter_by(script_id=2).delete()
+    assert delete_orphan_blobs(db) == 3
+    db.commit()
+    assert db.scalar(select(ScriptBlob.hash)) is None
+
+
+def _alembic(url: str, action, revision: str) -> None:
+    config = Config(str(ALEMBIC_INI))
+    config.set_main_option("sqlalchemy.url", url)
+    config.attributes["configure_logger"] = False
+    action(config, revision)
+
+
+def test_migration_round_trip(tmp_path):
+    url = f"sqlite:///{tmp_path / 'versions.db'}"
+    _alembic(url, command.upgrade, "0008")
+    contents = _contents(VERSION_SNAPSHOT_INTERVAL + 5)
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        for script_id in (1, 2):
+            conn.execute(
+                text(
+                    "INSERT INTO script_item (id, title, script_type, script_path) "
+                    "VALUES (:id, 's', 'shell', 's.sh')"
+                ),
+                {"id": script_id},
+            )
+        rows = [
+            {"script_id": 1, "version": v, "content": c}
+            for v, c in enumerate(contents, start=1)
+        ]
+        rows.append({"script_id": 2, "version": 1, "content": contents[3]})
+        conn.execute(
+            text(
+                "INSERT INTO script_version (script_id, version, content) "
+                "VALUES (:script_id, :version, :content)"
+            ),
+            rows,
+        )
+
+    _alembic(url, command.upgrade, "head")
+    blob_cache.clear()
+    with Session(engine) as db:
+        depths = _depths(db, 1)
+        sizes = dict(db.execute(select(ScriptBlob.hash, ScriptBlob.size)).all())
+        for version, content in enumerate(contents, start=1):
+            assert get_version_content(db, 1, version) == content
+        assert get_version_content(db, 2, 1) == contents[3]
+    # 迁移按快照间隔编码：增量深度到达间隔后重新存快照
+    assert max(depths) == VERSION_SNAPSHOT_INTERVAL
+    assert depths.count(0) == 2
+    for content in contents:
+        assert sizes[content_hash(content)] == len(content.encode("utf-8"))
+
+    _alembic(url, command.downgrade, "0008")
+    with engine.connect() as conn:
+        restored = conn.execute(
+            text(
+                "SELECT script_id, version, content FROM script_version "
+                "ORDER BY script_id, version"
+            )
+        ).all()
+    assert [tuple(r) for r in restored] == [
+        (r["script_id"], r["version"], r["content"]) for r in rows
+    ]
+    engine.dispose()
+    blob_cache.clear()
@@ -0,0 +1,150 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from app.models import ScriptExecRecord, ScriptItem
+from app.writer import ExecStateWriter
+
+
+def _locked() -> OperationalError:
+    return OperationalError(
+        "COMMIT", {}, sqlite3.OperationalError("database is locked")
+    )
+
+
+@pytest.fixture
+def script(session_factory):
+    with session_factory() as db:
+        db.add(ScriptItem(id=1, title="s", script_type="shell", script_path="s.sh"))
+        db.commit()
+
+
+class CountingFactory:
+    """记录提交次数，前 fail_commits 次提交抛出 database is locked"""
+
+    def __init__(self, session_factory, fail_commits: int = 0):
+        self._session_factory = session_factory
+        self.fail_commits = fail_commits
+        self.commits = 0
+
+    def __call__(self):
+        session = self._session_factory()
+        commit = session.commit
+
+        def counted_commit():
+            if self.fail_commits:
+                self.fail_commits -= 1
+                raise _locked()
+            commit()
+            self.commits += 1
+
+        session.commit = counted_commit
+        return session
+
+
+def _record(session_factory, exec_id):
+    with session_factory() as db:
+        return db.get(ScriptExecRecord, exec_id)
+
+
+def test_operations_are_batched(script, session_factory, migrated_engine):
+    factory = CountingFactory(session_factory)
+    updates = []
+
+    @event.listens_for(migrated_engine, "before_cursor_execute")
+    def count_updates(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("UPDATE script_exec_record"):
+            updates.append(parameters)
+
+    writer = ExecStateWriter(factory, flush_interval=0.2)
+    try:
+        creates = [writer.create(script_id=1, status="queued") for _ in range(50)]
+        first = creates[0].result(timeout=10)
+        writer.update(first, status="running")
+        done = writer.update(first, exit_code=0, status="success")
+        ids = [f.result(timeout=10) for f in creates]
+        done.result(timeout=10)
+    finally:
+        writer.stop(timeout=10)
+
+    assert len(set(ids)) == 50
+    # 第一条之后的创建与两次更新在 flush_interval 内合并进少数批次
+    assert factory.commits <= 3
+    # 同一批次对同一记录的更新合并为一条 UPDATE
+    assert len(updates) == 1
+    record = _record(session_factory, first)
+    assert (record.status, record.exit_code) == ("success", 0)
+
+
+def test_locked_commit_is_retried(script, session_factory):
+    factory = CountingFactory(session_factory, fail_commits=2)
+    writer = ExecStateWriter(factory, flush_interval=0.005, retry_backoff=0.001)
+    try:
+        exec_id = writer.create(script_id=1, status="queued").result(timeout=10)
+    finally:
+        writer.stop(timeout=10)
+    assert factory.fail_commits == 0
+    assert _record(session_factory, exec_id).status == "queued"
+
+
+def test_batch_fails_after_retries(script, session_factory):
+    factory = CountingFactory(session_factory, fail_commits=3)
+    writer = ExecStateWriter(
+        factory, flush_interval=0.005, retries=2, retry_backoff=0.001
+    )
+    try:
+        with pytest.raises(OperationalError):
+            writer.create(script_id=1, status="queued").result(timeout=10)
+        # 写线程继续处理后续操作
+        exec_id = writer.create(script_id=1, status="queued").result(timeout=10)
+    finally:
+        writer.stop(timeout=10)
+    assert _record(session_factory, exec_id) is not None
+
+
+def test_failed_call_rolls_back_only_itself(script, session_factory):
+    writer = ExecStateWriter(session_factory, flush_interval=0.2)
+    try:
+        exec_id = writer.create(script_id=1, status="queued").result(timeout=10)
+
+        def partial_then_fail(session):
+            session.add(ScriptExecRecord(script_id=1, status="orphan"))
+            session.flush()
+            raise RuntimeError("call failed")
+
+        started = writer.update(exec_id, status="running")
+        failed = writer.call(partial_then_fail)
+        created = writer.create(script_id=1, status="queued")
+        with pytest.raises(RuntimeError, match="call failed"):
+            failed.result(timeout=10)
+        started.result(timeout=10)
+        other = created.result(timeout=10)
+    finally:
+        writer.stop(timeout=10)
+
+    assert _record(session_factory, exec_id).status == "running"
+    assert _record(session_factory, other) is not None
+    with session_factory() as db:
+        assert db.query(ScriptExecRecord).filter_by(status="orphan").count() == 0
+
+
+def test_broken_operation_is_isolated(script, session_factory):
+    writer = ExecStateWriter(session_factory, flush_interval=0.2)
+    try:
+        exec_id = writer.create(script_id=1, status="queued").result(timeout=10)
+        good = writer.update(exec_id, status="success", end_time=datetime.utcnow())
+        # 不存在的列让整批提交失败，逐个重试后只有它失败
+        bad = writer.update(exec_id + 1, no_such_column=1)
+        created = writer.create(script_id=1, status="queued")
+        with pytest.raises(Exception):
+            bad.result(timeout=10)
+        good.result(timeout=10)
+        other = created.result(timeout=10)
+    finally:
+        writer.stop(timeout=10)
+
+    assert _record(session_factory, exec_id).status == "success"
+    assert _record(session_factory, other).status == "queued"